@@ -1,7 +1,8 @@
 from flask import Flask
-from api.routes import api_bp
+from api.routes import api_bp, metrics_bp
 from flask_cors import CORS
 from api.error_handlers import register_error_handlers
+from api.utils.metrics import register_request_metrics
 
 def create_app():
     """ Creates a Flask app instance. """
@@ -13,7 +14,9 @@ def create_app():
 
     # Register the Blueprints
     app.register_blueprint(api_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
 
     register_error_handlers(app)
+    register_request_metrics(app)
 
     return app
\ No newline at end of file
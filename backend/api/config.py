@@ -19,4 +19,87 @@ class Config:
     
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     if not OPENAI_API_KEY:
-        raise ValueError('OPENAI_API_KEY environment variable is not set.')
\ No newline at end of file
+        raise ValueError('OPENAI_API_KEY environment variable is not set.')
+
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') # Optional OpenAI compatible endpoint, defaults to the OpenAI API
+
+    # Connection pool shared by the OpenAI clients
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+    HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', 30))
+
+    UPLOAD_DIR = os.getenv('UPLOAD_DIR')
+    if not UPLOAD_DIR:
+        # Default fallback to relative path in local development
+        UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../uploads'))
+
+    # Uploads
+    MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 4 * 1024 * 1024 * 1024))
+    MAX_CONTENT_LENGTH = MAX_UPLOAD_BYTES # Used by Flask to reject larger request bodies
+    UPLOAD_CHUNK_BYTES = int(os.getenv('UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024)) # Chunk size suggested to clients
+    UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600)) # Seconds without chunks before an unfinished upload is deleted
+
+    # Background jobs
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 20))
+    JOB_RETENTION = int(os.getenv('JOB_RETENTION', 3600)) # Seconds a finished job can be polled
+
+
+    # Requests per minute allowed to each API, 0 adapts the number of concurrent requests to the rate limit errors instead
+    LLM_RPM = float(os.getenv('LLM_RPM', 0))
+    VISION_RPM = float(os.getenv('VISION_RPM', 0))
+    TRANSCRIPTION_RPM = float(os.getenv('TRANSCRIPTION_RPM', 0))
+    # Tokens per minute allowed to the LLM and vision APIs, 0 disables the limit
+    LLM_TPM = float(os.getenv('LLM_TPM', 0))
+    VISION_TPM = float(os.getenv('VISION_TPM', 0))
+    # Limits of specific models overriding the above, as JSON (e.g. {"gpt-4o-mini": {"rpm": 500, "tpm": 200000}})
+    MODEL_RATE_LIMITS = os.getenv('MODEL_RATE_LIMITS', '')
+
+    # Retries of rate limited and failed API requests, with an exponential backoff between attempts
+    RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', 6))
+    RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 0.5)) # Seconds
+    RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 30)) # Seconds
+
+    # Batch analysis
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+    BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 4)) # Videos of a batch analyzed at the same time
+
+    # Transcription backend, either the OpenAI API or a local Whisper model (requires faster-whisper)
+    TRANSCRIPTION_BACKEND = os.getenv('TRANSCRIPTION_BACKEND', 'openai')
+    if TRANSCRIPTION_BACKEND not in ('openai', 'local'):
+        raise ValueError('TRANSCRIPTION_BACKEND must be either openai or local.')
+    LOCAL_WHISPER_MODEL = os.getenv('LOCAL_WHISPER_MODEL', 'base') # Model size or path to a converted model
+    LOCAL_WHISPER_COMPUTE_TYPE = os.getenv('LOCAL_WHISPER_COMPUTE_TYPE', 'int8') # Quantization of the weights
+    LOCAL_WHISPER_BATCH_SIZE = int(os.getenv('LOCAL_WHISPER_BATCH_SIZE', 8)) # Audio chunks decoded together
+    LOCAL_WHISPER_THREADS = int(os.getenv('LOCAL_WHISPER_THREADS', 0)) # 0 uses every core
+
+    # Transcription of long audio files in concurrent segments
+    TRANSCRIPTION_CHUNK_SECONDS = int(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', 600))
+    TRANSCRIPTION_MAX_BYTES = int(os.getenv('TRANSCRIPTION_MAX_BYTES', 24 * 1024 * 1024)) # API limit is 25MB per file
+    TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', 4))
+
+    # Map-reduce summarization of transcripts longer than a chunk
+    SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', 4000))
+    SUMMARY_WORKERS = int(os.getenv('SUMMARY_WORKERS', 4)) # Chunks summarized at the same time
+
+    # Keyframes described in each vision request, batches are described concurrently
+    VISION_BATCH_SIZE = int(os.getenv('VISION_BATCH_SIZE', 5))
+    VISION_WORKERS = int(os.getenv('VISION_WORKERS', 4))
+
+    # Generate the holistic summary and the topics with a single LLM call instead of one call each
+    COMBINED_ANALYSIS = os.getenv('COMBINED_ANALYSIS', 'True').lower() in ('true', '1', 'yes')
+
+    # Store the outputs of the analysis stages in the directory of each video to reuse them in later analyses
+    ARTIFACTS_ENABLED = os.getenv('ARTIFACTS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+
+    # Result cache for the outputs of the LLM services
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    CACHE_PATH = os.getenv('CACHE_PATH', os.path.join(UPLOAD_DIR, 'cache.sqlite'))
+    CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Logging, records are written by a background thread
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json') # json or text
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)) # Size of a log file before it's rotated
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5)) # Rotated log files kept
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000)) # Records waiting to be written, newer ones are dropped when full
+    LOG_MAX_MESSAGE_CHARS = int(os.getenv('LOG_MAX_MESSAGE_CHARS', 2000)) # Longer messages (transcripts, prompts) are truncated
+    LOG_LARGE_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_LARGE_DEBUG_SAMPLE_RATE', 1.0)) # Fraction of truncated debug records kept
@@ -1,4 +1,5 @@
 from api.utils.response_model import ResponseModel
+from api.utils.logger import logger
 
 def register_error_handlers(app):
     """ Registers error handlers for the Flask app. """
@@ -18,6 +19,10 @@ def register_error_handlers(app):
     def method_not_allowed(_):
         return ResponseModel(status='error', error={'code': 405, 'message': 'Method Not Allowed'}).to_json(), 405
     
+    @app.errorhandler(413)
+    def content_too_large(_):
+        return ResponseModel(status='error', error={'code': 413, 'message': 'Content Too Large'}).to_json(), 413
+    
     @app.errorhandler(415)
     def unsupported_media_type(_):
         return ResponseModel(status='error', error={'code': 415, 'message': 'Unsupported Media Type'}).to_json(), 415
@@ -25,5 +30,5 @@ def register_error_handlers(app):
     # In case of any other error, return a generic error message
     @app.errorhandler(Exception)
     def generic_error(error):
-        print(error)
+        logger.error("Unhandled error: %s", error, exc_info=error)
         return ResponseModel(status='error', error={'code': 500, 'message': 'Internal Server Error'}).to_json(), 500
\ No newline at end of file
@@ -1,30 +1,39 @@
-from flask import Blueprint, request, send_file
-from api.utils.schemas import AnalyzeVideoRequestSchema, validate_analyze_video_request
+from flask import Blueprint, Response, request, send_file
+from api.utils.schemas import AnalyzeVideoRequestSchema, AnalyzeBatchRequestSchema, validate_analyze_video_request
 from api.utils.response_model import ResponseModel
+from api.config import Config
 from api.utils.logger import logger
-from api.utils.video_utils import store_video, video_exits, get_audio_file
-from api.services.transcription_service import transcribe_audio
-from api.services.summarization_service import generate_transcript_summary, generate_holistic_summary
-from api.services.keyframe_descriptions_service import generate_keyframe_descriptions
-from api.services.topics_service import extract_topics
+from api.utils.metrics import render as render_metrics
+from api.utils.video_utils import save_video, process_video, video_exits, video_ready, not_ready_error, VideoProcessingError
+from api.utils.chunked_upload import UploadError, create_upload, get_upload, append_chunk, finalize_upload
+from api.utils.job_queue import job_queue, JobQueueFullError, UPLOAD_STAGES, ANALYSIS_STAGES, COMBINED_ANALYSIS_STAGES
+from api.services.analysis_service import analyze_video as run_analysis, analyze_batch as run_batch
 from werkzeug.utils import safe_join
+from marshmallow import ValidationError
 import os
 import json
+import queue
+import shutil
 from dotenv import load_dotenv
 
 load_dotenv()
 
-UPLOAD_DIR = os.getenv('UPLOAD_DIR')
+UPLOAD_DIR = Config.UPLOAD_DIR
+SSE_KEEPALIVE_SECONDS = 15
 
-if not UPLOAD_DIR:
-    # Default fallback to relative path in local development
-    UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../uploads'))
-
-print(f"[DEBUG] Using UPLOAD_DIR={UPLOAD_DIR}")
+logger.info(f"Using UPLOAD_DIR={UPLOAD_DIR}")
 
 
 # Create a Blueprint object to define the routes
 api_bp = Blueprint('api', __name__) 
+# Served outside /api, where Prometheus scrapes by default
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """ Serve the metrics of the server in the Prometheus text format """
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 
 @api_bp.route('/uploads/<path:filename>')
@@ -53,60 +62,226 @@ def upload_video():
         return ResponseModel(status="error", error="Error uploading video, file is missing").to_json(), 400
 
     video = request.files['video']
-    video_id = store_video(video)
+    video_id, video_path, video_hash = save_video(video)
 
-    return ResponseModel(status='success', data={'id': video_id}).to_json(), 200
+    return enqueue_video_processing(video_id, video_path, video_hash)
 
-@api_bp.route('/analyze_video', methods=['POST'])
-def analyze_video():
-    """ Handles Video Analyzis endpoint """
+def enqueue_video_processing(video_id, video_path, video_hash):
+    """ Enqueues the extraction of the artifacts of a saved video """
+    try:
+        job = job_queue.submit('upload', UPLOAD_STAGES, process_video, video_id, video_path, video_hash)
+    except JobQueueFullError as e:
+        logger.error(f"Error uploading video: {str(e)}")
+        shutil.rmtree(os.path.dirname(video_path), ignore_errors=True)
+        return ResponseModel(status="error", error="Server is busy, try again later").to_json(), 503 # Service Unavailable
+
+    return ResponseModel(status='success', data={'id': video_id, 'job_id': job.id}).to_json(), 202
+
+@api_bp.route('/upload_sessions', methods=['POST'])
+def start_chunked_upload():
+    """ Starts a resumable chunked upload, expects the file name and its size in bytes """
+    data = request.get_json(silent=True) or {}
+    try:
+        session = create_upload(data.get('filename'), int(data.get('size', 0)))
+    except (TypeError, ValueError):
+        return ResponseModel(status="error", error="File size must be an integer").to_json(), 400
+    except UploadError as e:
+        logger.error(f"Error starting upload: {str(e)}")
+        return ResponseModel(status="error", error=str(e)).to_json(), e.status_code
+
+    response = session.to_dict()
+    response['chunk_size'] = Config.UPLOAD_CHUNK_BYTES
+    return ResponseModel(status='success', data=response).to_json(), 201
+
+@api_bp.route('/upload_sessions/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """ Reports the bytes received so far so the client can resume an upload """
+    try:
+        session = get_upload(upload_id)
+    except UploadError as e:
+        return ResponseModel(status="error", error=str(e)).to_json(), e.status_code
+
+    return ResponseModel(status='success', data=session.to_dict()).to_json(), 200
+
+@api_bp.route('/upload_sessions/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """ Appends the raw request body at the offset given as query parameter """
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return ResponseModel(status="error", error="Offset query parameter is required").to_json(), 400
+
+    try:
+        new_offset = append_chunk(upload_id, offset, request.stream)
+    except UploadError as e:
+        logger.error(f"Error uploading chunk of {upload_id}: {str(e)}")
+        return ResponseModel(status="error", error=str(e)).to_json(), e.status_code
+
+    return ResponseModel(status='success', data={'upload_id': upload_id, 'offset': new_offset}).to_json(), 200
+
+@api_bp.route('/upload_sessions/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """ Verifies the checksum of a completed upload and submits the video for processing """
+    data = request.get_json(silent=True) or {}
+    try:
+        video_id, video_path, video_hash = finalize_upload(upload_id, data.get('sha256'))
+    except UploadError as e:
+        logger.error(f"Error completing upload {upload_id}: {str(e)}")
+        return ResponseModel(status="error", error=str(e)).to_json(), e.status_code
+
+    return enqueue_video_processing(video_id, video_path, video_hash)
+
+def parse_analysis_request():
+    """ Validates an analysis request, returns its data or the error response to answer with """
     data, errors = validate_analyze_video_request(request.get_json(), AnalyzeVideoRequestSchema())
 
     logger.info(f"Analyzing video...")
-    logger.debug(f"Analyzing video with data : {data}")
+    logger.debug("Analyzing video with data : %s", data)
 
     if errors:
         logger.error(f"Error analyzing video: {errors}")
-        return ResponseModel(status="error", error=errors).to_json(), 400 # Bad Request
-    
-    video_id = data['video_id']
-    if not video_exits(video_id):
+        return None, (ResponseModel(status="error", error=errors).to_json(), 400) # Bad Request
+
+    if not video_exits(data['video_id']):
         logger.error(f"Error analyzing video: Video doesn't exist")
-        return ResponseModel(status="error", error=errors).to_json(), 404 # Not Found
-    
-    # Check if the transcript already exists, if not, generate it
-    transcript_path = f"{UPLOAD_DIR}/{video_id}/data.json"
-    if not os.path.exists(transcript_path):
-        audio_path = get_audio_file(video_id)
-        transcript = transcribe_audio(audio_path)
-    else:
-        with open(transcript_path, 'r') as f:
-            file = json.load(f)
-        transcript = file.get('transcript', 'No transcript available')
-
-
-    transcript_summary = generate_transcript_summary(transcript, data.get('summary_type', 'concise'), data.get('language', 'infer'))
-    keyframe_descriptions = generate_keyframe_descriptions(f"{UPLOAD_DIR}/{video_id}/keyframes", data.get('language', 'infer'))
-    holistic_summary = generate_holistic_summary(
-        transcript, 
-        list(map(lambda x: x['description'], keyframe_descriptions)), 
-        data.get('summary_type', 'concise'), 
-        data.get('language', 'infer')
-    )
-    topics = extract_topics(
-        transcript,
-        data.get('language', 'infer'),
-        list(map(lambda x: x['description'], keyframe_descriptions))
-    )
-
-    response = {
-        'transcript': transcript,
-        'transcript_summary': transcript_summary,
-        'holistic_summary': holistic_summary,
-        'topics': topics,
-        'keyframes': keyframe_descriptions
-    }
-
-    return ResponseModel(status='success', data=response).to_json(), 200
+        return None, (ResponseModel(status="error", error=errors).to_json(), 404) # Not Found
+
+    if not video_ready(data['video_id']):
+        error = not_ready_error(data['video_id'])
+        logger.error(f"Error analyzing video: {str(error)}")
+        if isinstance(error, VideoProcessingError):
+            return None, (ResponseModel(status="error", error=str(error)).to_json(), 422) # Unprocessable Entity
+        return None, (ResponseModel(status="error", error="Video is still processing, try again once its upload job is done").to_json(), 409) # Conflict
+
+    return data, None
+
+@api_bp.route('/analyze_video', methods=['POST'])
+def analyze_video():
+    """ Handles Video Analyzis endpoint """
+    data, error_response = parse_analysis_request()
+    if error_response:
+        return error_response
+
+    video_id = data['video_id']
+    try:
+        job = job_queue.submit(
+            'analysis',
+            COMBINED_ANALYSIS_STAGES if Config.COMBINED_ANALYSIS else ANALYSIS_STAGES,
+            run_analysis,
+            video_id,
+            data.get('language', 'infer'),
+            data.get('summary_type', 'concise')
+        )
+    except JobQueueFullError as e:
+        logger.error(f"Error analyzing video: {str(e)}")
+        return ResponseModel(status="error", error="Server is busy, try again later").to_json(), 503 # Service Unavailable
+
+    return ResponseModel(status='success', data={'id': video_id, 'job_id': job.id}).to_json(), 202
+
+@api_bp.route('/analyze_video/stream', methods=['POST'])
+def analyze_video_stream():
+    """ Analyzes a video streaming each result as a server-sent event as soon as it is ready """
+    data, error_response = parse_analysis_request()
+    if error_response:
+        return error_response
+
+    video_id = data['video_id']
+    events = queue.Queue()
+
+    def stream_analysis(*args, job=None):
+        try:
+            result = run_analysis(*args, job=job, on_event=lambda event, event_data: events.put((event, event_data)))
+        except Exception as e:
+            events.put(('error', {'error': str(e)}))
+            raise
+        events.put(('done', {'timings': result['timings'], 'token_usage': result['token_usage']}))
+        return result
+
+    try:
+        job = job_queue.submit(
+            'analysis',
+            COMBINED_ANALYSIS_STAGES if Config.COMBINED_ANALYSIS else ANALYSIS_STAGES,
+            stream_analysis,
+            video_id,
+            data.get('language', 'infer'),
+            data.get('summary_type', 'concise')
+        )
+    except JobQueueFullError as e:
+        logger.error(f"Error analyzing video: {str(e)}")
+        return ResponseModel(status="error", error="Server is busy, try again later").to_json(), 503 # Service Unavailable
+
+    return event_stream_response({'id': video_id, 'job_id': job.id}, events)
+
+@api_bp.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """ Analyzes many videos in a single job, the outcome of each video can be polled from the job """
+    return submit_batch(stream=False)
+
+@api_bp.route('/analyze_batch/stream', methods=['POST'])
+def analyze_batch_stream():
+    """ Analyzes many videos streaming the outcome of each video as a server-sent event as soon as it finishes """
+    return submit_batch(stream=True)
+
+def submit_batch(stream: bool):
+    """ Validates a batch analysis request and submits it as a job """
+    try:
+        items = AnalyzeBatchRequestSchema().load(request.get_json(silent=True) or {})['items']
+    except ValidationError as e:
+        logger.error(f"Error analyzing batch: {e.messages}")
+        return ResponseModel(status="error", error=e.messages).to_json(), 400 # Bad Request
+
+    events = queue.Queue()
+
+    def stream_batch(items, job=None):
+        try:
+            result = run_batch(items, job=job, on_item=lambda outcome: events.put(('item', outcome)))
+        except Exception as e:
+            events.put(('error', {'error': str(e)}))
+            raise
+        events.put(('done', {'failed': result['failed']}))
+        return result
+
+    try:
+        job = job_queue.submit('batch', [f"item_{i}" for i in range(len(items))], stream_batch, items)
+    except JobQueueFullError as e:
+        logger.error(f"Error analyzing batch: {str(e)}")
+        return ResponseModel(status="error", error="Server is busy, try again later").to_json(), 503 # Service Unavailable
+
+    logger.info(f"Submitted batch analysis of {len(items)} videos as job {job.id}")
+    data = {'job_id': job.id, 'items': len(items)}
+    if stream:
+        return event_stream_response(data, events)
+    return ResponseModel(status='success', data=data).to_json(), 202
+
+def event_stream_response(job_data: dict, events: queue.Queue) -> Response:
+    """
+    Streams the events put in a queue by a job as a text/event-stream response, starting with a job
+    event and ending after the done or error event.
+    """
+    def generate():
+        yield server_sent_event('job', job_data)
+        while True:
+            try:
+                event, event_data = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # Comment line that keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield server_sent_event(event, event_data)
+            if event in ('done', 'error'):
+                break
+
+    # The job keeps running if the client disconnects, its result can be polled
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def server_sent_event(event: str, data) -> str:
+    """ Formats an event of a text/event-stream response """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """ Reports the state, stage timings and result of a job """
+    job = job_queue.get(job_id)
+    if job is None:
+        return ResponseModel(status="error", error="Job not found").to_json(), 404
 
+    return ResponseModel(status='success', data=job.to_dict()).to_json(), 200
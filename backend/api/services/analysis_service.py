@@ -0,0 +1,220 @@
+import os
+import glob
+import json
+from api.config import Config
+from api.utils.logger import logger
+from api.utils.token_usage import track_token_usage
+from api.utils.stage_graph import Stage, run_stages
+from api.utils.job_queue import job_stage
+from api.utils.artifact_store import stored, files_fingerprint
+from concurrent.futures import ThreadPoolExecutor
+from api.utils.video_utils import UPLOAD_DIR, video_exits, video_ready, not_ready_error
+from api.services.summarization_service import (
+    condense_transcript, generate_transcript_summary, generate_holistic_summary, generate_holistic_summary_and_topics
+)
+from api.services.keyframe_descriptions_service import generate_keyframe_descriptions, VISION_MODEL
+from api.services.topics_service import extract_topics
+
+
+def load_transcript(video_id: str) -> str:
+    """
+    Loads the stored transcript of a video.
+
+    :param video_id: Identifier of the video
+    :type video_id: str
+    :returns: The transcript of the video
+    :rtype: str
+    :raises VideoNotReadyError: If the upload job of the video hasn't stored the transcript yet
+    :raises VideoProcessingError: If the upload job of the video failed
+    """
+    transcript_path = f"{UPLOAD_DIR}/{video_id}/data.json"
+    if not os.path.exists(transcript_path):
+        raise not_ready_error(video_id)
+    with open(transcript_path, 'r') as f:
+        file = json.load(f)
+    return file.get('transcript', 'No transcript available')
+
+
+def analyze_video(video_id: str, language: str = 'infer', summary_type: str = 'concise', job=None, on_event=None) -> dict:
+    """
+    Generates the transcript, summaries, keyframe descriptions and topics of a stored video.
+
+    Stages that don't depend on each other run concurrently, so the latency is close to the critical path.
+    Long transcripts are condensed once with map-reduce summarization and the condensed text is used by
+    the summaries and topics. With COMBINED_ANALYSIS the holistic summary and the topics are generated
+    by a single LLM call.
+
+    The output of each stage is stored in the directory of the video with the fingerprint of its inputs,
+    so analyzing the video again in another summary type only runs the summary stages.
+
+    :param video_id: Identifier of the video to analyze
+    :type video_id: str
+    :param language: Language to generate the analysis in
+    :type language: str
+    :param summary_type: Type of summary to generate, either concise or detailed.
+    :type summary_type: str
+    :param job: Optional job used to report the progress of each stage
+    :param on_event: Optional function called with the name and data of each result as soon as it is ready
+                     (transcript, transcript_summary_token, transcript_summary, keyframes, holistic_summary and topics)
+    :returns: A dictionary with the analysis results
+    :rtype: dict
+    """
+    logger.info(f"Analyzing video {video_id} ({language}, {summary_type})")
+    video_dir = f"{UPLOAD_DIR}/{video_id}"
+    keyframes_path = f"{video_dir}/keyframes"
+    model = [Config.LLM_WRAPPER, Config.LLM_MODEL]
+
+    def descriptions_of(keyframe_descriptions):
+        return list(map(lambda x: x['description'], keyframe_descriptions or []))
+
+    def emit(event, data):
+        if on_event:
+            on_event(event, data)
+
+    def emit_result(stage, result):
+        if stage == 'keyframe_descriptions':
+            emit('keyframes', {'keyframes': result})
+        elif stage == 'holistic_analysis':
+            emit('holistic_summary', {'holistic_summary': result['holistic_summary']})
+            emit('topics', {'topics': result['topics']})
+        elif stage != 'condensed_transcript':
+            emit(stage, {stage: result})
+
+    def condensed(transcript):
+        # Only store transcripts that were condensed, short ones are used as they are and failures are retried
+        return stored(
+            video_dir, 'condensed_transcript', [transcript, Config.SUMMARY_CHUNK_TOKENS] + model,
+            lambda: condense_transcript(transcript),
+            keep=lambda result: result != transcript
+        )
+
+    def keyframe_descriptions():
+        frame_paths = sorted(glob.glob(os.path.join(keyframes_path, "frame_*.jpg")))
+        # Descriptions missing frames of a failed batch are generated again
+        return stored(
+            video_dir, 'keyframe_descriptions', [files_fingerprint(frame_paths), language, VISION_MODEL],
+            lambda: generate_keyframe_descriptions(keyframes_path, language),
+            keep=lambda result: bool(result) and len(result) == len(frame_paths)
+        )
+
+    stages = [
+        Stage('transcript', lambda: load_transcript(video_id)),
+        Stage('condensed_transcript', condensed, deps=('transcript',)),
+        Stage(
+            'transcript_summary',
+            lambda condensed_transcript: stored(
+                video_dir, 'transcript_summary', [condensed_transcript, summary_type, language] + model,
+                lambda: generate_transcript_summary(
+                    condensed_transcript,
+                    summary_type,
+                    language,
+                    (lambda token: emit('transcript_summary_token', {'token': token})) if on_event else None
+                )
+            ),
+            deps=('condensed_transcript',)
+        ),
+        Stage('keyframe_descriptions', keyframe_descriptions),
+    ]
+    if Config.COMBINED_ANALYSIS:
+        stages.append(Stage(
+            'holistic_analysis',
+            lambda condensed_transcript, keyframe_descriptions: stored(
+                video_dir, 'holistic_analysis',
+                [condensed_transcript, descriptions_of(keyframe_descriptions), summary_type, language] + model,
+                lambda: generate_holistic_summary_and_topics(
+                    condensed_transcript,
+                    descriptions_of(keyframe_descriptions),
+                    summary_type,
+                    language
+                ),
+                keep=lambda result: bool(result['holistic_summary'] and result['topics'])
+            ),
+            deps=('condensed_transcript', 'keyframe_descriptions')
+        ))
+    else:
+        stages += [
+            Stage(
+                'holistic_summary',
+                lambda condensed_transcript, keyframe_descriptions: stored(
+                    video_dir, 'holistic_summary',
+                    [condensed_transcript, descriptions_of(keyframe_descriptions), summary_type, language] + model,
+                    lambda: generate_holistic_summary(
+                        condensed_transcript,
+                        descriptions_of(keyframe_descriptions),
+                        summary_type,
+                        language
+                    )
+                ),
+                deps=('condensed_transcript', 'keyframe_descriptions')
+            ),
+            Stage(
+                'topics',
+                lambda condensed_transcript, keyframe_descriptions: stored(
+                    video_dir, 'topics',
+                    [condensed_transcript, descriptions_of(keyframe_descriptions), language] + model,
+                    lambda: extract_topics(
+                        condensed_transcript,
+                        language,
+                        descriptions_of(keyframe_descriptions)
+                    )
+                ),
+                deps=('condensed_transcript', 'keyframe_descriptions')
+            ),
+        ]
+    with track_token_usage() as token_usage:
+        results, timings = run_stages(stages, job, on_result=emit_result, pipeline='analysis')
+    usage = token_usage.to_dict()
+    logger.info(f"Analysis of video {video_id} used {usage['input_tokens']} input and {usage['output_tokens']} output tokens")
+    holistic = results['holistic_analysis'] if Config.COMBINED_ANALYSIS else results
+
+    return {
+        'transcript': results['transcript'],
+        'transcript_summary': results['transcript_summary'],
+        'holistic_summary': holistic['holistic_summary'],
+        'topics': holistic['topics'],
+        'keyframes': results['keyframe_descriptions'],
+        'timings': timings,
+        'token_usage': usage
+    }
+
+
+def analyze_batch(items: list, job=None, on_item=None) -> dict:
+    """
+    Analyzes many videos, BATCH_WORKERS at a time. The requests of all of them share the rate limits
+    of each backend, so the throughput approaches the rate limits instead of one video at a time.
+
+    :param items: Dictionaries with the video_id, language and summary_type of each video
+    :type items: list
+    :param job: Optional job used to report the progress of each item, as stages named item_<index>
+    :param on_item: Optional function called with the outcome of each item as soon as it finishes
+    :returns: A dictionary with the outcome of each item in the order of the request, with either
+              its result or the error that made it fail
+    :rtype: dict
+    """
+    logger.info(f"Analyzing a batch of {len(items)} videos")
+
+    def analyze_item(index, item):
+        video_id = item['video_id']
+        outcome = {'index': index, 'video_id': video_id}
+        try:
+            with job_stage(job, f"item_{index}"):
+                if not video_exits(video_id):
+                    raise FileNotFoundError(f"Video {video_id} doesn't exist")
+                if not video_ready(video_id):
+                    raise not_ready_error(video_id)
+                outcome['result'] = analyze_video(video_id, item.get('language', 'infer'), item.get('summary_type', 'concise'))
+                outcome['status'] = 'done'
+        except Exception as e:
+            logger.error(f"Error analyzing video {video_id} of batch: {str(e)}")
+            outcome['status'] = 'failed'
+            outcome['error'] = str(e)
+        if on_item:
+            on_item(outcome)
+        return outcome
+
+    with ThreadPoolExecutor(max_workers=Config.BATCH_WORKERS, thread_name_prefix='batch') as executor:
+        outcomes = list(executor.map(analyze_item, range(len(items)), items))
+
+    failed = sum(1 for outcome in outcomes if outcome['status'] == 'failed')
+    logger.info(f"Analyzed a batch of {len(items)} videos, {failed} failed")
+    return {'items': outcomes, 'failed': failed}
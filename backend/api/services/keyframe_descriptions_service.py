@@ -1,9 +1,15 @@
 import os
 import base64
 import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from api.config import Config
 from api.utils.logger import logger
-from openai import OpenAI
+from api.utils.result_cache import cached
+from api.utils.token_usage import record_usage
+from api.utils.rate_limiter import call_with_retries
+from api.utils.clients import openai_client
+from api.utils.video_utils import read_keyframes_index, write_vision_frames, vision_frame_path
 
 # Languages dictionary for mapping language codes to names
 LANGUAGES = {
@@ -14,12 +20,16 @@ LANGUAGES = {
     'infer': 'english'
 }
 
+# Vision model used to describe the keyframes
+VISION_MODEL = "gpt-4o-mini"
+
 # OpenAI client configuration
-client = OpenAI(
-    api_key=Config.OPENAI_API_KEY,
-    timeout=100,
-    max_retries=2,
-)
+CLIENT_TIMEOUT = 100
+MAX_TOKENS = 1000
+# Requests of a batch of frames whose answer is invalid or incomplete
+BATCH_ATTEMPTS = 2
+# Input tokens of a low detail frame, used for the tokens per minute limit
+IMAGE_TOKENS = 85
 
 # JSON structure for the descriptions schema
 json_structure = {
@@ -61,71 +71,155 @@ def encode_image(image_path: str) -> str:
 
 # Function to encode all images in a given directory
 def encode_images(keyframes_path: str) -> list:
-    """Iterates over images in a directory and returns them as base64 encoded strings"""
+    """
+    Iterates over the keyframes in a directory and returns them as base64 encoded strings.
+
+    The downscaled vision copies of the keyframes are sent when they exist. They are written for videos
+    stored before they were introduced, and the full resolution frames are sent if that fails.
+    """
+    frame_names = sorted(name for name in os.listdir(keyframes_path) if name.startswith("frame_") and name.endswith(".jpg"))
+    frame_paths = [os.path.join(keyframes_path, name) for name in frame_names]
+    if not all(os.path.exists(vision_frame_path(path)) for path in frame_paths):
+        try:
+            write_vision_frames(keyframes_path)
+        except Exception as e:
+            logger.warning(f"Couldn't write the vision copies of the keyframes in {keyframes_path}, sending the full frames: {e}")
+
     images = []
-    for file_name in sorted(os.listdir(keyframes_path)):
-        if file_name.endswith(('.jpg', '.jpeg', '.png')):
-            file_path = os.path.join(keyframes_path, file_name)
-            print(f"Encoding image: {file_path}")
-            base64_image = encode_image(file_path)
-            if base64_image:
-                images.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}",
-                        "detail": "low"
-                    }
-                })
+    for file_path in frame_paths:
+        if os.path.exists(vision_frame_path(file_path)):
+            file_path = vision_frame_path(file_path)
+        logger.debug("Encoding image: %s", file_path)
+        base64_image = encode_image(file_path)
+        if base64_image:
+            images.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_image}",
+                    "detail": "low"
+                }
+            })
     return images
 
 def generate_keyframe_descriptions(keyframes_path: str, language='en'):
     """
     Generate descriptions for images in the specified directory
 
+    The frames are described in batches of VISION_BATCH_SIZE frames sent concurrently, so the latency depends
+    on the size of a batch instead of the number of frames. A batch whose descriptions are invalid or incomplete
+    is requested again, and the frames of a batch that keeps failing are left out of the result.
+
     :param keyframes_path: Path to the directory containing keyframe images.
     :type keyframes_path: str
     :param language: Language to generate the keyframe descriptions,
     :type language: str
-    :return: A list of dictionaries with image paths and their corresponding descriptions.
+    :return: A list of dictionaries with image paths and their corresponding descriptions, None if every batch failed.
     """
     try:
         # Get images as base64 encoded strings
         encoded_images = encode_images(keyframes_path)
-        # Prepare the user content for the OpenAI model as prompt
-        user_content = [
-            {
-                "type": "text",
-                "text": f"These are frames from a video. Analyze each frame and provide a description of each one of them."
-            },
-        ]
-        for img in encoded_images:
-            user_content.append(img)
-
         logger.info(f"Generating Keyframe descriptions of {len(encoded_images)} frames in {keyframes_path} in {LANGUAGES.get(language, 'english')}.")
         # Prepare the prompt for the OpenAI model
-        # Make the OpenAI API call to generate the descriptions
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": f"You are an assistant that provides detailed descriptions for frames in a video in {LANGUAGES.get(language, 'english')}."},
-                {
-                    "role": "user", 
-                    "content": user_content
-                },
-            ],
-            response_format=json_structure,
-            max_tokens=1000,
-            temperature=0.4
-        )
-        
-        # Parse the response into structured JSON format
-        descriptions = json.loads(response.choices[0].message.content)
-        return build_response(descriptions, keyframes_path)
+        system_prompt = f"You are an assistant that provides detailed descriptions for frames in a video in {LANGUAGES.get(language, 'english')}."
+
+        batch_size = max(1, Config.VISION_BATCH_SIZE)
+        batches = [encoded_images[start:start + batch_size] for start in range(0, len(encoded_images), batch_size)]
+        with ThreadPoolExecutor(max_workers=Config.VISION_WORKERS) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, describe_batch, system_prompt, batch)
+                for batch in batches
+            ]
+            results = [future.result() for future in futures]
+
+        if batches and not any(result is not None for result in results):
+            raise RuntimeError(f"All the {len(batches)} batches of frames failed")
+        # Number the frames of each batch after the frames of the previous batches
+        descriptions = [
+            {"frame_number": index * batch_size + item["frame_number"], "description": item["description"]}
+            for index, result in enumerate(results) if result is not None
+            for item in result
+        ]
+        return build_response({"descriptions": descriptions}, keyframes_path)
     except Exception as e:
         logger.error(f"Error while generating keyframe descriptions: {e}")
         return None
+
+def describe_batch(system_prompt: str, images: list):
+    """
+    Describes a batch of frames, requesting the descriptions again if the answer is invalid or misses frames.
+
+    :param system_prompt: System prompt of the request
+    :type system_prompt: str
+    :param images: Encoded images of the frames
+    :type images: list
+    :return: The descriptions of the frames numbered from 1, or None if the batch failed
+    :rtype: list
+    """
+    # Prepare the user content for the OpenAI model as prompt
+    user_content = [
+        {
+            "type": "text",
+            "text": f"These are frames from a video. Analyze each frame and provide a description of each one of them, numbered from 1 to {len(images)}."
+        },
+    ] + images
+    for attempt in range(BATCH_ATTEMPTS):
+        try:
+            # Make the OpenAI API call to generate the descriptions, the frames are part of the cache key
+            return cached(
+                'keyframe_descriptions',
+                [VISION_MODEL, system_prompt, user_content],
+                lambda: validate_descriptions(request_descriptions(system_prompt, user_content), len(images))
+            )
+        except Exception as e:
+            logger.warning(f"Attempt {attempt + 1} to describe a batch of {len(images)} frames failed: {e}")
+    return None
+
+def validate_descriptions(descriptions: dict, count: int) -> list:
+    """
+    Checks that the descriptions answered by the model describe each of the `count` frames of a batch.
+
+    :returns: The descriptions ordered by frame number
+    :rtype: list
+    :raises ValueError: If a frame has no description
+    """
+    items = {
+        item["frame_number"]: item for item in descriptions.get("descriptions", [])
+        if 1 <= item["frame_number"] <= count
+    }
+    missing = sorted(set(range(1, count + 1)) - set(items))
+    if missing:
+        raise ValueError(f"Missing descriptions of frames {missing}")
+    return [items[number] for number in sorted(items)]
+    
+def request_descriptions(system_prompt: str, user_content: list) -> dict:
+    """ Requests the descriptions of the frames in the user content to the vision model. """
+    messages = [
+        {
+            "role": "system", 
+            "content": system_prompt},
+        {
+            "role": "user", 
+            "content": user_content
+        },
+    ]
+    images = sum(1 for content in user_content if content["type"] == "image_url")
+    response = call_with_retries(
+        'vision',
+        VISION_MODEL,
+        lambda: openai_client(CLIENT_TIMEOUT).chat.completions.create(
+            model=VISION_MODEL,
+            messages=messages,
+            response_format=json_structure,
+            max_tokens=MAX_TOKENS,
+            temperature=0.4
+        ),
+        tokens=images * IMAGE_TOKENS + MAX_TOKENS
+    )
+    if response.usage:
+        record_usage(VISION_MODEL, response.usage.prompt_tokens, response.usage.completion_tokens)
+
+    # Parse the response into structured JSON format
+    return json.loads(response.choices[0].message.content)
     
 def build_response(descriptions, keyframes_path):
     """
@@ -134,9 +228,10 @@ def build_response(descriptions, keyframes_path):
     :param descriptions: A dictionary containing descriptions for each frame.
                          Expected format: {"descriptions": [{"frame_number": 1, "description": "..."}, ...]}
     :param keyframes_path: Path to the directory containing keyframe images.
-    :return: A list of dictionaries with image paths and their descriptions.
+    :return: A list of dictionaries with image paths, their descriptions and timestamps.
     """
     response = []
+    timestamps = read_keyframes_index(keyframes_path)
 
     for item in descriptions.get("descriptions", []):
         frame_number = item["frame_number"]
@@ -148,7 +243,9 @@ def build_response(descriptions, keyframes_path):
 
         response.append({
             "image_path": image_path,
-            "description": description
+            "description": description,
+            # Timestamps in seconds of the near-identical frames this keyframe represents
+            "timestamps": timestamps[frame_number - 1] if 0 < frame_number <= len(timestamps) else []
         })
 
     return response
\ No newline at end of file
@@ -1,11 +1,12 @@
 from api.config import Config
-from langchain_ollama.chat_models import ChatOllama
-from langchain_openai.chat_models import ChatOpenAI
+from api.utils.clients import chat_model
 from api.utils.logger import logger
-from langchain_core.messages import (
-    HumanMessage,
-    SystemMessage,
-)
+from api.utils.result_cache import cached
+from api.utils.rate_limiter import call_with_retries
+from api.utils.text_chunker import count_tokens, chunk_text
+from api.utils.schemas import HolisticAnalysisResponse
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 
 LANGUAGES = {
     'en': 'english',
@@ -15,58 +16,142 @@ LANGUAGES = {
     'infer': 'infer'
 }
 
-# LLM Selection
-if Config.LLM_WRAPPER == 'openai':
-    logger.info(f"Using OpenAI models for summarization -> {Config.LLM_MODEL}")
-    model = ChatOpenAI(
-                api_key=Config.OPENAI_API_KEY, 
-                model=Config.LLM_MODEL,
-                temperature=0.2,
-                max_tokens=300,
-                timeout=None,
-                max_retries=2
-            )
-else:
-    logger.info(f"Using Ollama models for summarization -> {Config.LLM_MODEL}")
-    model = ChatOllama(model=Config.LLM_MODEL, temperature=0.2, max_tokens=300)
+CHUNK_SUMMARY_PROMPT = "Summarize the following part of a video transcript in at most 150 words. Keep the names, facts, numbers and the order of events, and write in the language of the transcript. Provide the result without introductions."
+
+logger.info(f"Using {Config.LLM_WRAPPER} models for summarization -> {Config.LLM_MODEL}")
+
+
+def prompt_messages(system_prompt: str, content: str) -> list:
+    """ Returns the system and user messages of a prompt, LangChain is imported on the first call. """
+    from langchain_core.messages import HumanMessage, SystemMessage
+    return [SystemMessage(content=system_prompt), HumanMessage(content=content)]
+
+
+class StreamInterruptedError(Exception):
+    """ Raised when a streamed response fails after some of its tokens were emitted, so it isn't retried. """
+
+
+def invoke_model(model, messages: list, max_tokens: int = 300):
+    """
+    Invokes a chat model through the LLM rate limiter, retrying rate limited and transient failures.
+
+    :param model: Chat model, optionally with structured output
+    :param messages: Messages of the prompt
+    :type messages: list
+    :param max_tokens: Maximum tokens the model generates, counted towards the tokens per minute limit
+    :type max_tokens: int
+    :returns: The response of the model
+    """
+    tokens = sum(count_tokens(message.content) for message in messages) + max_tokens
+    return call_with_retries('llm', Config.LLM_MODEL, lambda: model.invoke(messages), tokens)
+
 
+def summarize_chunk(chunk: str) -> str:
+    """ Summarizes a part of a transcript, the summaries are cached so every analysis of the video reuses them. """
+    return cached(
+        'transcript_chunk_summary',
+        [Config.LLM_WRAPPER, Config.LLM_MODEL, CHUNK_SUMMARY_PROMPT, chunk],
+        lambda: invoke_model(
+            chat_model(),
+            prompt_messages(CHUNK_SUMMARY_PROMPT, chunk)
+        ).content
+    )
 
-def generate_transcript_summary(transcript: str, summary_type = 'concise', language="infer"):
+
+def condense_transcript(transcript: str) -> str:
+    """
+    Condenses a transcript longer than SUMMARY_CHUNK_TOKENS with map-reduce summarization.
+
+    The transcript is split into chunks that are summarized in parallel, and their summaries are
+    summarized again until they fit in a single chunk. Shorter transcripts are returned as they are.
+
+    :param transcript: The transcript to condense
+    :type transcript: str
+    :returns: Text that fits in one chunk, to be used in the prompts instead of the transcript
+    :rtype: str
+    """
+    condensed = transcript
+    try:
+        tokens = count_tokens(condensed)
+        while tokens > Config.SUMMARY_CHUNK_TOKENS:
+            chunks = chunk_text(condensed, Config.SUMMARY_CHUNK_TOKENS)
+            logger.info(f"Summarizing {len(chunks)} chunks of a {tokens} tokens transcript")
+            with ThreadPoolExecutor(max_workers=Config.SUMMARY_WORKERS) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, summarize_chunk, chunk) for chunk in chunks]
+                summaries = [future.result() for future in futures]
+            reduced = "\n".join(summary.strip() for summary in summaries if summary)
+            reduced_tokens = count_tokens(reduced)
+            if not reduced or reduced_tokens >= tokens:
+                logger.warning("Chunk summaries didn't shorten the transcript, stopping the reduction")
+                break
+            condensed, tokens = reduced, reduced_tokens
+    except Exception as e:
+        logger.error(f"Error while condensing transcript, using the full transcript... {e}")
+        return transcript
+    return condensed
+
+
+def invoke_text(messages: list, on_token=None) -> str:
+    """
+    Invokes the chat model and returns the generated text, streaming its tokens to `on_token` if given.
+    A stream is only retried if it fails before its first token.
+    """
+    if on_token is None:
+        return invoke_model(chat_model(), messages).content
+
+    def stream():
+        content = ""
+        try:
+            for chunk in chat_model().stream(messages):
+                if chunk.content:
+                    on_token(chunk.content)
+                    content += chunk.content
+        except Exception as e:
+            if content:
+                raise StreamInterruptedError(f"Stream interrupted after {len(content)} characters: {e}") from e
+            raise
+        return content
+
+    tokens = sum(count_tokens(message.content) for message in messages) + 300
+    return call_with_retries('llm', Config.LLM_MODEL, stream, tokens)
+
+
+def generate_transcript_summary(transcript: str, summary_type = 'concise', language="infer", on_token=None):
     """
     Generate a summary based on a transcript using an LLM.
 
-    :param transcript: The transcript to summarize
+    :param transcript: The transcript to summarize, long transcripts should be condensed with `condense_transcript` first
     :type transcript: str
     :param summary_type: Type of summary to generate, either concise or detailed.
     :type summary_type: str
     :param language: Language to generate the transcript summary
     :type language: str
+    :param on_token: Optional function called with each generated token as it is streamed, not called for cached summaries
     """
     logger.info(f"Generating summary for transcript in a {summary_type} way ({language}).")
     language_instructions = "" if language == "infer" else f"Your summary must be in {LANGUAGES.get(language, 'english')}"
     prompt = f"Summarize the following text in a {summary_type} way, use {'100' if summary_type == 'concise' else '200'} words. {language_instructions} Provide the result without introductions."
     try:
-        result = model.invoke(
-            [
-                SystemMessage(
-                    content=prompt
-                ),
-                HumanMessage(content=transcript)
-            ]
+        summary = cached(
+            'transcript_summary',
+            [Config.LLM_WRAPPER, Config.LLM_MODEL, prompt, transcript],
+            lambda: invoke_text(
+                prompt_messages(prompt, transcript),
+                on_token
+            )
         )
-        summary = result.content
     except Exception as e:
         logger.error(f"Error while generating transcript summary... {e}")
         summary = ""
     
-    logger.debug(f"Summary result: {summary}")
+    logger.debug("Summary result: %s", summary)
     return summary
 
 def generate_holistic_summary(transcript: str, keyframes_descriptions: list, summary_type = "concise", language = "infer") -> str:
     """
     Generate a holistic summary based on a trascript and keyframe descriptions using an LLM.
 
-    :param transcript: The transcript to summarize
+    :param transcript: The condensed transcript to summarize
     :type transcript: str
     :param keyframes_descriptions: The keyframe descriptions to use to generate summary.
     :type keyframes_descriptions: list
@@ -77,22 +162,62 @@ def generate_holistic_summary(transcript: str, keyframes_descriptions: list, sum
     logger.info(f"Generating holistic summary for transcript and {len(keyframes_descriptions)} keyframe descriptions in a {summary_type} way ({language}).")
     language_instructions = "" if language == "infer" else f"Your summary must be in {LANGUAGES.get(language, 'english')}"
     system_prompt = f"Summarize the following video using the following transcript and keyframe descriptions in a {summary_type} way, use {'100' if summary_type == 'concise' else '200'} words. {language_instructions} Provide the result without introductions."
-    desc = '\n'.join([f'Frame {i + 1}: {desc}' for i, desc in enumerate(keyframes_descriptions)])
-    prompt = f"Transcript: {transcript}\nKeyframe descriptions: {desc}"
-    logger.debug(f"Prompt: {system_prompt}\n{prompt}")
+    prompt = build_video_prompt(transcript, keyframes_descriptions)
+    logger.debug("Prompt: %s\n%s", system_prompt, prompt)
     try:
-        result = model.invoke(
-            [
-                SystemMessage(
-                    content=system_prompt
-                ),
-                HumanMessage(content=prompt)
-            ]
+        summary = cached(
+            'holistic_summary',
+            [Config.LLM_WRAPPER, Config.LLM_MODEL, system_prompt, prompt],
+            lambda: invoke_text(prompt_messages(system_prompt, prompt))
         )
-        summary = result.content
     except Exception as e:
         logger.error(f"Error while generating holistic summary... {e}")
         summary = ""
     
-    logger.debug(f"Summary result: {summary}")
-    return summary
\ No newline at end of file
+    logger.debug("Summary result: %s", summary)
+    return summary
+
+def build_video_prompt(transcript: str, keyframes_descriptions: list) -> str:
+    """ Builds the prompt with the (already condensed) transcript and the keyframe descriptions of a video. """
+    desc = '\n'.join([f'Frame {i + 1}: {desc}' for i, desc in enumerate(keyframes_descriptions)])
+    return f"Transcript: {transcript}\nKeyframe descriptions: {desc}"
+
+def generate_holistic_summary_and_topics(transcript: str, keyframes_descriptions: list, summary_type = "concise", language = "infer") -> dict:
+    """
+    Generate the holistic summary and the topics of a video with a single structured LLM call,
+    so the transcript and keyframe descriptions are only sent once.
+
+    :param transcript: The condensed transcript to summarize
+    :type transcript: str
+    :param keyframes_descriptions: The keyframe descriptions to use to generate summary.
+    :type keyframes_descriptions: list
+    :param summary_type: Type of summary to generate, either concise or detailed.
+    :type summary_type: str
+    :param language: Language to generate the summary and topics
+    :type language: str
+    :return: A dictionary with the holistic summary and the list of topics
+    :rtype: dict
+    """
+    logger.info(f"Generating holistic summary and topics for transcript and {len(keyframes_descriptions)} keyframe descriptions in a {summary_type} way ({language}).")
+    language_instructions = "" if language == "infer" else f"Your summary and topics must be in {LANGUAGES.get(language, 'english')}"
+    system_prompt = f"Summarize the following video using the following transcript and keyframe descriptions in a {summary_type} way, use {'100' if summary_type == 'concise' else '200'} words, and extract its main topics, 7 topics as maximum. {language_instructions} Provide the summary without introductions."
+    prompt = build_video_prompt(transcript, keyframes_descriptions)
+    logger.debug("Prompt: %s\n%s", system_prompt, prompt)
+    try:
+        # Room for a detailed summary and the topics
+        structured_model = chat_model(max_tokens=600).with_structured_output(HolisticAnalysisResponse)
+        analysis = cached(
+            'holistic_analysis',
+            [Config.LLM_WRAPPER, Config.LLM_MODEL, system_prompt, prompt],
+            lambda: invoke_model(
+                structured_model,
+                prompt_messages(system_prompt, prompt),
+                max_tokens=600
+            ).model_dump()
+        )
+    except Exception as e:
+        logger.error(f"Error while generating holistic summary and topics... {e}")
+        analysis = {'summary': "", 'topics': []}
+
+    logger.debug("Holistic analysis result: %s", analysis)
+    return {'holistic_summary': analysis['summary'], 'topics': analysis['topics']}
@@ -1,12 +1,9 @@
 from api.config import Config
-from langchain_ollama.chat_models import ChatOllama
-from langchain_openai.chat_models import ChatOpenAI
+from api.utils.clients import chat_model
 from api.utils.logger import logger
+from api.utils.result_cache import cached
 from api.utils.schemas import TopicResponse
-from langchain_core.messages import (
-    HumanMessage,
-    SystemMessage,
-)
+from api.services.summarization_service import build_video_prompt, invoke_model, prompt_messages
 
 LANGUAGES = {
     'en': 'english',
@@ -29,40 +26,24 @@ def extract_topics(transcript: str, language: str, keyframes_descriptions: list)
     :returns: A list of extracted topics.
     :rtype: list
     """
-    # LLM Selection
     logger.info(f"Extracting topics from for transcript and {len(keyframes_descriptions)} keyframe descriptions in {language}. Using ({Config.LLM_MODEL},{Config.LLM_WRAPPER})")
-    if Config.LLM_WRAPPER == 'openai':
-        model = ChatOpenAI(
-                    api_key=Config.OPENAI_API_KEY, 
-                    model=Config.LLM_MODEL,
-                    temperature=0.2,
-                    max_tokens=300,
-                    timeout=None,
-                    max_retries=2
-                )
-    else:
-        model = ChatOllama(model=Config.LLM_MODEL, temperature=0.2, max_tokens=300)
+    model = chat_model()
     
     language_instructions = "" if language == "infer" else f"The topics must be in {LANGUAGES.get(language, 'english')}"
     system_prompt = f"Extract the main topics from the video transcript and keyframe descriptions. {language_instructions} Provide 7 topics as maximum."
     
-    desc = '\n'.join([f'Frame {i + 1}: {desc}' for i, desc in enumerate(keyframes_descriptions)])
-    prompt = f"Transcript: {transcript}\nKeyframe descriptions: {desc}"
+    prompt = build_video_prompt(transcript, keyframes_descriptions)
     
     try:
         structured_model = model.with_structured_output(TopicResponse)
-        result = structured_model.invoke(
-            [
-                SystemMessage(
-                    content=system_prompt
-                ),
-                HumanMessage(content=prompt)
-            ]
+        topics = cached(
+            'topics',
+            [Config.LLM_WRAPPER, Config.LLM_MODEL, system_prompt, prompt],
+            lambda: invoke_model(structured_model, prompt_messages(system_prompt, prompt)).topics
         )
-        topics = result.topics
     except Exception as e:
         logger.error(f"Error while extracting topics... {str(e)}")
         topics = []
     
-    logger.debug(f"Topics extracted: {topics}")
+    logger.debug("Topics extracted: %s", topics)
     return topics
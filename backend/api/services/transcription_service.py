@@ -1,44 +1,316 @@
-from openai import OpenAI
 from api.config import Config
+from api.utils.clients import openai_client
+from api.utils.rate_limiter import call_with_retries
 from api.utils.logger import logger
+from api.utils.metrics import FFMPEG_DURATION
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import numpy as np
+import subprocess
+import tempfile
+import threading
+import struct
+import csv
+import wave
+import io
 import os
 
+TRANSCRIPTION_MODEL = "gpt-4o-mini-transcribe"
+SILENCE_WINDOW_SECONDS = 0.1 # Resolution used to look for quiet split points
+SILENCE_SEARCH_SECONDS = 30 # How far before the size limit of a segment to look for a quiet split point
 
-def transcribe_audio(audio_path: str) -> str:
+
+def read_wav_pcm(audio_path: str) -> tuple:
     """
-    Transcribes the given audio file into text using the Whisper model.
+    Memory-maps the samples of a 16-bit mono PCM WAV file without loading them.
 
-    This function loads an audio file from the given path and returns the
-    transcription as a string. 
+    :param audio_path: Path to the WAV file
+    :type audio_path: str
+    :returns: (samples, sample_rate) with samples as a read-only int16 memory map
+    :rtype: tuple
+    :raises ValueError: If the file isn't a 16-bit mono PCM WAV file
+    """
+    with open(audio_path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"File {audio_path} is not a WAV file")
+        sample_rate = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"File {audio_path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', f.read(16))
+                if audio_format != 1 or channels != 1 or bits != 16:
+                    raise ValueError(f"File {audio_path} is not 16-bit mono PCM")
+                f.seek(chunk_size - 16 + chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    if sample_rate is None:
+        raise ValueError(f"File {audio_path} has no format chunk")
+
+    # ffmpeg writes an unknown (maximum) data size when streaming, rely on the file size instead
+    count = (os.path.getsize(audio_path) - offset) // 2
+    if count == 0:
+        return np.zeros(0, dtype='<i2'), sample_rate
+    return np.memmap(audio_path, dtype='<i2', mode='r', offset=offset, shape=(count,)), sample_rate
+
+
+def split_on_silence(samples: np.ndarray, sample_rate: int, max_seconds: float) -> list:
+    """
+    Splits audio into segments no longer than `max_seconds`, cutting at the quietest point
+    found shortly before each limit so words aren't split between segments.
+
+    Only the samples near each split point are read from the memory map.
+
+    :param samples: Audio samples
+    :type samples: np.ndarray
+    :param sample_rate: Sample rate of the audio
+    :type sample_rate: int
+    :param max_seconds: Maximum length of a segment in seconds
+    :type max_seconds: float
+    :returns: List of (start, end) sample indices of each segment
+    :rtype: list
+    """
+    max_length = int(max_seconds * sample_rate)
+    window = max(int(SILENCE_WINDOW_SECONDS * sample_rate), 1)
+    search = min(int(SILENCE_SEARCH_SECONDS * sample_rate), max_length // 2)
+    segments = []
+    start = 0
+    while len(samples) - start > max_length:
+        limit = start + max_length
+        region = np.asarray(samples[limit - search:limit], dtype=np.float32)
+        windows = region[:len(region) // window * window].reshape(-1, window)
+        energy = np.sqrt(np.mean(windows ** 2, axis=1))
+        # Split in the middle of the quietest window
+        end = limit - search + int(np.argmin(energy)) * window + window // 2
+        segments.append((start, end))
+        start = end
+    segments.append((start, len(samples)))
+    return segments
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """ Encodes 16-bit mono samples as WAV file bytes. """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.asarray(samples, dtype='<i2').tobytes())
+    return buffer.getvalue()
+
+
+def split_wav_audio(audio_path: str) -> list:
+    """
+    Splits a 16-bit mono WAV file at quiet points into segments under the size limit of the API.
+
+    :returns: List of (start, end, name, read) tuples with the times in seconds of each segment,
+              a file name and a function returning its WAV bytes
+    :rtype: list
+    """
+    samples, sample_rate = read_wav_pcm(audio_path)
+    # 16-bit mono PCM uses 2 bytes per sample
+    max_seconds = min(Config.TRANSCRIPTION_CHUNK_SECONDS, Config.TRANSCRIPTION_MAX_BYTES / (2 * sample_rate))
+    return [
+        (start / sample_rate, end / sample_rate, f"segment_{i:03d}.wav", partial(encode_wav, samples[start:end], sample_rate))
+        for i, (start, end) in enumerate(split_on_silence(samples, sample_rate, max_seconds))
+    ]
+
+
+def split_compressed_audio(audio_path: str, max_seconds: float, output_dir: str) -> list:
+    """
+    Splits a compressed audio file into segments of up to `max_seconds` by using ffmpeg's segment muxer,
+    copying the encoded packets without decoding them. The file is split again into shorter segments
+    if any of them is over the size limit of the API.
+
+    :param audio_path: Path to the audio file
+    :type audio_path: str
+    :param max_seconds: Length of the segments in seconds
+    :type max_seconds: float
+    :param output_dir: Directory to write the segments to
+    :type output_dir: str
+    :returns: List of (start, end, name, read) tuples with the times in seconds of each segment,
+              its file name and a function returning its bytes
+    :rtype: list
+    :raises subprocess.CalledProcessError: If ffmpeg fails to split the file
+    """
+    extension = os.path.splitext(audio_path)[1]
+    list_path = os.path.join(output_dir, "segments.csv")
+    while True:
+        for name in os.listdir(output_dir):
+            os.remove(os.path.join(output_dir, name))
+        command = [
+            "ffmpeg", "-v", "error", "-i", audio_path,
+            "-f", "segment", "-segment_time", str(max_seconds),
+            "-segment_list", list_path, "-segment_list_type", "csv",
+            "-c", "copy",
+            os.path.join(output_dir, f"segment_%03d{extension}")
+        ]
+        with FFMPEG_DURATION.time(operation='split_audio'):
+            subprocess.run(command, check=True)
+
+        with open(list_path, 'r') as f:
+            rows = [(name, float(start), float(end)) for name, start, end in csv.reader(f)]
+        largest = max(os.path.getsize(os.path.join(output_dir, name)) for name, _, _ in rows)
+        if largest <= Config.TRANSCRIPTION_MAX_BYTES:
+            break
+        max_seconds = max_seconds * Config.TRANSCRIPTION_MAX_BYTES / largest * 0.9
+
+    return [
+        (start, end, name, partial(read_file, os.path.join(output_dir, name)))
+        for name, start, end in rows
+        # The muxer can leave a trailing segment with only the last few milliseconds
+        if end - start >= SILENCE_WINDOW_SECONDS or len(rows) == 1
+    ]
+
+
+def read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def transcribe_with_openai(audio_path: str) -> list:
+    """
+    Transcribes an audio file with the OpenAI API.
+
+    Long audio files are split into segments under the size limit of the API, which are
+    transcribed concurrently and returned in order with their timestamps. WAV files are
+    split at quiet points, compressed files (FLAC, Opus) at fixed intervals.
 
     :param audio_path: Path to the audio file to be transcribed
     :type audio_path: str
-    :returns: Transcribed text from the audio file
-    :rtype: str
+    :returns: List of dictionaries with the start and end in seconds and the text of each segment
+    :rtype: list
+    """
+    client = openai_client()
+
+    def transcribe_segment(segment):
+        start, end, name, read = segment
+        data = read()
+        transcription = call_with_retries('transcription', TRANSCRIPTION_MODEL, lambda: client.audio.transcriptions.create(
+            model=TRANSCRIPTION_MODEL,
+            file=(name, data)
+        ))
+        return {"start": round(start, 3), "end": round(end, 3), "text": transcription.text}
+
+    with tempfile.TemporaryDirectory() as segments_dir:
+        if audio_path.endswith('.wav'):
+            segments = split_wav_audio(audio_path)
+        else:
+            segments = split_compressed_audio(audio_path, Config.TRANSCRIPTION_CHUNK_SECONDS, segments_dir)
+        logger.info(f"Transcribing {len(segments)} segments of {audio_path}")
+
+        with ThreadPoolExecutor(max_workers=Config.TRANSCRIPTION_WORKERS) as executor:
+            return list(executor.map(transcribe_segment, segments))
+
+
+_local_model = None
+_local_model_lock = threading.Lock()
+
+def get_local_model():
+    """
+    Returns the local Whisper pipeline, loading the model the first time so later requests reuse it.
+
+    :raises ImportError: If faster-whisper isn't installed
+    """
+    global _local_model
+    with _local_model_lock:
+        if _local_model is None:
+            try:
+                from faster_whisper import WhisperModel, BatchedInferencePipeline
+            except ImportError:
+                raise ImportError("TRANSCRIPTION_BACKEND=local requires faster-whisper, install it with pip install faster-whisper")
+            logger.info(
+                f"Loading local Whisper model {Config.LOCAL_WHISPER_MODEL} ({Config.LOCAL_WHISPER_COMPUTE_TYPE})"
+            )
+            model = WhisperModel(
+                Config.LOCAL_WHISPER_MODEL,
+                device="cpu",
+                compute_type=Config.LOCAL_WHISPER_COMPUTE_TYPE,
+                cpu_threads=Config.LOCAL_WHISPER_THREADS
+            )
+            _local_model = BatchedInferencePipeline(model=model)
+    return _local_model
+
+
+_local_inference_lock = threading.Lock()
+
+def transcribe_with_local_model(audio_path: str) -> list:
+    """
+    Transcribes an audio file with a quantized Whisper model running on the CPU.
+
+    The pipeline splits the audio at voice activity and decodes the chunks in batches. Requests are
+    transcribed one at a time since a single batch already uses every core.
+
+    :param audio_path: Path to the audio file to be transcribed
+    :type audio_path: str
+    :returns: List of dictionaries with the start and end in seconds and the text of each segment
+    :rtype: list
+    """
+    pipeline = get_local_model()
+    with _local_inference_lock:
+        segments, info = pipeline.transcribe(audio_path, batch_size=Config.LOCAL_WHISPER_BATCH_SIZE)
+        # Segments are generated lazily, consume them while holding the lock
+        results = [
+            {"start": round(segment.start, 3), "end": round(segment.end, 3), "text": segment.text}
+            for segment in segments
+        ]
+    logger.info(f"Transcribed {info.duration:.0f}s of {info.language} audio with the local model")
+    return results
+
+
+TRANSCRIPTION_BACKENDS = {
+    'openai': transcribe_with_openai,
+    'local': transcribe_with_local_model,
+}
+
+
+def transcribe_audio_segments(audio_path: str) -> list:
+    """
+    Transcribes the given audio file into text segments with the configured transcription backend.
+
+    :param audio_path: Path to the audio file to be transcribed
+    :type audio_path: str
+    :returns: List of dictionaries with the start and end in seconds and the text of each segment
+    :rtype: list
     :raises FileNotFoundError: If the audio file does not exist
     """
-    logger.info(f"Transcribing audio file {audio_path}...")
+    logger.info(f"Transcribing audio file {audio_path} with the {Config.TRANSCRIPTION_BACKEND} backend...")
     # Ensure the file exist
     if not os.path.exists(audio_path):
         logger.error(f"File {audio_path} does not exists...")
         raise FileNotFoundError(f"File {audio_path} does not exist")
-    
+
     try:
-        client = OpenAI(
-            api_key=Config.OPENAI_API_KEY
-        )
-        audio_file= open(audio_path, "rb")
-
-        transcription = client.audio.transcriptions.create(
-            model="gpt-4o-mini-transcribe", 
-            file=audio_file
-        )
-
-        logger.debug(f"Result from transcribing audio file: {transcription.text}")
-        return transcription.text
+        results = TRANSCRIPTION_BACKENDS[Config.TRANSCRIPTION_BACKEND](audio_path)
+        logger.debug("Result from transcribing audio file: %s", results)
+        return results
     except Exception as e:
         logger.error(f"Error during audio transcription: {str(e)}")
         raise e
 
-    
 
+def transcribe_audio(audio_path: str) -> str:
+    """
+    Transcribes the given audio file into text with the configured transcription backend.
+
+    This function loads an audio file from the given path and returns the
+    transcription as a string.
+
+    :param audio_path: Path to the audio file to be transcribed
+    :type audio_path: str
+    :returns: Transcribed text from the audio file
+    :rtype: str
+    :raises FileNotFoundError: If the audio file does not exist
+    """
+    return join_segments(transcribe_audio_segments(audio_path))
+
+
+def join_segments(segments: list) -> str:
+    """ Stitches the text of transcribed segments in order. """
+    return " ".join(segment["text"].strip() for segment in segments if segment["text"].strip())
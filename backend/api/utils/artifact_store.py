@@ -0,0 +1,121 @@
+"""
+Per-video store of the outputs of the analysis stages, kept alongside data.json so repeated analyses
+of a video only run the stages whose inputs changed.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from api.config import Config
+from api.utils.logger import logger
+from api.utils.result_cache import cache_key
+from api.utils.metrics import ARTIFACT_REQUESTS
+
+ARTIFACTS_DIR = "artifacts"
+# Bump when a prompt or the format of a stage output changes, so the stored outputs are generated again
+ARTIFACT_VERSION = 1
+
+
+def fingerprint(stage: str, key_parts: list) -> str:
+    """ Returns the fingerprint of the inputs of a stage, which identifies its stored output. """
+    return cache_key(stage, [ARTIFACT_VERSION, key_parts])
+
+
+def files_fingerprint(paths: list) -> str:
+    """ Returns the SHA-256 of the content of files, in order, e.g. to fingerprint the keyframes of a video. """
+    sha256 = hashlib.sha256()
+    for path in paths:
+        sha256.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for data in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(data)
+    return sha256.hexdigest()
+
+
+def artifact_path(video_dir: str, stage: str, key_parts: list) -> str:
+    return os.path.join(video_dir, ARTIFACTS_DIR, f"{stage}-{fingerprint(stage, key_parts)[:16]}.json")
+
+
+def load_artifact(video_dir: str, stage: str, key_parts: list):
+    """
+    Returns the stored output of a stage for the given inputs, or None if it isn't stored.
+
+    :param video_dir: Directory of the video
+    :type video_dir: str
+    :param stage: Name of the stage
+    :type stage: str
+    :param key_parts: JSON serializable inputs that determine the output (content hashes, language, model...)
+    :type key_parts: list
+    """
+    path = artifact_path(video_dir, stage, key_parts)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            artifact = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable artifact {path}: {e}")
+        return None
+    if artifact.get('fingerprint') != fingerprint(stage, key_parts):
+        return None
+    return artifact['value']
+
+
+def save_artifact(video_dir: str, stage: str, key_parts: list, value) -> None:
+    """
+    Stores the output of a stage with the fingerprint of its inputs, replacing the file atomically.
+
+    :param video_dir: Directory of the video
+    :type video_dir: str
+    :param stage: Name of the stage
+    :type stage: str
+    :param key_parts: JSON serializable inputs that determine the output
+    :type key_parts: list
+    :param value: JSON serializable output of the stage
+    """
+    path = artifact_path(video_dir, stage, key_parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    artifact = {
+        'stage': stage,
+        'version': ARTIFACT_VERSION,
+        'fingerprint': fingerprint(stage, key_parts),
+        'created_at': time.time(),
+        'value': value
+    }
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(artifact, f)
+    os.replace(tmp_path, path)
+
+
+def stored(video_dir: str, stage: str, key_parts: list, compute, keep=bool):
+    """
+    Returns the stored output of a stage for the given inputs, computing and storing it if there is none.
+
+    Only the outputs accepted by `keep` are stored, by default the ones that aren't empty, so failed
+    generations are retried on the next analysis.
+
+    :param video_dir: Directory of the video
+    :type video_dir: str
+    :param stage: Name of the stage
+    :type stage: str
+    :param key_parts: JSON serializable inputs that determine the output
+    :type key_parts: list
+    :param compute: Function that generates the output when it isn't stored
+    :param keep: Function telling if a generated output is complete and can be stored
+    :returns: The stored or generated output
+    """
+    if not Config.ARTIFACTS_ENABLED:
+        return compute()
+
+    value = load_artifact(video_dir, stage, key_parts)
+    ARTIFACT_REQUESTS.inc(stage=stage, result='hit' if value is not None else 'miss')
+    if value is not None:
+        logger.info(f"Reusing the stored {stage} of {video_dir}")
+        return value
+
+    value = compute()
+    if keep(value):
+        save_artifact(video_dir, stage, key_parts, value)
+    return value
@@ -0,0 +1,235 @@
+"""
+Resumable chunked uploads that stream video files to a session directory in UPLOAD_DIR/.sessions,
+moved to the directory of the video once the upload is complete.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from uuid import uuid4, UUID
+from werkzeug.utils import secure_filename
+from api.config import Config
+from api.utils.logger import logger
+
+UPLOAD_DIR = Config.UPLOAD_DIR
+SESSIONS_DIR = ".sessions" # Unfinished uploads, kept apart so they aren't taken for videos
+SESSION_FILE = "upload.json"
+BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """ Raised when an upload request can't be fulfilled, includes the HTTP status code to answer with. """
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadSession:
+    """ A class to represent an upload in progress and the running hash of the received bytes. """
+    def __init__(self, upload_id: str, filename: str, size: int):
+        self.id = upload_id
+        self.filename = filename
+        self.size = size
+        self.sha256 = hashlib.sha256()
+        self.hashed = 0
+        self.lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(UPLOAD_DIR, SESSIONS_DIR, self.id)
+
+    @property
+    def part_path(self) -> str:
+        return os.path.join(self.directory, f"{self.filename}.part")
+
+    @property
+    def offset(self) -> int:
+        return os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+
+    def to_dict(self) -> dict:
+        return {'upload_id': self.id, 'filename': self.filename, 'size': self.size, 'offset': self.offset}
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def create_upload(filename: str, size: int) -> UploadSession:
+    """
+    Starts a chunked upload for a video file.
+
+    :param filename: Name of the uploaded file
+    :type filename: str
+    :param size: Total size in bytes of the file
+    :type size: int
+    :returns: The created upload session
+    :raises UploadError: If the file name is invalid or the size is over the configured maximum
+    """
+    filename = secure_filename(filename or "")
+    if not filename:
+        raise UploadError("A valid file name is required")
+    if size <= 0:
+        raise UploadError("File size must be positive")
+    if size > Config.MAX_UPLOAD_BYTES:
+        raise UploadError(f"File is larger than the maximum of {Config.MAX_UPLOAD_BYTES} bytes", 413)
+
+    expire_uploads()
+    session = UploadSession(str(uuid4()), filename, size)
+    os.makedirs(session.directory, exist_ok=True)
+    open(session.part_path, 'wb').close()
+    with open(os.path.join(session.directory, SESSION_FILE), 'w') as f:
+        json.dump({'filename': filename, 'size': size}, f)
+
+    with _sessions_lock:
+        _sessions[session.id] = session
+    logger.info(f"Started chunked upload {session.id} of {filename} ({size} bytes)")
+    return session
+
+
+def get_upload(upload_id: str) -> UploadSession:
+    """
+    Returns an upload session, restoring it from disk if the server was restarted.
+
+    :raises UploadError: If the upload doesn't exist
+    """
+    try:
+        UUID(upload_id)
+    except ValueError:
+        raise UploadError("Upload not found", 404)
+
+    with _sessions_lock:
+        session = _sessions.get(upload_id)
+        if session is not None:
+            return session
+
+        session_path = os.path.join(UPLOAD_DIR, SESSIONS_DIR, upload_id, SESSION_FILE)
+        if not os.path.exists(session_path):
+            raise UploadError("Upload not found", 404)
+        with open(session_path, 'r') as f:
+            data = json.load(f)
+        session = UploadSession(upload_id, data['filename'], data['size'])
+        _sessions[upload_id] = session
+        return session
+
+
+def append_chunk(upload_id: str, offset: int, stream) -> int:
+    """
+    Appends a chunk read from a stream at the given offset of an upload, without buffering it whole.
+
+    :param upload_id: Identifier of the upload
+    :type upload_id: str
+    :param offset: Offset of the chunk, must match the bytes received so far
+    :type offset: int
+    :param stream: File-like object to read the chunk from
+    :returns: The new offset of the upload
+    :rtype: int
+    :raises UploadError: If the offset doesn't match or the chunk exceeds the declared size
+    """
+    session = get_upload(upload_id)
+    with session.lock:
+        current = session.offset
+        if offset != current:
+            raise UploadError(f"Expected chunk at offset {current}", 409)
+
+        written = 0
+        with open(session.part_path, 'ab') as f:
+            while True:
+                data = stream.read(BUFFER_SIZE)
+                if not data:
+                    break
+                if current + written + len(data) > session.size:
+                    f.truncate(current)
+                    if session.hashed > current:
+                        # The hash includes the discarded bytes, hash the file again when the upload is finalized
+                        session.sha256 = hashlib.sha256()
+                        session.hashed = 0
+                    raise UploadError("Chunk exceeds the declared file size", 413)
+                f.write(data)
+                if session.hashed == current + written:
+                    session.sha256.update(data)
+                    session.hashed += len(data)
+                written += len(data)
+        return current + written
+
+
+def finalize_upload(upload_id: str, checksum: str) -> tuple:
+    """
+    Verifies a completed upload against its checksum and moves it to the directory of the video.
+
+    :param upload_id: Identifier of the upload, also used as the video id
+    :type upload_id: str
+    :param checksum: Expected SHA-256 of the file as a hex string
+    :type checksum: str
+    :returns: (id, path, hash) of the stored video
+    :rtype: tuple
+    :raises UploadError: If the upload is incomplete or the checksum doesn't match
+    """
+    session = get_upload(upload_id)
+    with session.lock:
+        if session.offset != session.size:
+            raise UploadError(f"Upload is incomplete ({session.offset} of {session.size} bytes)", 409)
+
+        if session.hashed != session.size:
+            # Session restored from disk or a rejected chunk was discarded, hash the received file again
+            session.sha256 = hashlib.sha256()
+            with open(session.part_path, 'rb') as f:
+                for data in iter(lambda: f.read(BUFFER_SIZE), b''):
+                    session.sha256.update(data)
+            session.hashed = session.size
+
+        video_hash = session.sha256.hexdigest()
+        if video_hash != (checksum or "").lower():
+            raise UploadError("Checksum doesn't match the uploaded file")
+
+        video_dir = os.path.join(UPLOAD_DIR, upload_id)
+        os.makedirs(video_dir, exist_ok=True)
+        video_path = os.path.join(video_dir, session.filename)
+        os.replace(session.part_path, video_path)
+        shutil.rmtree(session.directory, ignore_errors=True)
+
+    with _sessions_lock:
+        _sessions.pop(upload_id, None)
+    logger.info(f"Finished chunked upload {upload_id}")
+    return upload_id, video_path, video_hash
+
+
+def last_activity(session_dir: str) -> float:
+    """ Returns the time of the last chunk received by an upload, or when it was started. """
+    times = [os.path.getmtime(os.path.join(session_dir, name)) for name in os.listdir(session_dir)]
+    return max(times, default=os.path.getmtime(session_dir))
+
+
+def expire_uploads() -> int:
+    """
+    Deletes the unfinished uploads that didn't receive a chunk in the last UPLOAD_SESSION_TTL seconds.
+    Uploads receiving a chunk are left alone.
+
+    :returns: The number of deleted uploads
+    :rtype: int
+    """
+    sessions_dir = os.path.join(UPLOAD_DIR, SESSIONS_DIR)
+    if not os.path.isdir(sessions_dir):
+        return 0
+    limit = time.time() - Config.UPLOAD_SESSION_TTL
+    expired = 0
+    for upload_id in os.listdir(sessions_dir):
+        session_dir = os.path.join(sessions_dir, upload_id)
+        with _sessions_lock:
+            session = _sessions.get(upload_id)
+            if session is not None and not session.lock.acquire(blocking=False):
+                continue
+            try:
+                if not os.path.isdir(session_dir) or last_activity(session_dir) >= limit:
+                    continue
+                shutil.rmtree(session_dir, ignore_errors=True)
+                _sessions.pop(upload_id, None)
+                expired += 1
+                logger.info(f"Deleted chunked upload {upload_id}, it didn't receive chunks for {Config.UPLOAD_SESSION_TTL}s")
+            except OSError as e:
+                logger.warning(f"Couldn't expire chunked upload {upload_id}: {e}")
+            finally:
+                if session is not None:
+                    session.lock.release()
+    return expired
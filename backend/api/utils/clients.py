@@ -0,0 +1,106 @@
+"""
+Registry of long-lived LLM and HTTP clients shared by the services, so requests reuse pooled keep-alive connections.
+
+The SDKs are imported when their first client is created, so starting the server doesn't wait for them.
+"""
+import threading
+from api.config import Config
+from api.utils.logger import logger
+
+_clients = {}
+_clients_lock = threading.RLock() # Factories can request the clients they depend on
+
+
+def get_client(key: tuple, factory):
+    """
+    Returns the client registered for a key, creating it with `factory` the first time.
+
+    :param key: Hashable description of the client configuration
+    :type key: tuple
+    :param factory: Function that creates the client
+    :returns: The shared client
+    """
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = factory()
+            _clients[key] = client
+            logger.debug(f"Created shared client {key}")
+    return client
+
+
+def http_client():
+    """ Returns the httpx client whose connection pool is shared by the OpenAI clients. """
+    def create():
+        import httpx
+        return httpx.Client(
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_POOL_SIZE,
+                max_keepalive_connections=Config.HTTP_POOL_SIZE,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_SECONDS
+            ),
+            # The OpenAI clients set the timeout of each request
+            timeout=None
+        )
+    return get_client(('http', Config.HTTP_POOL_SIZE, Config.HTTP_KEEPALIVE_SECONDS), create)
+
+
+def openai_client(timeout: float = None, max_retries: int = 0):
+    """
+    Returns a shared OpenAI SDK client.
+
+    Failed requests aren't retried by default, the services retry them with `call_with_retries`
+    so retries go through the shared rate limiters.
+
+    :param timeout: Timeout in seconds of each request, None uses the SDK default
+    :type timeout: float
+    :param max_retries: Retries of failed requests by the SDK
+    :type max_retries: int
+    """
+    def create():
+        from openai import OpenAI
+        kwargs = {'timeout': timeout} if timeout is not None else {}
+        return OpenAI(
+            api_key=Config.OPENAI_API_KEY,
+            base_url=Config.OPENAI_BASE_URL,
+            max_retries=max_retries,
+            http_client=http_client(),
+            **kwargs
+        )
+    return get_client(('openai', Config.OPENAI_BASE_URL, timeout, max_retries), create)
+
+
+def chat_model(temperature: float = 0.2, max_tokens: int = 300):
+    """
+    Returns the shared chat model of the configured LLM wrapper (OpenAI or Ollama), which records its token usage.
+    Requests should be sent with `call_with_retries` which rate limits and retries them.
+
+    :param temperature: Sampling temperature
+    :type temperature: float
+    :param max_tokens: Maximum tokens to generate
+    :type max_tokens: int
+    """
+    def create():
+        from api.utils.token_usage import TokenUsageCallbackHandler
+        if Config.LLM_WRAPPER == 'openai':
+            from langchain_openai.chat_models import ChatOpenAI
+            return ChatOpenAI(
+                api_key=Config.OPENAI_API_KEY,
+                base_url=Config.OPENAI_BASE_URL,
+                model=Config.LLM_MODEL,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=None,
+                max_retries=0,
+                http_client=http_client(),
+                stream_usage=True, # Report the token usage of streamed responses too
+                callbacks=[TokenUsageCallbackHandler(Config.LLM_MODEL)]
+            )
+        from langchain_ollama.chat_models import ChatOllama
+        return ChatOllama(
+            model=Config.LLM_MODEL,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            callbacks=[TokenUsageCallbackHandler(Config.LLM_MODEL)]
+        )
+    return get_client(('chat', Config.LLM_WRAPPER, Config.LLM_MODEL, temperature, max_tokens), create)
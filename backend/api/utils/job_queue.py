@@ -0,0 +1,174 @@
+"""
+Bounded local job queue used to run video processing and analysis outside of the request thread.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from uuid import uuid4
+from api.config import Config
+from api.utils.logger import logger
+from api.utils.metrics import JOBS_IN_PROGRESS
+
+# Stages reported for each kind of job
+UPLOAD_STAGES = ['audio', 'keyframes', 'transcript']
+ANALYSIS_STAGES = ['transcript', 'condensed_transcript', 'transcript_summary', 'keyframe_descriptions', 'holistic_summary', 'topics']
+COMBINED_ANALYSIS_STAGES = ['transcript', 'condensed_transcript', 'transcript_summary', 'keyframe_descriptions', 'holistic_analysis']
+
+
+class JobQueueFullError(Exception):
+    """ Raised when the queue already holds the maximum number of pending jobs. """
+
+
+class Job:
+    """ A class to represent a unit of work and the state of each of its stages. """
+    def __init__(self, kind: str, stages: list):
+        self.id = str(uuid4())
+        self.kind = kind
+        self.status = 'queued'
+        self.stages = {
+            name: {'state': 'pending', 'started_at': None, 'finished_at': None, 'duration': None}
+            for name in stages
+        }
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context manager that records the state and timings of a stage of the job.
+
+        :param name: Name of the stage being executed
+        :type name: str
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {'state': 'pending', 'started_at': None, 'finished_at': None, 'duration': None})
+            stage['state'] = 'running'
+            stage['started_at'] = time.time()
+        try:
+            yield
+        except Exception:
+            self._finish_stage(name, 'failed')
+            raise
+        self._finish_stage(name, 'done')
+
+    def skip_stage(self, name: str):
+        """ Marks a stage as skipped, e.g. when its output was reused. """
+        with self._lock:
+            if name in self.stages:
+                self.stages[name]['state'] = 'skipped'
+
+    def cancel_stage(self, name: str):
+        """ Marks a stage that didn't start as cancelled, e.g. when a stage it runs with failed. """
+        with self._lock:
+            if name in self.stages and self.stages[name]['state'] == 'pending':
+                self.stages[name]['state'] = 'cancelled'
+
+    def _finish_stage(self, name: str, state: str):
+        with self._lock:
+            stage = self.stages[name]
+            stage['state'] = state
+            stage['finished_at'] = time.time()
+            stage['duration'] = round(stage['finished_at'] - stage['started_at'], 3)
+
+    def is_finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_dict(self) -> dict:
+        """ Converts the job to a dictionary. """
+        with self._lock:
+            job = {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'stages': {name: dict(stage) for name, stage in self.stages.items()},
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+        if self.result is not None:
+            job['result'] = self.result
+        if self.error is not None:
+            job['error'] = self.error
+        return job
+
+
+class JobQueue:
+    """ A class to run jobs on a bounded pool of worker threads. """
+    def __init__(self, workers: int, max_pending: int, retention: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+        self.max_pending = max_pending
+        self.retention = retention
+        self.jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, stages: list, fn, *args, **kwargs) -> Job:
+        """
+        Enqueues a function to be executed by the worker pool.
+
+        The function receives the created job as the `job` keyword argument so it can report the progress of its stages.
+
+        :param kind: Kind of job (e.g. upload or analysis)
+        :type kind: str
+        :param stages: Names of the stages reported by the job
+        :type stages: list
+        :param fn: Function to execute
+        :returns: The created job
+        :raises JobQueueFullError: If the maximum number of pending jobs has been reached
+        """
+        job = Job(kind, stages)
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                raise JobQueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+            self._pending += 1
+            self.jobs[job.id] = job
+        JOBS_IN_PROGRESS.inc(kind=kind, status='queued')
+        logger.info(f"Enqueued {kind} job {job.id}")
+        self.executor.submit(self._run, job, fn, *args, **kwargs)
+        return job
+
+    def get(self, job_id: str):
+        """ Returns the job with the given id or None if it doesn't exist. """
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job: Job, fn, *args, **kwargs):
+        job.status = 'running'
+        job.started_at = time.time()
+        JOBS_IN_PROGRESS.dec(kind=job.kind, status='queued')
+        JOBS_IN_PROGRESS.inc(kind=job.kind, status='running')
+        try:
+            job.result = fn(*args, job=job, **kwargs)
+            job.finished_at = time.time()
+            job.status = 'done'
+            logger.info(f"Job {job.id} finished in {job.finished_at - job.started_at:.2f}s")
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.finished_at = time.time()
+            job.status = 'failed'
+        finally:
+            JOBS_IN_PROGRESS.dec(kind=job.kind, status='running')
+            with self._lock:
+                self._pending -= 1
+
+    def _prune(self):
+        """ Forgets finished jobs older than the retention period. """
+        limit = time.time() - self.retention
+        expired = [job_id for job_id, job in self.jobs.items() if job.is_finished() and job.finished_at < limit]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+def job_stage(job, name: str):
+    """ Returns a context manager tracking a stage of the job, or a no-op one if there is no job. """
+    return job.stage(name) if job is not None else nullcontext()
+
+
+job_queue = JobQueue(Config.JOB_WORKERS, Config.JOB_QUEUE_SIZE, Config.JOB_RETENTION)
@@ -1,36 +1,118 @@
 """
+Logger of the server. Records are put on a queue by the calling thread and formatted and written to the
+console and a size-rotated file by a background thread, so logging doesn't block the requests.
 """
 
-import logging
-from datetime import datetime
 import os
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from api.config import Config
+from api.utils.metrics import LOG_RECORDS_DROPPED
 
 # Make sure logs directory exits
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
+LOG_FILE = os.path.join(LOG_DIR, "video_analyzer.log")
+
+# Attributes of every LogRecord, the other attributes are extra fields given by the caller
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "truncated_chars"}
+
+
+class JSONFormatter(logging.Formatter):
+    """ Formats each record as a JSON object in one line, with the extra fields given by the caller. """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        if getattr(record, "truncated_chars", 0):
+            entry["truncated_chars"] = record.truncated_chars
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class PayloadFilter(logging.Filter):
+    """
+    Truncates messages longer than `max_chars` (transcripts, prompts, model outputs) and keeps only a
+    `debug_sample_rate` fraction of the truncated debug records.
+    """
+    def __init__(self, max_chars: int, debug_sample_rate: float = 1.0):
+        super().__init__()
+        self.max_chars = max_chars
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        if self.max_chars and len(message) > self.max_chars:
+            if record.levelno <= logging.DEBUG and random.random() >= self.debug_sample_rate:
+                return False
+            record.truncated_chars = len(message) - self.max_chars
+            message = f"{message[:self.max_chars]}... [truncated]"
+        # Render the message now so later changes to its arguments don't show up when it's written
+        record.msg = message
+        record.args = None
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """ Puts records on a bounded queue without waiting, dropping them while the queue is full and counting them in the metrics. """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in the process and the filter already rendered the message, the listener formats the record
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+def create_formatter() -> logging.Formatter:
+    if Config.LOG_FORMAT == "text":
+        return logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    return JSONFormatter()
+
 
 # Logger configuration
 logger = logging.getLogger("video_analyzer")
-logger.setLevel(logging.DEBUG)  # Use INFO or WARNING in production
+logger.setLevel(Config.LOG_LEVEL)
 
-# Generate timestamp for log file
-timestamp = datetime.now().strftime("%Y_%m_%d_%H:%M:%S")
+formatter = create_formatter()
 
-# File handler
-file_handler = logging.FileHandler(f"{LOG_DIR}/{timestamp}_video_analyzer.log")
-file_handler.setLevel(logging.DEBUG)
+# File handler, the file is created when the first record is written rather than on import
+file_handler = RotatingFileHandler(LOG_FILE, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT, delay=True)
+file_handler.setFormatter(formatter)
 
 # Console handler
 console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-
-# Formatter
-formatter = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
-file_handler.setFormatter(formatter)
 console_handler.setFormatter(formatter)
 
-# Add handlers to the logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
\ No newline at end of file
+# The handlers write the records from the listener thread
+queue_handler = NonBlockingQueueHandler(queue.Queue(Config.LOG_QUEUE_SIZE))
+queue_handler.addFilter(PayloadFilter(Config.LOG_MAX_MESSAGE_CHARS, Config.LOG_LARGE_DEBUG_SAMPLE_RATE))
+listener = QueueListener(queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+listener.start()
+# Write the records still in the queue when the process exits
+atexit.register(listener.stop)
+
+logger.addHandler(queue_handler)
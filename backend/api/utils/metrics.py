@@ -0,0 +1,199 @@
+"""
+Process-wide metrics of the server exposed in the Prometheus text format: stage latencies, ffmpeg durations,
+token counts, cache hit rates and requests in flight.
+"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from flask import g, request
+
+PREFIX = "video_analyzer_"
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+# Name of the stage being run, used to attribute the token usage to a service
+_current_stage = contextvars.ContextVar('metrics_stage', default='none')
+
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """ Base class of the metrics, a value per combination of label values. """
+    kind = None
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = PREFIX + name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"Metric {self.name} expects the labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> list:
+        """ Returns the (suffix, label values, extra label, value) of each sample of the metric. """
+        with self._lock:
+            return [("", key, "", value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(self.labels, key, extra)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """ A value that only increases, e.g. the number of tokens sent to a model. """
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """ A value that goes up and down, e.g. the requests being handled. """
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        """ Context manager that counts the code running inside it. """
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """ Counts of observed values (e.g. durations in seconds) in cumulative buckets, with their sum. """
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = STAGE_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            # Values are counted in every bucket they fit in, so the bucket counts are cumulative
+            counts = tuple(bucket_count + (value <= bound) for bound, bucket_count in zip(self.buckets, counts))
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """ Context manager that observes the seconds spent inside it, also when it raises. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        samples = []
+        for key, (counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                samples.append(("_bucket", key, f'le="{format_value(bound)}"', bucket_count))
+            samples.append(("_bucket", key, 'le="+Inf"', count))
+            samples.append(("_sum", key, "", total))
+            samples.append(("_count", key, "", count))
+        return samples
+
+
+def render() -> str:
+    """ Returns every metric in the Prometheus text exposition format. """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def stage_context(name: str):
+    """ Context manager that attributes the token usage recorded inside it to a stage. """
+    token = _current_stage.set(name)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def current_stage() -> str:
+    return _current_stage.get()
+
+
+def register_request_metrics(app):
+    """ Tracks the requests in flight and the request durations of every endpoint of the app. """
+
+    def endpoint() -> str:
+        # Label by route pattern rather than path so IDs in the URL don't create a series per video
+        return request.url_rule.rule if request.url_rule else 'unmatched'
+
+    @app.before_request
+    def start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_endpoint = endpoint()
+        HTTP_REQUESTS_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(error=None):
+        if 'metrics_start' not in g:
+            return
+        HTTP_REQUESTS_IN_FLIGHT.dec(endpoint=g.metrics_endpoint)
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - g.metrics_start,
+            endpoint=g.metrics_endpoint, method=request.method, status=g.get('metrics_status', 500)
+        )
+
+
+STAGE_DURATION = Histogram(
+    "stage_duration_seconds", "Duration of the stages of the upload and analysis pipelines.", ("pipeline", "stage", "status")
+)
+FFMPEG_DURATION = Histogram("ffmpeg_duration_seconds", "Duration of the ffmpeg and ffprobe processes.", ("operation",))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens sent to and generated by the models.", ("model", "service", "direction"))
+LLM_CALLS = Counter("llm_calls_total", "Calls to the models that reported their token usage.", ("model", "service"))
+CACHE_REQUESTS = Counter("cache_requests_total", "Lookups in the result cache.", ("namespace", "result"))
+ARTIFACT_REQUESTS = Counter("artifact_requests_total", "Lookups of stored analysis outputs.", ("stage", "result"))
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled.", ("endpoint",))
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Duration of the HTTP requests until their response starts.",
+    ("endpoint", "method", "status"), REQUEST_BUCKETS
+)
+JOBS_IN_PROGRESS = Gauge("jobs_in_progress", "Jobs waiting in the queue or running.", ("kind", "status"))
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the logging queue was full.")
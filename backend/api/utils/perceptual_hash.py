@@ -0,0 +1,90 @@
+"""
+Perceptual hashing of keyframes to find near-identical frames.
+"""
+import subprocess
+import numpy as np
+from api.utils.metrics import FFMPEG_DURATION
+
+HASH_INPUT_SIZE = 32 # Frames are scaled to 32x32 grayscale before the DCT
+HASH_SIZE = 8 # The 8x8 lowest frequencies make a 64 bit hash
+
+
+def load_grayscale_frames(frames_pattern: str, count: int, size: int = HASH_INPUT_SIZE) -> np.ndarray:
+    """
+    Decodes a numbered sequence of images into small grayscale arrays with a single ffmpeg process.
+
+    :param frames_pattern: ffmpeg image2 pattern of the frames (e.g. keyframes/frame_%02d.jpg) starting at 0
+    :type frames_pattern: str
+    :param count: Number of frames in the sequence
+    :type count: int
+    :param size: Width and height of the decoded frames
+    :type size: int
+    :returns: Array of shape (count, size, size) with the luminance of each frame
+    :rtype: np.ndarray
+    :raises subprocess.CalledProcessError: If ffmpeg fails to decode the frames
+    """
+    command = [
+        "ffmpeg", "-v", "error",
+        "-start_number", "0", "-i", frames_pattern,
+        "-frames:v", str(count),
+        "-vf", f"scale={size}:{size}:flags=area,format=gray",
+        "-f", "rawvideo", "pipe:"
+    ]
+    with FFMPEG_DURATION.time(operation='hash_frames'):
+        output = subprocess.run(command, check=True, capture_output=True).stdout
+    return np.frombuffer(output, dtype=np.uint8).reshape(-1, size, size)[:count]
+
+
+def dct_matrix(n: int) -> np.ndarray:
+    """ Returns the orthonormal DCT-II matrix of size n x n. """
+    k = np.arange(n).reshape(-1, 1)
+    i = np.arange(n).reshape(1, -1)
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def perceptual_hashes(frames: np.ndarray) -> np.ndarray:
+    """
+    Computes the DCT perceptual hash of a batch of grayscale frames.
+
+    :param frames: Array of shape (n, size, size)
+    :type frames: np.ndarray
+    :returns: Array of shape (n, 8) with the 64 bit hash of each frame packed in bytes
+    :rtype: np.ndarray
+    """
+    size = frames.shape[-1]
+    dct = dct_matrix(size)
+    coefficients = np.einsum('ij,njk,lk->nil', dct, frames.astype(np.float64), dct)
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(frames), -1)
+    # The DC coefficient only encodes the average brightness, leave it out of the median
+    medians = np.median(low[:, 1:], axis=1, keepdims=True)
+    return np.packbits(low > medians, axis=1)
+
+
+def hamming_distances(hashes: np.ndarray) -> np.ndarray:
+    """ Returns the matrix of pairwise Hamming distances between packed hashes. """
+    xor = np.bitwise_xor(hashes[:, None, :], hashes[None, :, :])
+    return np.unpackbits(xor, axis=2).sum(axis=2)
+
+
+def group_near_duplicates(hashes: np.ndarray, threshold: int) -> list:
+    """
+    Groups frames whose hashes are within a Hamming distance of a previously kept frame.
+
+    :param hashes: Packed hashes of the frames in temporal order
+    :type hashes: np.ndarray
+    :param threshold: Maximum Hamming distance between near-duplicate frames
+    :type threshold: int
+    :returns: A list of (kept index, [indices it represents]) in temporal order
+    :rtype: list
+    """
+    distances = hamming_distances(hashes)
+    groups = []
+    for i in range(len(hashes)):
+        kept = [group for group in groups if distances[group[0], i] <= threshold]
+        if kept:
+            min(kept, key=lambda group: distances[group[0], i])[1].append(i)
+        else:
+            groups.append((i, [i]))
+    return groups
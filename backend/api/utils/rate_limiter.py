@@ -0,0 +1,279 @@
+"""
+Adaptive rate limiting and retries shared by every request to the same model (LLM, vision and transcription APIs).
+"""
+import sys
+import json
+import time
+import random
+import threading
+from api.config import Config
+from api.utils.logger import logger
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+MIN_RATE_FACTOR = 0.1 # Lowest fraction of the configured rate the limiter slows down to
+RATE_RECOVERY_STEP = 0.05 # Fraction of the configured rate recovered after each successful request
+RESUME_SPREAD = 0.5 # Fraction of a pause over which the waiting requests resume
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled at `per_minute`, with bursts of up to a second's worth.
+
+    Reservations larger than the available amount are granted in advance and leave the bucket in debt,
+    so requests bigger than the burst size (e.g. long prompts) still go through at the sustained rate.
+    """
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate)
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float = 1) -> float:
+        """ Takes an amount from the bucket and returns the seconds to wait before using it. """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.available -= amount
+            return max(0.0, -self.available / self.rate)
+
+    def try_take(self, amount: float = 1) -> bool:
+        """ Takes an amount from the bucket only if it's available now. """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.available < amount:
+                return False
+            self.available -= amount
+            return True
+
+    def set_rate(self, per_minute: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = per_minute / 60
+
+    def drain(self):
+        """ Empties the bucket, so the next requests are paced at the rate rather than sent in a burst. """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.available = min(self.available, 0.0)
+
+
+class RateLimiter:
+    """
+    A class to limit the requests and tokens per minute sent to a model.
+
+    When the API answers that the limit was exceeded, every caller waits for the Retry-After delay and the
+    request rate is halved, then recovers gradually with each successful request (additive increase,
+    multiplicative decrease). Without a configured request rate, the number of concurrent requests is limited
+    the same way, starting from the requests in flight when the first rate limit is hit.
+    """
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.rate_factor = 1.0
+        self.concurrency = None # Concurrent requests allowed when there's no request rate, None until rate limited
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def _take_slot(self, blocking: bool) -> bool:
+        with self._lock:
+            while self.concurrency is not None and self.in_flight >= int(self.concurrency):
+                if not blocking:
+                    return False
+                self._released.wait()
+            self.in_flight += 1
+            return True
+
+    def _wait_for_pause(self, pause: float):
+        if pause > 0:
+            # Spread the callers waiting for the pause so they don't all resume at the same time
+            time.sleep(pause * (1 + random.uniform(0, RESUME_SPREAD)))
+
+    def acquire(self, tokens: int = 0, blocking: bool = True) -> bool:
+        """
+        Waits until a request with the given number of tokens is allowed. Each acquired request must
+        be released once its answer is received.
+
+        :param tokens: Estimated tokens of the request
+        :type tokens: int
+        :param blocking: If False, returns False right away when the request isn't allowed yet
+        :type blocking: bool
+        :returns: True if the request can be sent
+        :rtype: bool
+        """
+        pause = self.paused_until - time.monotonic()
+        if not blocking:
+            if pause > 0 or not self._take_slot(False):
+                return False
+            if self.requests and not self.requests.try_take():
+                self.release()
+                return False
+            if self.tokens and tokens:
+                self.tokens.reserve(tokens)
+            return True
+        self._wait_for_pause(pause)
+        wait = max(
+            self.requests.reserve() if self.requests else 0,
+            self.tokens.reserve(tokens) if self.tokens and tokens else 0
+        )
+        if wait > 0:
+            time.sleep(wait)
+        self._take_slot(True)
+        # A request rate limited while this one waited for a slot paused the others again
+        while self.paused_until > time.monotonic():
+            self.release()
+            self._wait_for_pause(self.paused_until - time.monotonic())
+            self._take_slot(True)
+        return True
+
+    def release(self):
+        """ Marks an acquired request as finished, letting a waiting request through the concurrency limit. """
+        with self._lock:
+            self.in_flight -= 1
+            self._released.notify()
+
+    def record_success(self):
+        with self._lock:
+            if self.requests and self.rate_factor < 1:
+                self.rate_factor = min(1.0, self.rate_factor + RATE_RECOVERY_STEP)
+                self.requests.set_rate(self.requests_per_minute * self.rate_factor)
+            elif self.concurrency is not None:
+                # About one more concurrent request each time the current limit of requests succeeded
+                self.concurrency += 1 / self.concurrency
+                self._released.notify()
+
+    def record_rate_limited(self, retry_after: float):
+        """ Pauses every request until the Retry-After delay has passed and slows down the request rate. """
+        with self._lock:
+            now = time.monotonic()
+            # Concurrent requests sent before the pause are rate limited together, slow down once for all of them
+            if now >= self.paused_until:
+                if self.requests:
+                    self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor / 2)
+                    self.requests.set_rate(self.requests_per_minute * self.rate_factor)
+                    self.requests.drain()
+                else:
+                    self.concurrency = max(1.0, (self.concurrency or self.in_flight) / 2)
+            self.paused_until = max(self.paused_until, now + retry_after)
+        if self.requests:
+            logger.warning(f"Rate limited by {self.name}, pausing {retry_after:.2f}s at {self.rate_factor:.0%} of the request rate")
+        else:
+            logger.warning(f"Rate limited by {self.name}, pausing {retry_after:.2f}s with {int(self.concurrency)} concurrent requests")
+
+
+# Settings with the default requests and tokens per minute of each backend, 0 disables a limit
+BACKEND_LIMITS = {
+    'llm': ('LLM_RPM', 'LLM_TPM'),
+    'vision': ('VISION_RPM', 'VISION_TPM'),
+    'transcription': ('TRANSCRIPTION_RPM', None),
+}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter(backend: str, model: str) -> RateLimiter:
+    """
+    Returns the rate limiter shared by the requests to a model, with the limits of MODEL_RATE_LIMITS
+    for the model or the defaults of its backend.
+
+    :param backend: Name of the backend, one of BACKEND_LIMITS
+    :type backend: str
+    :param model: Name of the model
+    :type model: str
+    """
+    rpm_setting, tpm_setting = BACKEND_LIMITS[backend]
+    limits = json.loads(Config.MODEL_RATE_LIMITS or '{}').get(model, {})
+    requests_per_minute = limits.get('rpm', getattr(Config, rpm_setting))
+    tokens_per_minute = limits.get('tpm', getattr(Config, tpm_setting) if tpm_setting else 0)
+    key = (backend, model, requests_per_minute, tokens_per_minute)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(model, requests_per_minute, tokens_per_minute)
+            logger.info(f"Limiting {backend} model {model} to {requests_per_minute or 'unlimited'} requests "
+                        f"and {tokens_per_minute or 'unlimited'} tokens per minute")
+        return _limiters[key]
+
+
+def is_retryable(error: Exception) -> bool:
+    """ Tells if a failed request can be retried (rate limits, timeouts, connection and server errors). """
+    # The error can only come from an SDK that is already loaded. Importing one here while other threads send
+    # requests would let them see the partially initialized module (the OpenAI SDK looks up httpx in sys.modules)
+    openai = sys.modules.get('openai')
+    httpx = sys.modules.get('httpx')
+    if openai and isinstance(error, openai.APIConnectionError):
+        return True
+    if httpx and isinstance(error, httpx.TransportError):
+        return True
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None and httpx and isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def retry_after(error: Exception):
+    """ Returns the delay in seconds requested by the Retry-After headers of a failed request, if any. """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        # HTTP dates aren't used by the APIs, fall back to the backoff
+        return None
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """ Returns the delay before retrying for the given attempt, an exponential backoff with full jitter. """
+    return random.uniform(0, min(Config.RETRY_MAX_DELAY, Config.RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def call_with_retries(backend: str, model: str, fn, tokens: int = 0):
+    """
+    Calls a model API through its rate limiter, retrying rate limited and transient failures with a
+    jittered exponential backoff that honors the Retry-After headers.
+
+    :param backend: Name of the backend, one of BACKEND_LIMITS
+    :type backend: str
+    :param model: Name of the model
+    :type model: str
+    :param fn: Function that sends the request
+    :param tokens: Estimated tokens of the request, for the tokens per minute limit
+    :type tokens: int
+    :returns: The result of `fn`
+    :raises Exception: The last error once the retries are exhausted, or errors that can't be retried
+    """
+    limiter = rate_limiter(backend, model)
+    attempts = max(1, Config.RETRY_MAX_ATTEMPTS)
+    for attempt in range(attempts):
+        limiter.acquire(tokens)
+        try:
+            result = fn()
+        except Exception as e:
+            limiter.release()
+            if not is_retryable(e) or attempt == attempts - 1:
+                raise
+            delay = retry_after(e)
+            if getattr(e, 'status_code', None) == 429:
+                limiter.record_rate_limited(delay if delay is not None else backoff_delay(attempt))
+                delay = 0 # The limiter pauses every request
+            elif delay is None:
+                delay = backoff_delay(attempt)
+            logger.warning(f"Request to {model} failed ({e.__class__.__name__}), retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        limiter.release()
+        limiter.record_success()
+        return result
@@ -0,0 +1,139 @@
+"""
+Persistent content-addressed cache for the outputs of the LLM services.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from api.config import Config
+from api.utils.logger import logger
+from api.utils.metrics import CACHE_REQUESTS
+
+
+class ResultCache:
+    """ A class to store JSON serializable results in SQLite with size-bounded LRU eviction. """
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, namespace TEXT, value TEXT, size INTEGER, accessed_at REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self._connection.commit()
+
+    def get(self, namespace: str, key: str):
+        """
+        Returns the cached value for a key or None if it isn't cached.
+
+        :param namespace: Namespace of the value, used for the hit/miss counters
+        :type namespace: str
+        :param key: Key of the value
+        :type key: str
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses[namespace] = self.misses.get(namespace, 0) + 1
+                return None
+            self._connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+            self.hits[namespace] = self.hits.get(namespace, 0) + 1
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value):
+        """
+        Stores a value and evicts the least recently used entries if the cache is over its size.
+
+        :param namespace: Namespace of the value
+        :type namespace: str
+        :param key: Key of the value
+        :type key: str
+        :param value: JSON serializable value to store
+        """
+        data = json.dumps(value)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, namespace, value, size, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, data, len(data), time.time())
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._connection.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} entries from the result cache")
+
+    def stats(self) -> dict:
+        """ Returns the hit/miss counters and the size of the cache. """
+        with self._lock:
+            entries, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            return {'hits': dict(self.hits), 'misses': dict(self.misses), 'entries': entries, 'bytes': size}
+
+
+def cache_key(namespace: str, parts: list) -> str:
+    """ Builds a key from the hash of a namespace and the inputs that determine a result. """
+    content = json.dumps([namespace, parts], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """ Returns the shared result cache or None if caching is disabled. """
+    global _cache
+    if not Config.CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(Config.CACHE_PATH, Config.CACHE_MAX_BYTES)
+            logger.info(f"Using result cache at {Config.CACHE_PATH}")
+    return _cache
+
+
+def cached(namespace: str, key_parts: list, compute):
+    """
+    Returns the cached result for the given inputs, computing and storing it on a miss.
+
+    Empty results are not stored so failed generations are retried on the next call.
+
+    :param namespace: Namespace of the result (e.g. the name of the generation step)
+    :type namespace: str
+    :param key_parts: JSON serializable inputs that determine the result (content, prompts, model...)
+    :type key_parts: list
+    :param compute: Function that generates the result on a cache miss
+    :returns: The cached or generated result
+    """
+    cache = get_cache()
+    if cache is None:
+        return compute()
+
+    key = cache_key(namespace, key_parts)
+    value = cache.get(namespace, key)
+    CACHE_REQUESTS.inc(namespace=namespace, result='hit' if value is not None else 'miss')
+    if value is not None:
+        logger.info(f"Result cache hit for {namespace}")
+        return value
+
+    value = compute()
+    if value:
+        cache.set(namespace, key, value)
+    return value
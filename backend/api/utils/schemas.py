@@ -4,6 +4,7 @@ Includes request schemas for the API endpoints.
 from marshmallow import Schema, fields, ValidationError, validate
 from pydantic import BaseModel, Field
 from typing import List
+from api.config import Config
 
 class AnalyzeVideoRequestSchema(Schema):
     """ Schema for the analyze video request. """
@@ -26,6 +27,15 @@ class AnalyzeVideoRequestSchema(Schema):
         }
     )
 
+class AnalyzeBatchRequestSchema(Schema):
+    """ Schema for the batch analysis request, each item has the options of an analyze video request. """
+    items = fields.List(
+        fields.Nested(AnalyzeVideoRequestSchema),
+        required=True,
+        validate=validate.Length(min=1, max=Config.BATCH_MAX_ITEMS),
+        error_messages={"required": "A list of items to analyze is required"}
+    )
+
 def validate_analyze_video_request(data, schema):
     """ Validates the analyze video request data. """
     try:
@@ -36,4 +46,10 @@ def validate_analyze_video_request(data, schema):
 class TopicResponse(BaseModel):
     """ Schema for topic extraction response."""
     topics: List[str] = Field(description="List of the relevant topics \
-        of a transcript and keyframe descriptions.")
\ No newline at end of file
+        of a transcript and keyframe descriptions.")
+
+class HolisticAnalysisResponse(BaseModel):
+    """ Schema for the combined holistic summary and topic extraction response."""
+    summary: str = Field(description="Summary of the video based on the transcript and keyframe descriptions.")
+    topics: List[str] = Field(description="List of the relevant topics \
+        of a transcript and keyframe descriptions.")
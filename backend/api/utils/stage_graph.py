@@ -0,0 +1,105 @@
+"""
+Small executor for a graph of dependent stages that runs every stage as soon as its dependencies are done.
+"""
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from api.utils.logger import logger
+from api.utils.job_queue import job_stage
+from api.utils.metrics import STAGE_DURATION, stage_context
+
+
+class Stage:
+    """ A class to represent a named unit of work and the stages it depends on. """
+    def __init__(self, name: str, fn, deps: tuple = ()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+def run_stages(stages: list, job=None, max_workers: int = None, on_result=None, pipeline: str = 'stages') -> tuple:
+    """
+    Runs a list of stages with maximal concurrency while respecting their dependencies.
+
+    Each stage function is called with the results of its dependencies as keyword arguments named after them.
+
+    :param stages: The stages to run
+    :type stages: list
+    :param job: Optional job used to report the progress of each stage
+    :param max_workers: Maximum number of stages running at the same time, defaults to the number of stages
+    :type max_workers: int
+    :param on_result: Optional function called with the name and result of each stage as soon as it finishes
+    :param pipeline: Name of the pipeline the stages belong to, used to label their duration metrics
+    :type pipeline: str
+    :returns: (results, timings) dictionaries with the result and wall time in seconds of each stage
+    :rtype: tuple
+    :raises ValueError: If a dependency is unknown or the graph has a cycle
+    :raises Exception: The first exception raised by a stage, once the running stages finished. The stages
+                       that didn't start are reported as cancelled in the job
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+    results, timings, finished_at = {}, {}, {}
+    pending = dict(by_name)
+    running = {}
+    start = time.perf_counter()
+
+    def execute(stage, kwargs):
+        with job_stage(job, stage.name), stage_context(stage.name):
+            stage_start = time.perf_counter()
+            try:
+                result = stage.fn(**kwargs)
+            except Exception:
+                STAGE_DURATION.observe(time.perf_counter() - stage_start, pipeline=pipeline, stage=stage.name, status='failed')
+                raise
+            stage_end = time.perf_counter()
+            STAGE_DURATION.observe(stage_end - stage_start, pipeline=pipeline, stage=stage.name, status='done')
+            return result, stage_start, stage_end
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1, thread_name_prefix='stage') as executor:
+        while pending or running:
+            ready = [stage for stage in pending.values() if all(dep in results for dep in stage.deps)]
+            for stage in ready:
+                del pending[stage.name]
+                kwargs = {dep: results[dep] for dep in stage.deps}
+                # Stages see the context of the caller (e.g. the token usage being tracked)
+                running[executor.submit(contextvars.copy_context().run, execute, stage, kwargs)] = stage
+            if not running:
+                raise ValueError(f"Stages {list(pending)} have circular dependencies")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    result, stage_start, stage_end = future.result()
+                except Exception:
+                    cancelled = [running[other].name for other in list(running) if other.cancel()] + list(pending)
+                    if job is not None:
+                        for name in cancelled:
+                            job.cancel_stage(name)
+                    # Stages already running can't be interrupted, they finish before the error is raised
+                    logger.error(f"Stage {stage.name} failed, cancelling stages {cancelled}")
+                    raise
+                results[stage.name] = result
+                timings[stage.name] = round(stage_end - stage_start, 3)
+                finished_at[stage.name] = stage_end - start
+                if on_result:
+                    on_result(stage.name, result)
+
+    logger.info(f"Stage timings (s): {timings}, total: {time.perf_counter() - start:.3f}")
+    logger.info(f"Critical path: {' -> '.join(critical_path(by_name, finished_at))}")
+    return results, timings
+
+
+def critical_path(stages: dict, finished_at: dict) -> list:
+    """ Follows the latest finishing dependency back from the last stage to finish. """
+    if not finished_at:
+        return []
+    path = [max(finished_at, key=finished_at.get)]
+    while stages[path[-1]].deps:
+        path.append(max(stages[path[-1]].deps, key=finished_at.get))
+    return list(reversed(path))
@@ -0,0 +1,88 @@
+"""
+Token counting and token-aware splitting of long texts for the LLM services.
+"""
+import re
+import threading
+from api.config import Config
+from api.utils.logger import logger
+
+CHARS_PER_TOKEN = 4 # Estimate used when no tokenizer is available for the model
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """ Returns the tiktoken encoding of the configured model, or None if it can't be loaded (e.g. offline). """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                try:
+                    _encoding = tiktoken.encoding_for_model(Config.LLM_MODEL)
+                except KeyError:
+                    # Models unknown to tiktoken, e.g. served by Ollama
+                    _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                logger.warning(f"Couldn't load a tokenizer, estimating {CHARS_PER_TOKEN} characters per token: {e}")
+                _encoding = None
+            _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """ Returns the number of tokens of a text for the configured model. """
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def chunk_text(text: str, max_tokens: int) -> list:
+    """
+    Splits a text into chunks of up to `max_tokens`, cutting between sentences when possible.
+
+    :param text: Text to split
+    :type text: str
+    :param max_tokens: Maximum number of tokens of a chunk
+    :type max_tokens: int
+    :returns: The chunks in order
+    :rtype: list
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence in split_sentences(text, max_tokens):
+        tokens = count_tokens(sentence) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def split_sentences(text: str, max_tokens: int):
+    """ Yields the sentences of a text, splitting the ones longer than `max_tokens` (e.g. without punctuation) by words. """
+    for sentence in SENTENCE_END.split(text.strip()):
+        if not sentence:
+            continue
+        if count_tokens(sentence) <= max_tokens:
+            yield sentence
+            continue
+        words = []
+        words_tokens = 0
+        for word in sentence.split():
+            tokens = count_tokens(word) + 1
+            if words and words_tokens + tokens > max_tokens:
+                yield " ".join(words)
+                words, words_tokens = [], 0
+            words.append(word)
+            words_tokens += tokens
+        if words:
+            yield " ".join(words)
@@ -0,0 +1,84 @@
+"""
+Counters of the tokens sent to and generated by the LLMs, per analysis and since the server started.
+"""
+import threading
+import contextvars
+from contextlib import contextmanager
+from api.utils.metrics import LLM_TOKENS, LLM_CALLS, current_stage
+
+
+class TokenUsage:
+    """ A class to accumulate the input and output tokens of the LLM calls of each model. """
+    def __init__(self):
+        self.models = {}
+        self._lock = threading.Lock()
+
+    def add(self, model: str, input_tokens: int, output_tokens: int):
+        with self._lock:
+            usage = self.models.setdefault(model, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0})
+            usage['calls'] += 1
+            usage['input_tokens'] += input_tokens
+            usage['output_tokens'] += output_tokens
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            models = {model: dict(usage) for model, usage in self.models.items()}
+        return {
+            'input_tokens': sum(usage['input_tokens'] for usage in models.values()),
+            'output_tokens': sum(usage['output_tokens'] for usage in models.values()),
+            'models': models
+        }
+
+
+totals = TokenUsage()
+_current = contextvars.ContextVar('token_usage', default=None)
+
+
+@contextmanager
+def track_token_usage():
+    """
+    Context manager that counts the tokens of the LLM calls made inside it, including the ones made by
+    threads started with a copy of the current context.
+
+    :returns: The TokenUsage of the calls
+    """
+    usage = TokenUsage()
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+
+
+def record_usage(model: str, input_tokens: int, output_tokens: int):
+    """ Adds the tokens of an LLM call to the totals, the metrics of the stage making it and the usage being tracked, if any. """
+    totals.add(model, input_tokens, output_tokens)
+    service = current_stage()
+    LLM_CALLS.inc(model=model, service=service)
+    LLM_TOKENS.inc(input_tokens, model=model, service=service, direction='input')
+    LLM_TOKENS.inc(output_tokens, model=model, service=service, direction='output')
+    usage = _current.get()
+    if usage is not None:
+        usage.add(model, input_tokens, output_tokens)
+
+
+def __getattr__(name: str):
+    # The LangChain callback is defined on first use so importing this module doesn't import LangChain
+    if name != 'TokenUsageCallbackHandler':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageCallbackHandler(BaseCallbackHandler):
+        """ LangChain callback that records the token usage reported by the chat models. """
+        def __init__(self, model: str):
+            self.model = model
+
+        def on_llm_end(self, response, **kwargs):
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                    if usage:
+                        record_usage(self.model, usage.get('input_tokens', 0), usage.get('output_tokens', 0))
+
+    globals()[name] = TokenUsageCallbackHandler
+    return TokenUsageCallbackHandler
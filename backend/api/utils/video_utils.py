@@ -1,29 +1,59 @@
 """ Util functions to interact with video files """
 import subprocess
 import os
+import re
 import glob
 import json
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from api.config import Config
 from api.utils.logger import logger
-from api.services.transcription_service import transcribe_audio
+from api.utils.metrics import FFMPEG_DURATION
+from api.utils.stage_graph import Stage, run_stages
+from api.utils.artifact_store import ARTIFACTS_DIR
+from api.utils.perceptual_hash import load_grayscale_frames, perceptual_hashes, group_near_duplicates
+from api.services.transcription_service import transcribe_audio_segments, join_segments
 from werkzeug.utils import secure_filename
 from uuid import uuid4
 from dotenv import load_dotenv
 
 load_dotenv()
 
-UPLOAD_DIR = os.getenv('UPLOAD_DIR')
-
-if not UPLOAD_DIR:
-    # Default fallback to relative path in local development
-    UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../uploads'))
+UPLOAD_DIR = Config.UPLOAD_DIR
 
 logger.debug(f"[DEBUG] Using UPLOAD_DIR={UPLOAD_DIR}")
 MAX_KEYFRAMES = int(os.getenv('MAX_KEYFRAMES', 10))
 MAX_KEYFRAMES = min(MAX_KEYFRAMES, 20) # Limit to 20 keyframes to avoid excessive processing
+INDEX_DIR = ".index" # Maps the SHA-256 of processed videos to their id
+UPLOAD_ERROR_FILE = "error.json" # Error of a failed upload job, analyses report it instead of waiting for data.json
+# Audio intermediate used for transcription: 'wav' (16-bit PCM), 'flac' (lossless) or 'opus' (lossy, smallest)
+AUDIO_FORMAT = os.getenv('AUDIO_FORMAT', 'wav')
+AUDIO_FORMATS = {'wav': 'wav', 'flac': 'flac', 'opus': 'ogg'} # Audio file extension of each format
+AUDIO_CODECS = {
+    'wav': ["-acodec", "pcm_s16le"],
+    'flac': ["-acodec", "flac", "-sample_fmt", "s16", "-compression_level", "5"],
+    'ogg': ["-acodec", "libopus", "-b:a", os.getenv('AUDIO_OPUS_BITRATE', '24k'), "-application", "voip"],
+}
+if AUDIO_FORMAT not in AUDIO_FORMATS:
+    raise ValueError(f"Invalid AUDIO_FORMAT {AUDIO_FORMAT}. Must be one of: {', '.join(AUDIO_FORMATS)}")
+KEYFRAMES_INDEX = "index.json" # Maps the keyframe files to their timestamp in the video
+# 'seek' probes the keyframe timestamps and only decodes the chosen frames, 'scan' decodes every I-frame of the video
+KEYFRAME_MODES = ('seek', 'scan')
+KEYFRAME_MODE = os.getenv('KEYFRAME_MODE', 'seek')
+if KEYFRAME_MODE not in KEYFRAME_MODES:
+    raise ValueError(f"Invalid KEYFRAME_MODE {KEYFRAME_MODE}. Must be one of: {', '.join(KEYFRAME_MODES)}")
+KEYFRAME_SEEK_WORKERS = int(os.getenv('KEYFRAME_SEEK_WORKERS', 4))
+# Maximum Hamming distance between perceptual hashes of near-duplicate keyframes, negative to keep every frame
+KEYFRAME_DEDUP_THRESHOLD = int(os.getenv('KEYFRAME_DEDUP_THRESHOLD', 10))
+# Keyframes are sent to the vision model as smaller copies, the low detail mode only looks at 512x512 pixels
+VISION_FRAME_SIZE = int(os.getenv('VISION_FRAME_SIZE', 512)) # Longest side in pixels
+VISION_FRAME_QUALITY = int(os.getenv('VISION_FRAME_QUALITY', 5)) # JPEG quality from 2 (best) to 31
 
 def extract_audio(video_path : str, audio_path : str) -> None:
     """
-    Extracts audio from a video file into a 165kHz WAV file by using ffmepg
+    Extracts audio from a video file into a 16kHz mono file by using ffmepg, encoded according to its extension
+    (PCM for .wav, FLAC for .flac, Opus for .ogg)
 
     :param video_path: The path of the video to extract audio from
     :type video_path: str
@@ -40,12 +70,9 @@ def extract_audio(video_path : str, audio_path : str) -> None:
         logger.error(f"Directory {os.path.dirname(audio_path)} does not exist")
         raise FileNotFoundError(f"Directory {os.path.dirname(audio_path)} does not exist")
     try:
-        command = [
-            "ffmpeg", "-i", video_path,
-            "-n", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1",
-            audio_path
-        ]
-        subprocess.run(command, check=True)
+        command = ["ffmpeg", "-i", video_path, "-n"] + audio_output_args(audio_path)
+        with FFMPEG_DURATION.time(operation='extract_audio'):
+            subprocess.run(command, check=True)
         logger.debug(f"Audio extraction was succesfull!")
     except subprocess.CalledProcessError as e:
         logger.error(f"Error during audio extraction: {str(e)}")
@@ -68,59 +95,357 @@ def extract_keyframes(video_path: str, output_dir: str, max_frames: int = 20) ->
 
     os.makedirs(output_dir, exist_ok=True)
 
+    # FFmpeg command using scene detection to extract distinct frames
+    command = ["ffmpeg", "-nostats", "-i", video_path] + keyframes_output_args(output_dir)
+
+    try:
+        with FFMPEG_DURATION.time(operation='extract_keyframes'):
+            result = subprocess.run(command, check=True, stderr=subprocess.PIPE, text=True)
+        logger.info(f"Keyframe extraction successful. Frames saved to {output_dir}")
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error during keyframe extraction: {str(e)}\n{e.stderr}")
+        raise e
+
+    downsample_keyframes(output_dir, max_frames, parse_frame_timestamps(result.stderr))
+
+def keyframes_output_args(output_dir: str) -> list:
+    """
+    Returns the ffmpeg output arguments that write every I-frame of the input as a JPEG, logging the timestamp
+    of each written frame (see `parse_frame_timestamps`)
+    """
     # Output template path for frames
     output_template = os.path.join(output_dir, "frame_%02d.jpg")
-
-    # FFmpeg command using scene detection to extract distinct frames
-    command = [
-        "ffmpeg",
-        "-i", video_path,
+    return [
+        "-map", "0:v:0",
         "-f", "image2",
-        "-vf", "select='eq(pict_type,PICT_TYPE_I)'",
+        "-vf", "select='eq(pict_type,PICT_TYPE_I)',showinfo",
         "-vsync", "vfr",
+        "-start_number", "0",
         output_template
     ]
 
-    try:
-        subprocess.run(command, check=True)
-        logger.info(f"Keyframe extraction successful. Frames saved to {output_dir}")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error during keyframe extraction: {str(e)}")
-        raise e
-    
-    # Gather all extracted frames
-    frame_paths = sorted(glob.glob(os.path.join(output_dir, "frame_*.jpg")))
+def parse_frame_timestamps(ffmpeg_output: str) -> list:
+    """
+    Returns the timestamps in seconds of the frames logged by the showinfo filter, in the order they were written.
+    They are relative to the start of the video, like the input seeking of ffmpeg.
+    """
+    return [
+        float(match.group(1))
+        for match in re.finditer(r"\[Parsed_showinfo_\d+ @ [^\]]*\] n: *\d+ .*?pts_time:(-?[\d.]+)", ffmpeg_output)
+    ]
+
+def downsample_keyframes(output_dir: str, max_frames: int, timestamps: list = None) -> int:
+    """
+    Keeps up to `max_frames` evenly spaced frames of a directory and renames them to frame_00.jpg, frame_01.jpg, etc.
+
+    :param output_dir: Directory with the extracted frames.
+    :param max_frames: Maximum number of keyframes to keep.
+    :param timestamps: Optional timestamp in seconds of each extracted frame, recorded in the keyframes index.
+    :returns: The number of frames retained.
+    """
+    # Gather all extracted frames in the order they were written
+    frame_paths = sorted(
+        glob.glob(os.path.join(output_dir, "frame_*.jpg")),
+        key=lambda path: int(os.path.basename(path)[len("frame_"):-len(".jpg")])
+    )
 
     total_frames = len(frame_paths)
     logger.info(f"Total keyframes extracted: {total_frames}")
+    if timestamps is None or len(timestamps) != total_frames:
+        if timestamps is not None:
+            logger.warning(f"Found {len(timestamps)} timestamps for {total_frames} keyframes, not recording them")
+        timestamps = [None] * total_frames
 
     # Downsample if needed
     if total_frames > max_frames:
         logger.info(f"Downsampling to {max_frames} frames evenly.")
 
         # Select evenly spaced indices
-        selected_indices = set(
-            round(i * (total_frames - 1) / (max_frames - 1)) for i in range(max_frames)
-        )
+        selected_indices = set(evenly_spaced_indices(total_frames, max_frames))
         logger.info(f"Indexes choosen to be kept: {selected_indices}")
 
         for idx, frame_path in enumerate(frame_paths):
             if idx not in selected_indices:
                 os.remove(frame_path)
+        frame_paths = [path for idx, path in enumerate(frame_paths) if idx in selected_indices]
+        timestamps = [timestamp for idx, timestamp in enumerate(timestamps) if idx in selected_indices]
+
+    # Rename retained frames to frame_00.jpg, frame_01.jpg, etc.
+    renumber_frames(output_dir, frame_paths)
+    write_keyframes_index(output_dir, [[timestamp] if timestamp is not None else [] for timestamp in timestamps])
 
-        # Rename retained frames to frame_00.jpg, frame_01.jpg, etc.
-        retained_paths = sorted(glob.glob(os.path.join(output_dir, "frame_*.jpg")))
-        for i, old_path in enumerate(retained_paths):
-            new_path = os.path.join(output_dir, f"frame_{i:02d}.jpg")
+    logger.info(f"Keyframe extraction complete. {len(frame_paths)} frames retained.")
+    return len(frame_paths)
+
+def evenly_spaced_indices(total: int, count: int) -> list:
+    """ Returns up to `count` evenly spaced indices of a sequence of `total` items, including the first and last ones """
+    if total <= count:
+        return list(range(total))
+    if count <= 1:
+        return [0]
+    return sorted(set(round(i * (total - 1) / (count - 1)) for i in range(count)))
+
+def renumber_frames(output_dir: str, frame_paths: list) -> None:
+    """ Renames the given frames, in order, to frame_00.jpg, frame_01.jpg, etc. """
+    for i, old_path in enumerate(frame_paths):
+        new_path = os.path.join(output_dir, f"frame_{i:02d}.jpg")
+        if old_path != new_path:
             os.rename(old_path, new_path)
 
-    logger.info(f"Keyframe extraction complete. {min(total_frames, max_frames)} frames retained.")
+def write_keyframes_index(output_dir: str, timestamps: list) -> None:
+    """ Stores the timestamps in seconds represented by each frame_XX.jpg of a directory, empty when unknown """
+    index = [{"file": f"frame_{i:02d}.jpg", "timestamps": frame_timestamps} for i, frame_timestamps in enumerate(timestamps)]
+    with open(os.path.join(output_dir, KEYFRAMES_INDEX), 'w') as f:
+        json.dump(index, f)
 
-def store_video(video_file):
+def read_keyframes_index(output_dir: str) -> list:
+    """ Returns the timestamps represented by each frame of a directory, empty lists if there is no index """
+    index_path = os.path.join(output_dir, KEYFRAMES_INDEX)
+    frame_count = len(glob.glob(os.path.join(output_dir, "frame_*.jpg")))
+    if not os.path.exists(index_path):
+        return [[] for _ in range(frame_count)]
+    with open(index_path, 'r') as f:
+        return [entry["timestamps"] for entry in json.load(f)]
+
+def probe_keyframe_timestamps(video_path: str) -> list:
     """
-    Generates an id for a video file and stores it on the system with its corresponding audio file, keyframes and transcript
-    :param video_file: The video to store
-    :returns id identifier for this video analysis storage
+    Lists the presentation timestamps of the keyframes of the first video stream with ffprobe. The decoder
+    skips every frame that isn't a keyframe, so only the keyframes are decoded.
+
+    :param video_path: Path to the input video.
+    :returns: Sorted timestamps in seconds, absolute like the timestamps of the stream.
+    :raises subprocess.CalledProcessError: If ffprobe fails.
+    """
+    command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-skip_frame", "nokey",
+        "-show_entries", "frame=pts_time",
+        "-of", "csv=print_section=0",
+        video_path
+    ]
+    with FFMPEG_DURATION.time(operation='probe_keyframes'):
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    timestamps = []
+    for line in output.splitlines():
+        pts_time = line.split(",")[0].strip()
+        if pts_time not in ("", "N/A"):
+            timestamps.append(float(pts_time))
+    return sorted(timestamps)
+
+def probe_format(video_path: str) -> tuple:
+    """ Returns the (start_time, duration) in seconds of a video by using ffprobe, 0.0 when they are unknown """
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=start_time,duration", "-of", "default=nw=1", video_path]
+    with FFMPEG_DURATION.time(operation='probe_format'):
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    values = dict(line.strip().partition("=")[::2] for line in output.splitlines() if "=" in line)
+    return tuple(
+        float(values[name]) if values.get(name, "N/A") not in ("", "N/A") else 0.0
+        for name in ("start_time", "duration")
+    )
+
+def choose_keyframe_timestamps(video_path: str, max_frames: int) -> list:
+    """
+    Chooses up to `max_frames` evenly spaced keyframe timestamps, or evenly spaced times if there is no keyframe index.
+    The timestamps are relative to the start of the video, like the input seeking of ffmpeg.
+    """
+    start_time, duration = probe_format(video_path)
+    timestamps = [max(round(timestamp - start_time, 6), 0.0) for timestamp in probe_keyframe_timestamps(video_path)]
+    if timestamps:
+        logger.info(f"Found {len(timestamps)} keyframes, choosing up to {max_frames}")
+        return [timestamps[i] for i in evenly_spaced_indices(len(timestamps), max_frames)]
+
+    logger.info(f"No keyframe index found, sampling {max_frames} frames over {duration:.2f}s")
+    return [round((i + 0.5) * duration / max_frames, 3) for i in range(max_frames)] if duration > 0 else [0.0]
+
+def extract_frame(video_path: str, timestamp: float, frame_path: str) -> None:
+    """ Seeks to a timestamp of a video and writes the frame found there as a JPEG """
+    command = [
+        "ffmpeg", "-v", "error", "-n",
+        "-ss", f"{timestamp:.3f}", "-i", video_path,
+        "-frames:v", "1", "-q:v", "2",
+        frame_path
+    ]
+    with FFMPEG_DURATION.time(operation='extract_frame'):
+        subprocess.run(command, check=True)
+
+def sample_keyframes(video_path: str, output_dir: str, max_frames: int = 20) -> None:
+    """
+    Extracts up to `max_frames` evenly spaced keyframes from a video by seeking directly to their timestamps,
+    so the time and disk I/O depend on the number of frames instead of the length of the video.
+
+    :param video_path: Path to the input video.
+    :param output_dir: Directory to save the extracted keyframes.
+    :param max_frames: Maximum number of keyframes to extract.
+    :raises FileNotFoundError: If the video file does not exist.
+    :raises subprocess.CalledProcessError: If ffprobe or ffmpeg fail during extraction.
+    """
+    logger.info(f"Sampling up to {max_frames} keyframes from: {video_path}")
+
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video file {video_path} does not exist")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        timestamps = choose_keyframe_timestamps(video_path, max_frames)
+        frame_paths = [os.path.join(output_dir, f"frame_{i:02d}.jpg") for i in range(len(timestamps))]
+        with ThreadPoolExecutor(max_workers=KEYFRAME_SEEK_WORKERS) as executor:
+            list(executor.map(lambda args: extract_frame(video_path, *args), zip(timestamps, frame_paths)))
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error during keyframe sampling: {str(e)}")
+        raise e
+
+    # Seeking past the last decodable frame writes nothing, keep the frames that exist
+    kept = [(timestamp, path) for timestamp, path in zip(timestamps, frame_paths) if os.path.exists(path)]
+    renumber_frames(output_dir, [path for _, path in kept])
+    write_keyframes_index(output_dir, [[timestamp] for timestamp, _ in kept])
+
+    logger.info(f"Keyframe sampling complete. {len(kept)} frames extracted at {[t for t, _ in kept]}")
+
+def deduplicate_keyframes(output_dir: str, threshold: int = 10) -> int:
+    """
+    Collapses near-identical keyframes of a directory by comparing their perceptual hashes. Each kept frame
+    records the timestamps of the frames it represents in the keyframes index.
+
+    :param output_dir: Directory with the frame_XX.jpg keyframes.
+    :param threshold: Maximum Hamming distance (out of 64 bits) between near-duplicate frames.
+    :returns: The number of frames kept.
+    :raises subprocess.CalledProcessError: If ffmpeg fails to decode the frames.
+    """
+    timestamps = read_keyframes_index(output_dir)
+    if len(timestamps) < 2:
+        return len(timestamps)
+
+    frames = load_grayscale_frames(os.path.join(output_dir, "frame_%02d.jpg"), len(timestamps))
+    groups = group_near_duplicates(perceptual_hashes(frames), threshold)
+
+    frame_paths = [os.path.join(output_dir, f"frame_{i:02d}.jpg") for i in range(len(timestamps))]
+    kept = {kept_index for kept_index, _ in groups}
+    for i, frame_path in enumerate(frame_paths):
+        if i not in kept:
+            os.remove(frame_path)
+    renumber_frames(output_dir, [frame_paths[kept_index] for kept_index, _ in groups])
+    write_keyframes_index(output_dir, [
+        sorted(timestamp for member in members for timestamp in timestamps[member])
+        for _, members in groups
+    ])
+
+    logger.info(f"Kept {len(groups)} of {len(timestamps)} keyframes after removing near duplicates")
+    return len(groups)
+
+def write_vision_frames(output_dir: str) -> int:
+    """
+    Writes a downscaled, re-encoded copy of each frame_XX.jpg of a directory as vision_XX.jpg with a single
+    ffmpeg process. The copies are sent to the vision model instead of the full resolution frames.
+
+    :param output_dir: Directory with the frame_XX.jpg keyframes.
+    :returns: The number of copies written.
+    :raises subprocess.CalledProcessError: If ffmpeg fails to convert the frames.
+    """
+    count = len(glob.glob(os.path.join(output_dir, "frame_*.jpg")))
+    if count == 0:
+        return 0
+    command = [
+        "ffmpeg", "-v", "error", "-y",
+        "-start_number", "0", "-i", os.path.join(output_dir, "frame_%02d.jpg"),
+        "-frames:v", str(count),
+        "-vf", f"scale='min({VISION_FRAME_SIZE},iw)':'min({VISION_FRAME_SIZE},ih)':force_original_aspect_ratio=decrease:flags=area",
+        "-q:v", str(VISION_FRAME_QUALITY),
+        "-start_number", "0", os.path.join(output_dir, "vision_%02d.jpg")
+    ]
+    with FFMPEG_DURATION.time(operation='vision_frames'):
+        subprocess.run(command, check=True)
+    return count
+
+def vision_frame_path(frame_path: str) -> str:
+    """ Returns the path of the downscaled copy of a frame_XX.jpg keyframe sent to the vision model """
+    directory, name = os.path.split(frame_path)
+    return os.path.join(directory, "vision_" + name[len("frame_"):])
+
+def prepare_keyframes(video_path: str, output_dir: str, max_frames: int = 20) -> None:
+    """ Samples the keyframes of a video, collapses near duplicates when it's enabled and writes their vision copies """
+    sample_keyframes(video_path, output_dir, max_frames)
+    finish_keyframes(output_dir)
+
+def scan_keyframes(video_path: str, output_dir: str, max_frames: int = 20) -> None:
+    """ Extracts the keyframes of a video by decoding every I-frame, then collapses near duplicates and writes their vision copies """
+    extract_keyframes(video_path, output_dir, max_frames)
+    finish_keyframes(output_dir)
+
+def finish_keyframes(output_dir: str) -> None:
+    """ Collapses near duplicate keyframes of a directory when it's enabled and writes their vision copies """
+    if KEYFRAME_DEDUP_THRESHOLD >= 0:
+        deduplicate_keyframes(output_dir, KEYFRAME_DEDUP_THRESHOLD)
+    write_vision_frames(output_dir)
+
+def audio_output_args(audio_path: str) -> list:
+    """ Returns the ffmpeg output arguments that write the first audio stream of the input as 16kHz mono audio """
+    extension = os.path.splitext(audio_path)[1].lstrip('.')
+    codec = AUDIO_CODECS.get(extension)
+    if codec is None:
+        raise ValueError(f"Unsupported audio file extension: {extension}")
+    return ["-map", "0:a:0"] + codec + ["-ar", "16000", "-ac", "1", audio_path]
+
+def audio_filename() -> str:
+    """ Returns the name of the audio file of a video for the configured audio format """
+    return f"audio.{AUDIO_FORMATS[AUDIO_FORMAT]}"
+
+def is_audio_file(name: str) -> bool:
+    """ Tells if a file name is an audio file of a video in any of the supported formats """
+    return name in (f"audio.{extension}" for extension in AUDIO_CODECS)
+
+def extract_media(video_path: str, audio_path: str, output_dir: str, max_frames: int = 20) -> None:
+    """
+    Extracts the audio file and up to `max_frames` keyframes of a video with a single ffmpeg process,
+    so the video is demuxed and decoded only once.
+
+    :param video_path: Path to the input video.
+    :param audio_path: The output path to store the audio file.
+    :param output_dir: Directory to save the extracted keyframes.
+    :param max_frames: Maximum number of keyframes to extract.
+    :raises FileNotFoundError: If the video file or the audio directory does not exist.
+    :raises subprocess.CalledProcessError: If ffmpeg fails during extraction.
+    """
+    logger.info(f"Extracting audio and up to {max_frames} keyframes from: {video_path}")
+    if not os.path.exists(video_path):
+        logger.error(f"File {video_path} does not exists...")
+        raise FileNotFoundError(f"File {video_path} does not exist")
+    if not os.path.exists(os.path.dirname(audio_path)):
+        logger.error(f"Directory {os.path.dirname(audio_path)} does not exist")
+        raise FileNotFoundError(f"Directory {os.path.dirname(audio_path)} does not exist")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    command = ["ffmpeg", "-nostats", "-i", video_path, "-n"] + audio_output_args(audio_path) + keyframes_output_args(output_dir)
+    try:
+        with FFMPEG_DURATION.time(operation='extract_media'):
+            result = subprocess.run(command, check=True, stderr=subprocess.PIPE, text=True)
+        logger.info(f"Audio and keyframe extraction successful. Frames saved to {output_dir}")
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error during audio and keyframe extraction: {str(e)}\n{e.stderr}")
+        raise e
+
+    downsample_keyframes(output_dir, max_frames, parse_frame_timestamps(result.stderr))
+
+class HashingWriter:
+    """ File-like object that computes the SHA-256 of the data while it's written to a file. """
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+def save_video(video_file):
+    """
+    Generates an id for a video file and saves it on the system, hashing its content while it's written
+    :param video_file: The video to save
+    :returns (id, path, hash) identifier for this video analysis storage, path of the saved video and its SHA-256
     """
     filename = secure_filename(video_file.filename)
     directory_id = str(uuid4())
@@ -130,31 +455,185 @@ def store_video(video_file):
     os.makedirs(save_dir, exist_ok=True)
 
     video_path = os.path.join(save_dir, filename)
-    video_file.save(video_path)
+    with open(video_path, 'wb') as f:
+        writer = HashingWriter(f)
+        video_file.save(writer)
+
+    return directory_id, video_path, writer.hexdigest()
+
+def find_processed_video(video_hash):
+    """
+    Looks for a previously processed video with the same content
+    :param video_hash: SHA-256 of the video
+    :returns id of the processed video or None if there isn't one with all its artifacts
+    """
+    index_path = os.path.join(UPLOAD_DIR, INDEX_DIR, video_hash)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r') as f:
+        video_id = f.read().strip()
+    video_dir = os.path.join(UPLOAD_DIR, video_id)
+    for artifact in ("keyframes", "data.json"):
+        if not os.path.exists(os.path.join(video_dir, artifact)):
+            return None
+    if not any(is_audio_file(name) for name in os.listdir(video_dir)):
+        return None
+    return video_id
 
-    # Extract audio
-    audio_path = os.path.join(save_dir, "audio.wav")
-    extract_audio(video_path, audio_path)
+def register_processed_video(video_hash, directory_id):
+    """ Records that the artifacts of a video content are stored under the given id """
+    index_dir = os.path.join(UPLOAD_DIR, INDEX_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_path = os.path.join(index_dir, f"{video_hash}.{directory_id}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(directory_id)
+    os.replace(tmp_path, os.path.join(index_dir, video_hash))
+
+def link_file(source, target):
+    """ Hardlinks a file, falling back to a copy when links aren't supported """
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
 
-    # Extract keyframes
+def link_artifacts(source_dir, target_dir, video_path):
+    """
+    Reuses the video, audio file, keyframes, transcript and stored analysis outputs of a processed video for another id
+    :param source_dir: Directory of the processed video
+    :param target_dir: Directory of the new video id
+    :param video_path: Path of the uploaded copy of the video, replaced by a link to the processed one
+    """
+    for name in os.listdir(source_dir):
+        source = os.path.join(source_dir, name)
+        if name in ("keyframes", ARTIFACTS_DIR):
+            os.makedirs(os.path.join(target_dir, name), exist_ok=True)
+            for frame in os.listdir(source):
+                link_file(os.path.join(source, frame), os.path.join(target_dir, name, frame))
+        elif os.path.isfile(source) and not is_audio_file(name) and name != "data.json":
+            # Processed video, shares the bytes of the new upload
+            link_file(source, video_path)
+        elif os.path.isfile(source):
+            link_file(source, os.path.join(target_dir, name))
+
+def process_video(directory_id, video_path, video_hash=None, job=None):
+    """
+    Extracts the audio file, keyframes and transcript of a saved video
+    If a video with the same hash was processed before, its artifacts are reused instead
+    If the extraction fails, the error is stored so analyses of the video report it instead of waiting for it
+    :param directory_id: Identifier of the video analysis storage
+    :param video_path: Path of the saved video
+    :param video_hash: Optional SHA-256 of the video used to deduplicate uploads
+    :param job: Optional job used to report the progress of each stage
+    :returns id identifier for this video analysis storage
+    """
+    try:
+        return extract_video_artifacts(directory_id, video_path, video_hash, job)
+    except Exception as e:
+        record_upload_error(directory_id, e)
+        raise
+
+def extract_video_artifacts(directory_id, video_path, video_hash=None, job=None):
+    """ Extracts or reuses the artifacts of a saved video, see `process_video` """
+    save_dir = os.path.join(UPLOAD_DIR, directory_id)
+
+    processed_id = find_processed_video(video_hash) if video_hash else None
+    if processed_id:
+        logger.info(f"Video {directory_id} is a duplicate of {processed_id}, reusing its artifacts")
+        link_artifacts(os.path.join(UPLOAD_DIR, processed_id), save_dir, video_path)
+        if job is not None:
+            for stage in ('audio', 'keyframes', 'transcript'):
+                job.skip_stage(stage)
+        return directory_id
+
+    audio_path = os.path.join(save_dir, audio_filename())
     keyframes_dir = os.path.join(save_dir, "keyframes")
     os.makedirs(keyframes_dir, exist_ok=True)
-    extract_keyframes(video_path, keyframes_dir, MAX_KEYFRAMES)
+    if KEYFRAME_MODE == 'scan':
+        # Extract audio while decoding every I-frame, with separate processes so the transcription doesn't wait for the scan
+        extract = lambda: scan_keyframes(video_path, keyframes_dir, MAX_KEYFRAMES)
+    else:
+        # Extract audio while seeking to the chosen keyframes
+        extract = lambda: prepare_keyframes(video_path, keyframes_dir, MAX_KEYFRAMES)
+    stages = [
+        Stage('audio', lambda: extract_audio(video_path, audio_path)),
+        Stage('keyframes', extract),
+        # Transcription only needs the audio, it runs while the keyframes are extracted
+        Stage('transcript', lambda audio: transcribe_audio_segments(audio_path), deps=('audio',)),
+    ]
+    results, _ = run_stages(stages, job, pipeline='upload')
 
-    # Generate and store transcript
+    # Store transcript
     transcript_path = os.path.join(save_dir, "data.json")
-    transcript = transcribe_audio(audio_path)
-    with open(transcript_path, 'w') as f:
-        json.dump({"transcript": transcript}, f)
+    segments = results['transcript']
+    transcript = join_segments(segments)
+    # Written to a temporary file first, analyses only accept videos once data.json exists
+    tmp_path = f"{transcript_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"transcript": transcript, "segments": segments}, f)
+    os.replace(tmp_path, transcript_path)
     logger.info(f"Transcript stored in {transcript_path}")
 
+    if video_hash:
+        register_processed_video(video_hash, directory_id)
+
     return directory_id
 
+def store_video(video_file):
+    """
+    Generates an id for a video file and stores it on the system with its corresponding audio file, keyframes and transcript
+    :param video_file: The video to store
+    :returns id identifier for this video analysis storage
+    """
+    directory_id, video_path, video_hash = save_video(video_file)
+    return process_video(directory_id, video_path, video_hash)
+
 def video_exits(video_id):
     video_dir = os.path.join(UPLOAD_DIR, video_id)
     return os.path.exists(video_dir)
 
+class VideoNotReadyError(Exception):
+    """ Raised when a video is analyzed before its upload job stored its transcript. """
+
+class VideoProcessingError(VideoNotReadyError):
+    """ Raised when a video is analyzed after its upload job failed, it has to be uploaded again. """
+
+def video_ready(video_id):
+    """ Tells if the upload job of a video finished, data.json is the last artifact it writes """
+    return os.path.exists(os.path.join(UPLOAD_DIR, video_id, "data.json"))
+
+def record_upload_error(video_id, error):
+    """ Stores the error that made the upload job of a video fail """
+    error_path = os.path.join(UPLOAD_DIR, video_id, UPLOAD_ERROR_FILE)
+    try:
+        with open(f"{error_path}.tmp", 'w') as f:
+            json.dump({"error": str(error)}, f)
+        os.replace(f"{error_path}.tmp", error_path)
+    except OSError as e:
+        logger.error(f"Error recording the failed upload of video {video_id}: {str(e)}")
+
+def upload_error(video_id):
+    """ Returns the error that made the upload job of a video fail, or None if it didn't fail """
+    error_path = os.path.join(UPLOAD_DIR, video_id, UPLOAD_ERROR_FILE)
+    if not os.path.exists(error_path):
+        return None
+    with open(error_path, 'r') as f:
+        return json.load(f).get("error", "Unknown error")
+
+def not_ready_error(video_id) -> VideoNotReadyError:
+    """ Returns the error to raise for a video that isn't ready, telling if its upload job failed or is still running """
+    error = upload_error(video_id)
+    if error is not None:
+        return VideoProcessingError(f"Processing of video {video_id} failed ({error}), upload it again")
+    return VideoNotReadyError(f"Video {video_id} is still processing")
+
 def get_audio_file(video_id):
     video_dir = os.path.join(UPLOAD_DIR, video_id)
-    audio_path = os.path.join(video_dir, "audio.wav")
-    return audio_path if os.path.exists(audio_path) else None
\ No newline at end of file
+    # Prefer the configured format, videos stored before a format change keep their audio file
+    names = [audio_filename()] + [f"audio.{extension}" for extension in AUDIO_CODECS]
+    for name in names:
+        audio_path = os.path.join(video_dir, name)
+        if os.path.exists(audio_path):
+            return audio_path
+    return None
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Compares the audio intermediate formats by extraction time, disk footprint and transcription upload time.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_audio --durations 60 600 --bandwidth-mbps 20
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from benchmarks.synthetic import generate_video
+from benchmarks.bench_ffmpeg import silenced_stderr
+from api.utils.video_utils import AUDIO_FORMATS, extract_audio
+
+
+def measure(video_path: str, extension: str, repeats: int) -> tuple:
+    """ Returns the best wall time in seconds of extracting the audio of a video and the size of the file. """
+    timings = []
+    for _ in range(repeats):
+        work_dir = tempfile.mkdtemp()
+        try:
+            audio_path = os.path.join(work_dir, f"audio.{extension}")
+            with silenced_stderr():
+                start = time.perf_counter()
+                extract_audio(video_path, audio_path)
+                timings.append(time.perf_counter() - start)
+            size = os.path.getsize(audio_path)
+        finally:
+            shutil.rmtree(work_dir)
+    return min(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--durations", type=int, nargs="+", default=[60, 600], help="Video lengths in seconds")
+    parser.add_argument("--audio", choices=["sine", "noise"], default="noise", help="Audio track of the videos")
+    parser.add_argument("--bandwidth-mbps", type=float, default=20, help="Upload bandwidth to the transcription API")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--videos-dir", default=os.path.join(tempfile.gettempdir(), "video_analyzer_bench"))
+    parser.add_argument("--output", help="Optional path to store the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'duration (s)':>12} {'format':>7} {'extract (s)':>12} {'size (MB)':>10} {'MB/min':>7} {'upload (s)':>11}")
+    for duration in args.durations:
+        video_path = generate_video(
+            os.path.join(args.videos_dir, f"synthetic_{duration}s_{args.audio}.mp4"), duration, audio=args.audio
+        )
+        for audio_format, extension in AUDIO_FORMATS.items():
+            extract, size = measure(video_path, extension, args.repeats)
+            megabytes = size / 1e6
+            upload = size * 8 / (args.bandwidth_mbps * 1e6)
+            results.append({
+                "duration": duration, "format": audio_format, "extract": extract,
+                "bytes": size, "mb_per_minute": megabytes * 60 / duration, "upload": upload
+            })
+            print(
+                f"{duration:>12} {audio_format:>7} {extract:>12.2f} {megabytes:>10.2f} "
+                f"{megabytes * 60 / duration:>7.2f} {upload:>11.2f}"
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
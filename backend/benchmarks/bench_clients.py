@@ -0,0 +1,78 @@
+"""
+Compares the latency of chat requests creating a client per call against the shared clients of api.utils.clients.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_clients --requests 400 --concurrency 1 8 32 --latency 0.02
+"""
+import sys
+import json
+import time
+import argparse
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_openai.chat_models import ChatOpenAI
+from langchain_core.messages import HumanMessage
+from benchmarks.stub_server import start_stub_server
+from api.config import Config
+from api.utils import clients
+
+MODEL = "stub-model"
+
+
+def per_call(base_url: str):
+    """ Creates a client for the request, as the services did before sharing them. """
+    model = ChatOpenAI(api_key="stub", base_url=base_url, model=MODEL, temperature=0.2, max_tokens=300, max_retries=2)
+    return model.invoke([HumanMessage(content="Hello")])
+
+
+def shared(base_url: str):
+    return clients.chat_model().invoke([HumanMessage(content="Hello")])
+
+
+def measure(fn, base_url: str, requests: int, concurrency: int) -> dict:
+    """ Returns the latency percentiles in milliseconds and the throughput of running the requests concurrently. """
+    def timed(_):
+        start = time.perf_counter()
+        fn(base_url)
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(concurrency))) # Warm up
+        start = time.perf_counter()
+        latencies = list(executor.map(timed, range(requests)))
+        elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"mean": float(np.mean(latencies)), "p50": p50, "p95": p95, "p99": p99, "throughput": requests / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the stub server waits before answering")
+    parser.add_argument("--output", help="Optional path to store the results as JSON")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.latency)
+    results = []
+    print(f"{'clients':>8} {'concurrency':>11} {'mean (ms)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'req/s':>8}")
+    with patch.object(Config, "OPENAI_BASE_URL", base_url), patch.object(Config, "LLM_WRAPPER", "openai"), \
+            patch.object(Config, "LLM_MODEL", MODEL):
+        for concurrency in args.concurrency:
+            for name, fn in (("per call", per_call), ("shared", shared)):
+                result = measure(fn, base_url, args.requests, concurrency)
+                results.append({"clients": name, "concurrency": concurrency, **result})
+                print(
+                    f"{name:>8} {concurrency:>11} {result['mean']:>10.1f} {result['p50']:>9.1f} "
+                    f"{result['p95']:>9.1f} {result['p99']:>9.1f} {result['throughput']:>8.0f}"
+                )
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Measures the upload and analysis latency percentiles and the throughput of the API at different concurrencies,
+with synthetic videos and a local stub of the model APIs with a configurable latency and rate of 429 responses.
+
+Each run is stored as JSON so it can be compared with a previous one with --baseline.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_e2e --videos 8 --concurrency 1 2 4 --latency 0.5 --rate-limit-ratio 0.1
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.synthetic import generate_video
+from benchmarks.stub_server import start_stub_server
+from benchmarks.bench_ffmpeg import silenced_stderr
+from api import create_app, routes
+from api.config import Config
+from api.services import analysis_service
+from api.utils import video_utils
+from api.utils.logger import logger
+from api.utils.job_queue import JobQueue
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PERCENTILES = (50, 90, 95, 99)
+POLL_SECONDS = 0.05
+
+
+def percentile(values: list, p: float) -> float:
+    """ Returns the p-th percentile of the values, interpolating linearly between the closest ranks. """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def summarize(values: list) -> dict:
+    """ Returns the percentiles, mean and maximum of latencies in seconds. """
+    if not values:
+        return {}
+    summary = {f"p{p}": round(percentile(values, p), 3) for p in PERCENTILES}
+    summary["mean"] = round(sum(values) / len(values), 3)
+    summary["max"] = round(max(values), 3)
+    return summary
+
+
+def make_variants(source_path: str, count: int, output_dir: str) -> list:
+    """
+    Copies a video `count` times with a different metadata tag, without re-encoding, so every upload has its own
+    content hash and isn't answered with the artifacts of a previous upload.
+    """
+    paths = []
+    for i in range(count):
+        path = os.path.join(output_dir, f"variant_{i:03d}.mp4")
+        subprocess.run([
+            "ffmpeg", "-loglevel", "error", "-y", "-i", source_path,
+            "-map", "0", "-c", "copy", "-metadata", f"comment=variant {i} {time.time_ns()}", path
+        ], check=True)
+        paths.append(path)
+    return paths
+
+
+def wait_for_job(client, job_id: str, timeout: float) -> dict:
+    """ Polls a job until it finishes, returns its final state. """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").get_json()["data"]
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(POLL_SECONDS)
+    raise TimeoutError(f"Job {job_id} didn't finish in {timeout}s")
+
+
+def submit(client, method, url: str, timeout: float, **kwargs) -> tuple:
+    """ Submits a job, retrying while the queue is full, and returns (final job state, seconds since submitted). """
+    start = time.perf_counter()
+    while True:
+        response = method(url, **kwargs)
+        if response.status_code != 503:
+            break
+        time.sleep(POLL_SECONDS)
+    if response.status_code != 202:
+        raise RuntimeError(f"{url} answered {response.status_code}: {response.get_data(as_text=True)}")
+    data = response.get_json()["data"]
+    job = wait_for_job(client, data["job_id"], timeout)
+    job["video_id"] = data["id"]
+    return job, time.perf_counter() - start
+
+
+def ingest_and_analyze(app, video_path: str, args) -> dict:
+    """ Uploads a video, analyzes it once it's processed and returns the latency of both. """
+    client = app.test_client()
+    with open(video_path, "rb") as f:
+        upload, upload_seconds = submit(
+            client, client.post, "/api/upload_video", args.timeout,
+            data={"video": (f, os.path.basename(video_path))}, content_type="multipart/form-data"
+        )
+    outcome = {"upload": upload_seconds, "upload_status": upload["status"]}
+    if upload["status"] != "done":
+        outcome["error"] = upload.get("error")
+        return outcome
+
+    analysis, analyze_seconds = submit(
+        client, client.post, "/api/analyze_video", args.timeout,
+        json={"video_id": upload["video_id"], "language": args.language, "summary_type": args.summary_type}
+    )
+    outcome.update(analyze=analyze_seconds, analyze_status=analysis["status"])
+    if analysis["status"] != "done":
+        outcome["error"] = analysis.get("error")
+    else:
+        outcome["tokens"] = analysis["result"].get("token_usage", {})
+    return outcome
+
+
+def run_level(app, videos: list, concurrency: int, server, args) -> dict:
+    """ Ingests and analyzes the videos with `concurrency` clients and job workers. """
+    requests, rate_limited = server.requests, server.rate_limited
+    queue = JobQueue(args.job_workers or concurrency, max(Config.JOB_QUEUE_SIZE, len(videos)), Config.JOB_RETENTION)
+    with patch.object(routes, "job_queue", queue):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(lambda path: ingest_and_analyze(app, path, args), videos))
+        elapsed = time.perf_counter() - start
+    queue.executor.shutdown()
+
+    succeeded = [o for o in outcomes if o.get("analyze_status") == "done"]
+    return {
+        "concurrency": concurrency,
+        "videos": len(videos),
+        "succeeded": len(succeeded),
+        "failed": len(outcomes) - len(succeeded),
+        "errors": sorted({str(o["error"]) for o in outcomes if o.get("error")}),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_videos_per_minute": round(len(succeeded) / elapsed * 60, 2),
+        "upload_seconds": summarize([o["upload"] for o in outcomes if o.get("upload_status") == "done"]),
+        "analyze_seconds": summarize([o["analyze"] for o in succeeded]),
+        "total_seconds": summarize([o["upload"] + o["analyze"] for o in succeeded]),
+        "stub_requests": server.requests - requests,
+        "stub_rate_limited": server.rate_limited - rate_limited,
+        "tokens": {
+            direction: sum(o["tokens"].get(direction, 0) for o in succeeded)
+            for direction in ("input_tokens", "output_tokens")
+        },
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str):
+    """ Prints the change of the median and p95 latencies and of the throughput against a previous run. """
+    with open(baseline_path, "r") as f:
+        baseline = {level["concurrency"]: level for level in json.load(f)["levels"]}
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'concurrency':>11} {'metric':>24} {'baseline':>9} {'current':>9} {'change':>8}")
+    for level in results["levels"]:
+        previous = baseline.get(level["concurrency"])
+        if previous is None:
+            continue
+        metrics = [
+            (f"{name} {p}", previous[name].get(p), level[name].get(p))
+            for name in ("upload_seconds", "analyze_seconds") for p in ("p50", "p95")
+        ]
+        metrics.append(("videos/minute", previous["throughput_videos_per_minute"], level["throughput_videos_per_minute"]))
+        for name, before, after in metrics:
+            if before and after is not None:
+                print(f"{level['concurrency']:>11} {name:>24} {before:>9.2f} {after:>9.2f} {(after - before) / before:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=8, help="Videos uploaded and analyzed at each concurrency")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="Clients at the same time")
+    parser.add_argument("--job-workers", type=int, default=0, help="Workers of the job queue, 0 uses the concurrency")
+    parser.add_argument("--duration", type=int, default=60, help="Length of the videos in seconds")
+    parser.add_argument("--resolution", default="1280x720", help="Resolution of the videos WIDTHxHEIGHT")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds the stub takes to answer each request")
+    parser.add_argument("--output-token-latency", type=float, default=0.0, help="Seconds per generated token")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="Approximate tokens of each text of the answers")
+    parser.add_argument("--requests-per-second", type=int, default=0, help="Requests accepted per second, 0 is unlimited")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--summary-type", default="concise")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache and stored artifacts enabled")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for each job")
+    parser.add_argument("--videos-dir", default=os.path.join(tempfile.gettempdir(), "video_analyzer_bench"))
+    parser.add_argument("--output", help=f"JSON file of the results, defaults to a timestamped file in {RESULTS_DIR}")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    source_path = generate_video(
+        os.path.join(args.videos_dir, f"synthetic_{args.duration}s_{args.resolution}.mp4"), args.duration, width, height
+    )
+    server, base_url = start_stub_server(
+        latency=args.latency, requests_per_second=args.requests_per_second, output_token_latency=args.output_token_latency,
+        answer_tokens=args.answer_tokens, rate_limit_ratio=args.rate_limit_ratio
+    )
+    work_dir = tempfile.mkdtemp()
+    upload_dir = os.path.join(work_dir, "uploads")
+    logger.setLevel(logging.WARNING)
+    levels = []
+    try:
+        with silenced_stderr(), patch.object(video_utils, "UPLOAD_DIR", upload_dir), \
+                patch.object(analysis_service, "UPLOAD_DIR", upload_dir), \
+                patch.object(Config, "OPENAI_BASE_URL", base_url), patch.object(Config, "TRANSCRIPTION_BACKEND", "openai"), \
+                patch.object(Config, "CACHE_ENABLED", args.cache), patch.object(Config, "ARTIFACTS_ENABLED", args.cache):
+            app = create_app()
+            for concurrency in args.concurrency:
+                level_dir = os.path.join(work_dir, f"videos_{concurrency}")
+                os.makedirs(level_dir)
+                videos = make_variants(source_path, args.videos, level_dir)
+                levels.append(run_level(app, videos, concurrency, server, args))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "benchmark": "e2e",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {**vars(args), "llm_wrapper": Config.LLM_WRAPPER, "combined_analysis": Config.COMBINED_ANALYSIS},
+        "levels": levels,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'concurrency':>11} {'ok':>4} {'failed':>6} {'videos/min':>10} {'upload p50':>10} {'p95':>7} "
+          f"{'analyze p50':>11} {'p95':>7} {'429s':>5}")
+    for level in levels:
+        upload, analyze = level["upload_seconds"], level["analyze_seconds"]
+        print(f"{level['concurrency']:>11} {level['succeeded']:>4} {level['failed']:>6} "
+              f"{level['throughput_videos_per_minute']:>10.2f} {upload.get('p50', 0):>10.2f} {upload.get('p95', 0):>7.2f} "
+              f"{analyze.get('p50', 0):>11.2f} {analyze.get('p95', 0):>7.2f} {level['stub_rate_limited']:>5}")
+        for error in level["errors"]:
+            print(f"{'':>11} error: {error}")
+    print(f"\nResults written to {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Compares the wall time of extracting audio and keyframes with two ffmpeg processes, a single pass and keyframe seeking.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_ffmpeg --durations 30 120 300
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.synthetic import generate_video
+from api.utils.video_utils import extract_audio, extract_keyframes, extract_media, sample_keyframes
+
+
+@contextmanager
+def silenced_stderr():
+    """ Hides the ffmpeg output written to stderr by the extraction functions. """
+    stderr = os.dup(2)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 2)
+        try:
+            yield
+        finally:
+            os.dup2(stderr, 2)
+            os.close(stderr)
+
+
+def two_pass(video_path: str, work_dir: str, max_frames: int):
+    extract_audio(video_path, os.path.join(work_dir, "audio.wav"))
+    extract_keyframes(video_path, os.path.join(work_dir, "keyframes"), max_frames)
+
+
+def single_pass(video_path: str, work_dir: str, max_frames: int):
+    extract_media(video_path, os.path.join(work_dir, "audio.wav"), os.path.join(work_dir, "keyframes"), max_frames)
+
+
+def seek(video_path: str, work_dir: str, max_frames: int):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        audio = executor.submit(extract_audio, video_path, os.path.join(work_dir, "audio.wav"))
+        keyframes = executor.submit(sample_keyframes, video_path, os.path.join(work_dir, "keyframes"), max_frames)
+        audio.result(), keyframes.result()
+
+
+def measure(fn, video_path: str, max_frames: int, repeats: int) -> float:
+    """ Returns the best wall time in seconds of running an extraction on a fresh directory. """
+    timings = []
+    for _ in range(repeats):
+        work_dir = tempfile.mkdtemp()
+        try:
+            with silenced_stderr():
+                start = time.perf_counter()
+                fn(video_path, work_dir, max_frames)
+                timings.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(work_dir)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--durations", type=int, nargs="+", default=[30, 120, 300], help="Video lengths in seconds")
+    parser.add_argument("--resolution", default="1280x720", help="Video resolution WIDTHxHEIGHT")
+    parser.add_argument("--max-frames", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--videos-dir", default=os.path.join(tempfile.gettempdir(), "video_analyzer_bench"))
+    parser.add_argument("--output", help="Optional path to store the results as JSON")
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    results = []
+    print(f"{'duration (s)':>12} {'two pass (s)':>13} {'single pass (s)':>16} {'seek (s)':>9}")
+    for duration in args.durations:
+        video_path = generate_video(
+            os.path.join(args.videos_dir, f"synthetic_{duration}s_{args.resolution}.mp4"), duration, width, height
+        )
+        two = measure(two_pass, video_path, args.max_frames, args.repeats)
+        single = measure(single_pass, video_path, args.max_frames, args.repeats)
+        seeking = measure(seek, video_path, args.max_frames, args.repeats)
+        results.append({
+            "duration": duration, "resolution": args.resolution,
+            "two_pass": two, "single_pass": single, "seek": seeking
+        })
+        print(f"{duration:>12} {two:>13.2f} {single:>16.2f} {seeking:>9.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
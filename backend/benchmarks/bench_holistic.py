@@ -0,0 +1,72 @@
+"""
+Compares the input tokens and latency of generating the holistic summary and topics with separate calls and a combined call.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_holistic --transcript-tokens 1000 3500 --keyframes 20
+"""
+import sys
+import json
+import time
+import argparse
+import contextvars
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stub_server import start_stub_server
+from benchmarks.bench_summary import transcript_of
+from api.config import Config
+from api.utils.token_usage import track_token_usage
+from api.services.summarization_service import generate_holistic_summary, generate_holistic_summary_and_topics
+from api.services.topics_service import extract_topics
+
+
+def separate(transcript: str, descriptions: list):
+    # The analysis runs both stages concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        summary = executor.submit(contextvars.copy_context().run, generate_holistic_summary, transcript, descriptions)
+        topics = executor.submit(contextvars.copy_context().run, extract_topics, transcript, "infer", descriptions)
+        return summary.result(), topics.result()
+
+
+def combined(transcript: str, descriptions: list):
+    return generate_holistic_summary_and_topics(transcript, descriptions)
+
+
+def measure(fn, transcript: str, descriptions: list) -> dict:
+    with track_token_usage() as usage:
+        start = time.perf_counter()
+        fn(transcript, descriptions)
+        elapsed = time.perf_counter() - start
+    return {"latency": elapsed, **usage.to_dict()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transcript-tokens", type=int, nargs="+", default=[1000, 3500])
+    parser.add_argument("--keyframes", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds the stub server waits before answering")
+    parser.add_argument("--token-latency", type=float, default=0.0002, help="Seconds the stub server waits per prompt token")
+    parser.add_argument("--output", help="Optional path to store the results as JSON")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.latency, token_latency=args.token_latency)
+    descriptions = [f"Slide {i} shows a diagram of the architecture with labelled components." for i in range(args.keyframes)]
+    results = []
+    print(f"{'tokens':>7} {'mode':>9} {'calls':>6} {'input tokens':>13} {'latency (s)':>12}")
+    with patch.object(Config, "OPENAI_BASE_URL", base_url), patch.object(Config, "LLM_WRAPPER", "openai"), \
+            patch.object(Config, "CACHE_ENABLED", False):
+        for tokens in args.transcript_tokens:
+            transcript = transcript_of(tokens)
+            for mode, fn in (("separate", separate), ("combined", combined)):
+                result = measure(fn, transcript, descriptions)
+                calls = sum(model["calls"] for model in result["models"].values())
+                results.append({"transcript_tokens": tokens, "mode": mode, **result})
+                print(f"{tokens:>7} {mode:>9} {calls:>6} {result['input_tokens']:>13} {result['latency']:>12.2f}")
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Compares the upload-to-ready time of transcribing after the audio and keyframes are extracted with transcribing
+while the keyframes are extracted, against a stub transcription API with a fixed latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_ingestion --duration 120 --transcription-latency 2
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from unittest.mock import patch
+from benchmarks.synthetic import generate_video
+from benchmarks.stub_server import start_stub_server
+from benchmarks.bench_ffmpeg import silenced_stderr
+from api.config import Config
+from api.utils import video_utils
+from api.utils.stage_graph import Stage, run_stages
+
+
+def sequential(video_id: str, video_path: str):
+    """ Extracts the audio and keyframes, then transcribes the audio. """
+    save_dir = os.path.join(video_utils.UPLOAD_DIR, video_id)
+    audio_path = os.path.join(save_dir, video_utils.audio_filename())
+    keyframes_dir = os.path.join(save_dir, "keyframes")
+    os.makedirs(keyframes_dir, exist_ok=True)
+    run_stages([
+        Stage('audio', lambda: video_utils.extract_audio(video_path, audio_path)),
+        Stage('keyframes', lambda: video_utils.prepare_keyframes(video_path, keyframes_dir, video_utils.MAX_KEYFRAMES)),
+    ])
+    video_utils.transcribe_audio_segments(audio_path)
+
+
+def pipelined(video_id: str, video_path: str):
+    video_utils.process_video(video_id, video_path)
+
+
+def measure(fn, source_path: str, upload_dir: str, repeats: int) -> float:
+    """ Returns the best wall time in seconds of ingesting a copy of the video in a fresh directory. """
+    timings = []
+    for i in range(repeats):
+        video_id = f"{fn.__name__}_{i}"
+        os.makedirs(os.path.join(upload_dir, video_id))
+        video_path = os.path.join(upload_dir, video_id, "video.mp4")
+        shutil.copy(source_path, video_path)
+        start = time.perf_counter()
+        fn(video_id, video_path)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=int, default=120, help="Video length in seconds")
+    parser.add_argument("--resolution", default="1280x720", help="Video resolution WIDTHxHEIGHT")
+    parser.add_argument("--transcription-latency", type=float, default=2.0, help="Seconds the stub takes per request")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--videos-dir", default=os.path.join(tempfile.gettempdir(), "video_analyzer_bench"))
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    video_path = generate_video(
+        os.path.join(args.videos_dir, f"synthetic_{args.duration}s_{args.resolution}.mp4"), args.duration, width, height
+    )
+    server, base_url = start_stub_server(latency=args.transcription_latency)
+    upload_dir = tempfile.mkdtemp()
+    try:
+        with silenced_stderr(), patch.object(video_utils, "UPLOAD_DIR", upload_dir), \
+                patch.object(Config, "OPENAI_BASE_URL", base_url), patch.object(Config, "TRANSCRIPTION_BACKEND", "openai"):
+            results = {fn.__name__: measure(fn, video_path, upload_dir, args.repeats) for fn in (sequential, pipelined)}
+    finally:
+        server.shutdown()
+        shutil.rmtree(upload_dir)
+
+    print(f"{'duration (s)':>12} {'sequential (s)':>15} {'pipelined (s)':>14}")
+    print(f"{args.duration:>12} {results['sequential']:>15.2f} {results['pipelined']:>14.2f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
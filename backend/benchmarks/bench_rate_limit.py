@@ -0,0 +1,81 @@
+"""
+Compares the OpenAI SDK retries with the shared rate limiter and retry scheduler against a rate limited stub server.
+The scheduler always runs with the default settings (no LLM_RPM, adapting to the 429s), and also with the rate of --rpm if given.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_rate_limit --requests 200 --concurrency 32 --limit 20
+"""
+import sys
+import json
+import time
+import argparse
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI
+from benchmarks.stub_server import start_stub_server
+from api.config import Config
+from api.utils.rate_limiter import call_with_retries
+
+MODEL = "stub-model"
+
+
+def sdk_retries(base_url: str):
+    client = OpenAI(api_key="stub", base_url=base_url, max_retries=2)
+    return lambda: client.chat.completions.create(model=MODEL, messages=[{"role": "user", "content": "Hi"}])
+
+
+def scheduler(base_url: str):
+    client = OpenAI(api_key="stub", base_url=base_url, max_retries=0)
+    return lambda: call_with_retries(
+        'llm', MODEL,
+        lambda: client.chat.completions.create(model=MODEL, messages=[{"role": "user", "content": "Hi"}])
+    )
+
+
+def run(mode, args, rpm: float = 0) -> dict:
+    server, base_url = start_stub_server(latency=args.latency, requests_per_second=args.limit)
+    request = mode(base_url)
+    failed = 0
+
+    def call(_):
+        nonlocal failed
+        try:
+            request()
+        except Exception:
+            failed += 1
+
+    try:
+        with patch.object(Config, "LLM_RPM", rpm), patch.object(Config, "LLM_TPM", 0):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                list(executor.map(call, range(args.requests)))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    return {
+        "mode": mode.__name__,
+        "rpm": rpm,
+        "elapsed": round(elapsed, 2),
+        "succeeded": args.requests - failed,
+        "failed": failed,
+        "rate_limited_responses": server.rate_limited,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=20, help="Requests per second accepted by the stub")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub takes to answer")
+    parser.add_argument("--rpm", type=float, default=0, help="LLM_RPM of an additional scheduler run")
+    args = parser.parse_args()
+
+    runs = [(sdk_retries, 0), (scheduler, 0)] + ([(scheduler, args.rpm)] if args.rpm > 0 else [])
+    for mode, rpm in runs:
+        json.dump(run(mode, args, rpm), sys.stdout)
+        print()
+
+
+if __name__ == "__main__":
+    main()
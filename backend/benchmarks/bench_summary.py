@@ -0,0 +1,71 @@
+"""
+Compares the latency of summarizing transcripts of growing length in a single request and with map-reduce.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_summary --lengths 4000 16000 64000 --token-latency 0.0002
+"""
+import sys
+import json
+import time
+import argparse
+from unittest.mock import patch
+from benchmarks.stub_server import start_stub_server
+from api.config import Config
+from api.services.summarization_service import condense_transcript, generate_transcript_summary
+from api.utils.text_chunker import count_tokens
+
+SENTENCE = "The speaker walks through the next step of the example and explains why it matters. "
+
+
+def transcript_of(tokens: int) -> str:
+    """ Returns a synthetic transcript of roughly the given number of tokens, with distinct sentences. """
+    sentences = []
+    while count_tokens(" ".join(sentences)) < tokens:
+        sentences.append(f"In part {len(sentences)}, {SENTENCE}")
+    return " ".join(sentences)
+
+
+def measure_single(transcript: str) -> float:
+    start = time.perf_counter()
+    generate_transcript_summary(transcript)
+    return time.perf_counter() - start
+
+
+def measure_map_reduce(transcript: str) -> float:
+    """ Condenses the transcript before summarizing it, like the analysis pipeline. """
+    start = time.perf_counter()
+    generate_transcript_summary(condense_transcript(transcript))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[4000, 16000, 64000], help="Transcript lengths in tokens")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds the stub server waits before answering")
+    parser.add_argument("--token-latency", type=float, default=0.0002, help="Seconds the stub server waits per prompt token")
+    parser.add_argument("--output", help="Optional path to store the results as JSON")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.latency, token_latency=args.token_latency)
+    results = []
+    print(f"{'tokens':>8} {'single request (s)':>19} {'map-reduce (s)':>15}")
+    # Every run has to reach the stub server
+    with patch.object(Config, "OPENAI_BASE_URL", base_url), patch.object(Config, "LLM_WRAPPER", "openai"), \
+            patch.object(Config, "CACHE_ENABLED", False):
+        # Load the SDK and open the connections before timing
+        generate_transcript_summary(transcript_of(100))
+        for length in args.lengths:
+            transcript = transcript_of(length)
+            single = measure_single(transcript)
+            map_reduce = measure_map_reduce(transcript)
+            results.append({"tokens": length, "single": single, "map_reduce": map_reduce})
+            print(f"{length:>8} {single:>19.2f} {map_reduce:>15.2f}")
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
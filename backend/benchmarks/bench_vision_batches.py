@@ -0,0 +1,51 @@
+"""
+Measures the latency of describing keyframes with different batch sizes against a stub server that generates
+--output-token-latency seconds per token of the answer.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_vision_batches --frames 20 --batch-sizes 20 10 5 2
+"""
+import sys
+import time
+import argparse
+from unittest.mock import patch
+from benchmarks.stub_server import start_stub_server
+from api.config import Config
+from api.services import keyframe_descriptions_service
+from api.services.keyframe_descriptions_service import generate_keyframe_descriptions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[20, 10, 5, 2])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds before the first token of each answer")
+    parser.add_argument("--output-token-latency", type=float, default=0.005, help="Seconds per generated token")
+    parser.add_argument("--description-tokens", type=int, default=60, help="Tokens of each frame description")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        latency=args.latency, output_token_latency=args.output_token_latency, answer_tokens=args.description_tokens
+    )
+    images = [
+        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{i:04d}", "detail": "low"}}
+        for i in range(args.frames)
+    ]
+    print(f"{'batch size':>10} {'requests':>9} {'latency (s)':>12} {'described':>10}")
+    try:
+        for batch_size in args.batch_sizes:
+            with patch.object(keyframe_descriptions_service, "encode_images", return_value=images), \
+                    patch.object(Config, "OPENAI_BASE_URL", base_url), patch.object(Config, "CACHE_ENABLED", False), \
+                    patch.object(Config, "VISION_BATCH_SIZE", batch_size), patch.object(Config, "VISION_WORKERS", args.workers):
+                requests = server.requests
+                start = time.perf_counter()
+                result = generate_keyframe_descriptions("keyframes")
+                elapsed = time.perf_counter() - start
+            print(f"{batch_size:>10} {server.requests - requests:>9} {elapsed:>12.2f} {len(result or []):>10}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Compares the payload and latency of keyframe description requests sending the full resolution keyframes and their vision copies.
+
+The stub server charges --token-latency seconds per 4 bytes of request, the default models a 32 Mbit/s uplink.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_vision_frames --resolution 1920x1080 --max-frames 20
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from unittest.mock import patch
+from benchmarks.synthetic import generate_video
+from benchmarks.stub_server import start_stub_server
+from benchmarks.bench_ffmpeg import silenced_stderr
+from api.config import Config
+from api.utils import video_utils
+from api.services import keyframe_descriptions_service
+from api.services.keyframe_descriptions_service import encode_images, request_descriptions
+
+
+def measure(keyframes_dir: str, base_url: str, repeats: int) -> dict:
+    """ Returns the time to encode the frames, the size of the request content and the best request latency. """
+    start = time.perf_counter()
+    images = encode_images(keyframes_dir)
+    encode_time = time.perf_counter() - start
+    user_content = [{"type": "text", "text": "Describe each frame."}] + images
+    payload = len(json.dumps(user_content))
+
+    latencies = []
+    with patch.object(Config, "OPENAI_BASE_URL", base_url):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            request_descriptions("You describe frames.", user_content)
+            latencies.append(time.perf_counter() - start)
+    return {"encode": encode_time, "payload_bytes": payload, "latency": min(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--resolution", default="1920x1080", help="Video resolution WIDTHxHEIGHT")
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--max-frames", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--token-latency", type=float, default=1e-6)
+    parser.add_argument("--videos-dir", default=os.path.join(tempfile.gettempdir(), "video_analyzer_bench"))
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    video_path = generate_video(
+        os.path.join(args.videos_dir, f"synthetic_{args.duration}s_{args.resolution}.mp4"), args.duration, width, height, gop=25
+    )
+    server, base_url = start_stub_server(token_latency=args.token_latency)
+    work_dir = tempfile.mkdtemp()
+    try:
+        with silenced_stderr(), patch.object(keyframe_descriptions_service, "print", lambda *a: None, create=True):
+            video_utils.sample_keyframes(video_path, work_dir, args.max_frames)
+            # Without vision copies (and without writing them) the full resolution frames are sent
+            with patch.object(keyframe_descriptions_service, "write_vision_frames", side_effect=RuntimeError):
+                full = measure(work_dir, base_url, args.repeats)
+            start = time.perf_counter()
+            video_utils.write_vision_frames(work_dir)
+            convert = time.perf_counter() - start
+            vision = measure(work_dir, base_url, args.repeats)
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir)
+
+    print(f"{'frames':>14} {'payload (KB)':>13} {'encode (s)':>11} {'latency (s)':>12}")
+    for name, result in (("full", full), ("vision copies", vision)):
+        print(f"{name:>14} {result['payload_bytes'] / 1024:>13.0f} {result['encode']:>11.3f} {result['latency']:>12.3f}")
+    print(f"Writing the vision copies took {convert:.3f}s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
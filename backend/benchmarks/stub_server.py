@@ -0,0 +1,169 @@
+"""
+Local stub of the OpenAI API with a configurable latency and rate limit, used to benchmark the clients without network or cost.
+"""
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RANDOM_RETRY_AFTER = 0.1 # Seconds to wait after a randomly rate limited request
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers chat completions and transcriptions with fixed content after the latency of the server,
+    plus the time to process the prompt and generate the answer at the configured seconds per token. Requests over the
+    rate limit of the server are answered with 429 and Retry-After headers, like the OpenAI API.
+    """
+    protocol_version = "HTTP/1.1" # Keeps the connections alive between requests
+    disable_nagle_algorithm = True # Headers and body are written separately, don't wait for delayed ACKs
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        retry_after = self.server.check_rate_limit()
+        if retry_after:
+            self.send_json({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}, 429, {
+                "retry-after-ms": str(int(retry_after * 1000)),
+                "retry-after": str(max(1, round(retry_after)))
+            })
+            return
+        # Prompt processing time, estimating 4 bytes per token
+        time.sleep(self.server.latency + self.server.token_latency * len(body) / 4)
+        if self.path.endswith("/chat/completions"):
+            request = json.loads(body)
+            response_format = request.get("response_format") or {}
+            text = " ".join(["Stub answer."] * max(1, self.server.answer_tokens // 3))
+            if response_format.get("type") == "json_schema":
+                # Arrays get an item per image of the request, like a description of each frame
+                items = max(1, sum(
+                    1 for message in request.get("messages", []) if isinstance(message.get("content"), list)
+                    for part in message["content"] if part.get("type") == "image_url"
+                ))
+                content = json.dumps(example_of(response_format["json_schema"]["schema"], items, text=text))
+            else:
+                content = text
+            # Token counts estimated at 4 bytes per token
+            prompt_tokens = len(body) // 4
+            completion_tokens = len(content) // 4
+            time.sleep(self.server.output_token_latency * completion_tokens)
+            response = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            }
+        elif self.path.endswith("/audio/transcriptions"):
+            response = {"text": "Stub transcript."}
+        else:
+            self.send_error(404)
+            return
+        self.send_json(response)
+
+    def send_json(self, response: dict, status: int = 200, headers: dict = None):
+        data = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def example_of(schema: dict, items: int = 1, index: int = 1, text: str = "Stub answer."):
+    """
+    Returns a value matching a JSON schema, used to answer structured output requests. Arrays have `items` items
+    and the numbers of each item are its position in the array, starting at 1.
+    """
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: example_of(value, items, index, text) for name, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [example_of(schema.get("items", {}), items, i + 1, text) for i in range(items)]
+    if kind in ("integer", "number"):
+        return index
+    if kind == "boolean":
+        return True
+    return text
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    A threaded HTTP server allowing up to `requests_per_second` requests in each one second window and
+    rate limiting a random `rate_limit_ratio` of the accepted ones.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple, latency: float, token_latency: float, requests_per_second: int,
+                 output_token_latency: float = 0.0, answer_tokens: int = 0, rate_limit_ratio: float = 0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.output_token_latency = output_token_latency
+        self.answer_tokens = answer_tokens
+        self.requests_per_second = requests_per_second
+        self.rate_limit_ratio = rate_limit_ratio
+        self.requests = 0 # Requests answered, excluding the rate limited ones
+        self.rate_limited = 0 # Requests answered with 429
+        self._window = (0, 0) # (second, requests accepted in that second)
+        self._lock = threading.Lock()
+
+    def check_rate_limit(self) -> float:
+        """ Counts a request and returns the seconds until it could be accepted, or 0 if it's accepted. """
+        with self._lock:
+            now = time.monotonic()
+            second, count = self._window
+            if int(now) != second:
+                second, count = int(now), 0
+            if self.requests_per_second and count >= self.requests_per_second:
+                self.rate_limited += 1
+                return second + 1 - now
+            if self.rate_limit_ratio and random.random() < self.rate_limit_ratio:
+                self.rate_limited += 1
+                return RANDOM_RETRY_AFTER
+            self._window = (second, count + 1)
+            self.requests += 1
+            return 0
+
+
+def start_stub_server(latency: float = 0.0, port: int = 0, token_latency: float = 0.0, requests_per_second: int = 0,
+                      output_token_latency: float = 0.0, answer_tokens: int = 0, rate_limit_ratio: float = 0.0) -> tuple:
+    """
+    Starts the stub server in a background thread.
+
+    :param latency: Seconds to wait before answering each request
+    :type latency: float
+    :param port: Port to listen on, 0 picks a free port
+    :type port: int
+    :param token_latency: Additional seconds to wait per token of the request
+    :type token_latency: float
+    :param requests_per_second: Requests accepted per second before answering 429, 0 disables the limit
+    :type requests_per_second: int
+    :param output_token_latency: Seconds to wait per token of the answer
+    :type output_token_latency: float
+    :param answer_tokens: Approximate tokens of each text in the answers
+    :type answer_tokens: int
+    :param rate_limit_ratio: Fraction of the requests answered with 429 regardless of the rate, between 0 and 1
+    :type rate_limit_ratio: float
+    :returns: (server, base_url) where base_url can be used as the OpenAI base URL
+    :rtype: tuple
+    """
+    server = StubServer(
+        ("127.0.0.1", port), latency, token_latency, requests_per_second, output_token_latency, answer_tokens, rate_limit_ratio
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
@@ -0,0 +1,46 @@
+"""
+Generates synthetic test videos with ffmpeg's lavfi test sources.
+"""
+import os
+import subprocess
+
+
+def generate_video(path: str, duration: int = 60, width: int = 640, height: int = 360, fps: int = 25, gop: int = 250,
+                   audio: str = "sine") -> str:
+    """
+    Generates an H.264/AAC video with a moving test pattern and a sine tone or pink noise.
+
+    :param path: Output path of the video
+    :type path: str
+    :param duration: Length of the video in seconds
+    :type duration: int
+    :param width: Width of the video in pixels
+    :type width: int
+    :param height: Height of the video in pixels
+    :type height: int
+    :param fps: Frame rate of the video
+    :type fps: int
+    :param gop: Distance between I-frames, in frames
+    :type gop: int
+    :param audio: Audio track, either "sine" or "noise" (harder to compress, closer to speech than a tone)
+    :type audio: str
+    :returns: The path of the generated video
+    :rtype: str
+    """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    sources = {
+        "sine": f"sine=frequency=440:duration={duration}",
+        "noise": f"anoisesrc=color=pink:amplitude=0.2:duration={duration}",
+    }
+    command = [
+        "ffmpeg", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=duration={duration}:size={width}x{height}:rate={fps}",
+        "-f", "lavfi", "-i", sources[audio],
+        "-c:v", "libx264", "-preset", "veryfast", "-g", str(gop), "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest",
+        path
+    ]
+    subprocess.run(command, check=True)
+    return path
@@ -0,0 +1,9 @@
+import pytest
+from api.utils import result_cache
+
+@pytest.fixture(autouse=True)
+def isolated_result_cache(tmp_path, monkeypatch):
+    """Use an empty result cache for every test"""
+    cache = result_cache.ResultCache(str(tmp_path / "cache.sqlite"), 1024 * 1024)
+    monkeypatch.setattr(result_cache, "_cache", cache)
+    yield cache
@@ -0,0 +1,74 @@
+import json
+import pytest
+from unittest.mock import patch
+from api import create_app
+
+@pytest.fixture
+def client():
+    return create_app().test_client()
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def fake_analysis(video_id, language, summary_type, job=None, on_event=None):
+    on_event("transcript", {"transcript": "Hello world."})
+    for token in ["Hel", "lo."]:
+        on_event("transcript_summary_token", {"token": token})
+    on_event("transcript_summary", {"transcript_summary": "Hello."})
+    return {"timings": {"transcript": 0.1}, "token_usage": {"input_tokens": 10, "output_tokens": 2, "models": {}}}
+
+def test_analyze_video_stream_emits_results_in_order(client):
+    with patch("api.routes.video_exits", return_value=True), \
+            patch("api.routes.video_ready", return_value=True), patch("api.routes.run_analysis", side_effect=fake_analysis):
+        response = client.post(
+            "/api/analyze_video/stream",
+            json={"video_id": "video", "language": "en", "summary_type": "concise"}
+        )
+        events = parse_events(response.get_data(as_text=True))
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert [event for event, _ in events] == [
+        "job", "transcript", "transcript_summary_token", "transcript_summary_token", "transcript_summary", "done"
+    ]
+    assert events[0][1]["id"] == "video"
+    assert events[-1][1]["token_usage"]["input_tokens"] == 10
+
+def test_analyze_video_stream_reports_errors(client):
+    with patch("api.routes.video_exits", return_value=True), \
+            patch("api.routes.video_ready", return_value=True), \
+            patch("api.routes.run_analysis", side_effect=Exception("Test exception")):
+        response = client.post(
+            "/api/analyze_video/stream",
+            json={"video_id": "video", "language": "en", "summary_type": "concise"}
+        )
+        events = parse_events(response.get_data(as_text=True))
+
+    assert events[-1] == ("error", {"error": "Test exception"})
+
+def test_analyze_video_rejects_videos_still_processing(client, tmp_path):
+    (tmp_path / "video").mkdir()
+    with patch("api.utils.video_utils.UPLOAD_DIR", str(tmp_path)), patch("api.routes.run_analysis") as run_analysis:
+        response = client.post("/api/analyze_video", json={"video_id": "video", "language": "en", "summary_type": "concise"})
+
+    assert response.status_code == 409
+    run_analysis.assert_not_called()
+
+def test_analyze_video_reports_failed_uploads(client, tmp_path):
+    (tmp_path / "video").mkdir()
+    (tmp_path / "video" / "error.json").write_text(json.dumps({"error": "Invalid data found when processing input"}))
+    with patch("api.utils.video_utils.UPLOAD_DIR", str(tmp_path)), patch("api.routes.run_analysis") as run_analysis:
+        response = client.post("/api/analyze_video", json={"video_id": "video", "language": "en", "summary_type": "concise"})
+
+    assert response.status_code == 422
+    assert "Invalid data found when processing input" in response.get_json()["error"]
+    run_analysis.assert_not_called()
+
+def test_analyze_video_stream_validates_request(client):
+    response = client.post("/api/analyze_video/stream", json={"video_id": "video", "language": "xx", "summary_type": "concise"})
+
+    assert response.status_code == 400
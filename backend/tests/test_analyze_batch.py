@@ -0,0 +1,111 @@
+import json
+import time
+import threading
+import pytest
+from unittest.mock import patch
+from api import create_app
+from api.config import Config
+from api.services.analysis_service import analyze_batch, load_transcript
+from api.utils.video_utils import VideoNotReadyError
+
+@pytest.fixture
+def client():
+    return create_app().test_client()
+
+def test_analyze_batch_runs_items_concurrently_and_keeps_order(monkeypatch):
+    monkeypatch.setattr(Config, "BATCH_WORKERS", 3)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def analyze(video_id, language, summary_type):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        if video_id == "broken":
+            raise Exception("Test exception")
+        return {"topics": [video_id, language, summary_type]}
+
+    items = [{"video_id": f"video{i}", "language": "en", "summary_type": "concise"} for i in range(6)]
+    items.insert(2, {"video_id": "broken", "language": "en", "summary_type": "concise"})
+    finished = []
+    with patch("api.services.analysis_service.video_exits", return_value=True), \
+            patch("api.services.analysis_service.video_ready", return_value=True), \
+            patch("api.services.analysis_service.analyze_video", side_effect=analyze):
+        result = analyze_batch(items, on_item=finished.append)
+
+    assert peak[0] == 3
+    assert result["failed"] == 1
+    assert [outcome["video_id"] for outcome in result["items"]] == [item["video_id"] for item in items]
+    assert result["items"][0] == {
+        "index": 0, "video_id": "video0", "status": "done", "result": {"topics": ["video0", "en", "concise"]}
+    }
+    assert result["items"][2]["status"] == "failed" and result["items"][2]["error"] == "Test exception"
+    assert len(finished) == len(items)
+
+def test_analyze_batch_reports_missing_videos():
+    with patch("api.services.analysis_service.video_exits", return_value=False), \
+            patch("api.services.analysis_service.analyze_video") as analyze:
+        result = analyze_batch([{"video_id": "missing", "language": "en", "summary_type": "concise"}])
+
+    analyze.assert_not_called()
+    assert result["items"][0]["status"] == "failed"
+
+def test_analyze_batch_reports_videos_still_processing():
+    with patch("api.services.analysis_service.video_exits", return_value=True), \
+            patch("api.services.analysis_service.video_ready", return_value=False), \
+            patch("api.services.analysis_service.analyze_video") as analyze:
+        result = analyze_batch([{"video_id": "uploading", "language": "en", "summary_type": "concise"}])
+
+    analyze.assert_not_called()
+    assert result["items"][0]["status"] == "failed"
+    assert result["items"][0]["error"] == "Video uploading is still processing"
+
+def test_analyze_batch_reports_failed_uploads(tmp_path):
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "error.json").write_text('{"error": "Transcription failed"}')
+    with patch("api.utils.video_utils.UPLOAD_DIR", str(tmp_path)), \
+            patch("api.services.analysis_service.video_exits", return_value=True), \
+            patch("api.services.analysis_service.analyze_video") as analyze:
+        result = analyze_batch([{"video_id": "broken", "language": "en", "summary_type": "concise"}])
+
+    analyze.assert_not_called()
+    assert result["items"][0]["error"] == "Processing of video broken failed (Transcription failed), upload it again"
+
+def test_load_transcript_requires_the_stored_transcript(tmp_path):
+    (tmp_path / "video").mkdir()
+    (tmp_path / "video" / "audio.wav").write_bytes(b"partial")
+    with patch("api.services.analysis_service.UPLOAD_DIR", str(tmp_path)), \
+            patch("api.services.transcription_service.transcribe_audio_segments") as transcribe:
+        with pytest.raises(VideoNotReadyError):
+            load_transcript("video")
+
+    transcribe.assert_not_called()
+
+def test_analyze_batch_stream_emits_each_item(client):
+    items = [{"video_id": f"video{i}", "language": "en", "summary_type": "concise"} for i in range(3)]
+    with patch("api.services.analysis_service.video_exits", return_value=True), \
+            patch("api.services.analysis_service.video_ready", return_value=True), \
+            patch("api.services.analysis_service.analyze_video", return_value={"topics": []}):
+        response = client.post("/api/analyze_batch/stream", json={"items": items})
+        body = response.get_data(as_text=True)
+
+    events = [block.split("\n")[0][len("event: "):] for block in body.strip().split("\n\n")]
+    assert events == ["job", "item", "item", "item", "done"]
+    assert json.loads(body.strip().split("\n\n")[-1].split("data: ")[1]) == {"failed": 0}
+
+def test_analyze_batch_validates_items(client):
+    assert client.post("/api/analyze_batch", json={"items": []}).status_code == 400
+    response = client.post("/api/analyze_batch", json={"items": [{"video_id": "video", "language": "xx", "summary_type": "concise"}]})
+    assert response.status_code == 400
+
+def test_analyze_batch_returns_job(client):
+    with patch("api.routes.job_queue.submit") as submit:
+        submit.return_value.id = "job"
+        response = client.post("/api/analyze_batch", json={"items": [{"video_id": "video", "language": "en", "summary_type": "concise"}]})
+
+    assert response.status_code == 202
+    assert response.get_json()["data"] == {"job_id": "job", "items": 1}
+    assert submit.call_args.args[1] == ["item_0"]
@@ -0,0 +1,66 @@
+import os
+import json
+import pytest
+from unittest.mock import patch
+from api.config import Config
+from api.utils import artifact_store
+from api.utils.artifact_store import stored, load_artifact, save_artifact
+from api.services import analysis_service
+
+def test_stored_reuses_outputs_with_the_same_inputs(tmp_path):
+    compute = lambda: "Summary."
+
+    assert stored(str(tmp_path), "transcript_summary", ["text", "concise"], compute) == "Summary."
+    assert stored(str(tmp_path), "transcript_summary", ["text", "concise"], lambda: pytest.fail("Not reused")) == "Summary."
+    assert stored(str(tmp_path), "transcript_summary", ["text", "detailed"], lambda: "Detailed.") == "Detailed."
+
+    assert len(os.listdir(tmp_path / "artifacts")) == 2
+
+def test_stored_skips_incomplete_outputs(tmp_path):
+    assert stored(str(tmp_path), "topics", ["text"], lambda: []) == []
+    assert stored(str(tmp_path), "topics", ["text"], lambda: ["A"], keep=lambda topics: len(topics) > 1) == ["A"]
+
+    assert load_artifact(str(tmp_path), "topics", ["text"]) is None
+
+def test_artifacts_of_another_version_are_ignored(tmp_path):
+    save_artifact(str(tmp_path), "topics", ["text"], ["A"])
+    with patch.object(artifact_store, "ARTIFACT_VERSION", artifact_store.ARTIFACT_VERSION + 1):
+        assert load_artifact(str(tmp_path), "topics", ["text"]) is None
+    assert load_artifact(str(tmp_path), "topics", ["text"]) == ["A"]
+
+@pytest.fixture
+def stored_video(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis_service, "UPLOAD_DIR", str(tmp_path))
+    (tmp_path / "video" / "keyframes").mkdir(parents=True)
+    (tmp_path / "video" / "keyframes" / "frame_00.jpg").write_bytes(b"frame")
+    (tmp_path / "video" / "data.json").write_text(json.dumps({"transcript": "Hello world."}))
+    return tmp_path / "video"
+
+def test_analysis_in_another_summary_type_only_runs_the_summary_stages(stored_video):
+    keyframes = [{"image_path": "frame_00.jpg", "description": "A frame.", "timestamps": []}]
+    with patch.object(Config, "COMBINED_ANALYSIS", False), \
+            patch.object(analysis_service, "generate_keyframe_descriptions", return_value=keyframes) as descriptions_mock, \
+            patch.object(analysis_service, "extract_topics", return_value=["Topic"]) as topics_mock, \
+            patch.object(analysis_service, "generate_transcript_summary", side_effect=lambda t, summary_type, l, o: summary_type) as summary_mock, \
+            patch.object(analysis_service, "generate_holistic_summary", side_effect=lambda t, d, summary_type, l: summary_type) as holistic_mock:
+        first = analysis_service.analyze_video("video", "en", "concise")
+        second = analysis_service.analyze_video("video", "en", "detailed")
+        third = analysis_service.analyze_video("video", "en", "concise")
+
+    assert descriptions_mock.call_count == 1
+    assert topics_mock.call_count == 1
+    assert summary_mock.call_count == 2
+    assert holistic_mock.call_count == 2
+    assert (first["transcript_summary"], second["transcript_summary"], third["transcript_summary"]) == ("concise", "detailed", "concise")
+    assert third["keyframes"] == keyframes and third["topics"] == ["Topic"]
+
+def test_changed_keyframes_are_described_again(stored_video):
+    keyframes = [{"image_path": "frame_00.jpg", "description": "A frame.", "timestamps": []}]
+    with patch.object(analysis_service, "generate_keyframe_descriptions", return_value=keyframes) as descriptions_mock, \
+            patch.object(analysis_service, "generate_transcript_summary", return_value="Summary."), \
+            patch.object(analysis_service, "generate_holistic_summary_and_topics", return_value={"holistic_summary": "Summary.", "topics": ["Topic"]}):
+        analysis_service.analyze_video("video", "en", "concise")
+        (stored_video / "keyframes" / "frame_00.jpg").write_bytes(b"another frame")
+        analysis_service.analyze_video("video", "en", "concise")
+
+    assert descriptions_mock.call_count == 2
@@ -0,0 +1,108 @@
+import io
+import os
+import time
+import hashlib
+import pytest
+from api.utils import chunked_upload
+from api.utils.chunked_upload import UploadError, create_upload, get_upload, append_chunk, finalize_upload, expire_uploads
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunked_upload, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(chunked_upload, "_sessions", {})
+    return tmp_path
+
+def test_chunked_upload_roundtrip():
+    content = b"0123456789" * 10
+    session = create_upload("video.mp4", len(content))
+
+    offset = append_chunk(session.id, 0, io.BytesIO(content[:60]))
+    offset = append_chunk(session.id, offset, io.BytesIO(content[60:]))
+    video_id, video_path, video_hash = finalize_upload(session.id, hashlib.sha256(content).hexdigest())
+
+    assert offset == len(content)
+    assert video_id == session.id
+    assert video_hash == hashlib.sha256(content).hexdigest()
+    with open(video_path, "rb") as f:
+        assert f.read() == content
+
+def test_chunked_upload_resumes_after_restart(monkeypatch):
+    content = b"video data"
+    session = create_upload("video.mp4", len(content))
+    append_chunk(session.id, 0, io.BytesIO(content[:4]))
+
+    # Forget the in memory session as if the server was restarted
+    monkeypatch.setattr(chunked_upload, "_sessions", {})
+    assert get_upload(session.id).offset == 4
+    append_chunk(session.id, 4, io.BytesIO(content[4:]))
+
+    assert finalize_upload(session.id, hashlib.sha256(content).hexdigest())[2] == hashlib.sha256(content).hexdigest()
+
+def test_chunked_upload_rejects_invalid_chunks():
+    session = create_upload("video.mp4", 10)
+
+    with pytest.raises(UploadError) as error:
+        append_chunk(session.id, 5, io.BytesIO(b"data"))
+    assert error.value.status_code == 409
+
+    with pytest.raises(UploadError) as error:
+        append_chunk(session.id, 0, io.BytesIO(b"more than ten bytes"))
+    assert error.value.status_code == 413
+    assert get_upload(session.id).offset == 0
+
+def test_chunked_upload_resumes_after_an_oversized_chunk(monkeypatch):
+    monkeypatch.setattr(chunked_upload, "BUFFER_SIZE", 2)
+    content = b"0123456789"
+    session = create_upload("video.mp4", len(content))
+    append_chunk(session.id, 0, io.BytesIO(content[:5]))
+
+    # The first bytes of the chunk are written before it turns out to be too large
+    with pytest.raises(UploadError) as error:
+        append_chunk(session.id, 5, io.BytesIO(b"oversized"))
+    assert error.value.status_code == 413
+    append_chunk(session.id, 5, io.BytesIO(content[5:]))
+
+    assert finalize_upload(session.id, hashlib.sha256(content).hexdigest())[2] == hashlib.sha256(content).hexdigest()
+
+def test_chunked_upload_verifies_checksum():
+    session = create_upload("video.mp4", 4)
+    append_chunk(session.id, 0, io.BytesIO(b"data"))
+
+    with pytest.raises(UploadError):
+        finalize_upload(session.id, hashlib.sha256(b"other").hexdigest())
+
+def test_chunked_upload_limits(monkeypatch):
+    monkeypatch.setattr(chunked_upload.Config, "MAX_UPLOAD_BYTES", 100)
+
+    with pytest.raises(UploadError) as error:
+        create_upload("video.mp4", 101)
+    assert error.value.status_code == 413
+    with pytest.raises(UploadError) as error:
+        get_upload("../../etc")
+    assert error.value.status_code == 404
+
+def test_chunked_upload_is_kept_apart_until_complete(upload_dir):
+    content = b"video data"
+    session = create_upload("video.mp4", len(content))
+    append_chunk(session.id, 0, io.BytesIO(content))
+
+    assert not (upload_dir / session.id).exists()
+    video_id, video_path, _ = finalize_upload(session.id, hashlib.sha256(content).hexdigest())
+
+    assert video_path == str(upload_dir / video_id / "video.mp4")
+    assert not (upload_dir / ".sessions" / session.id).exists()
+
+def test_expire_uploads_deletes_stale_sessions(upload_dir, monkeypatch):
+    monkeypatch.setattr(chunked_upload.Config, "UPLOAD_SESSION_TTL", 60)
+    stale = create_upload("stale.mp4", 10)
+    active = create_upload("active.mp4", 10)
+    hour_ago = time.time() - 3600
+    for path in (stale.directory, *[os.path.join(stale.directory, name) for name in os.listdir(stale.directory)]):
+        os.utime(path, (hour_ago, hour_ago))
+
+    assert expire_uploads() == 1
+
+    assert not os.path.exists(stale.directory)
+    with pytest.raises(UploadError):
+        get_upload(stale.id)
+    assert get_upload(active.id).offset == 0
@@ -0,0 +1,41 @@
+import threading
+from unittest.mock import patch
+from api.config import Config
+from api.utils import clients
+
+def test_get_client_creates_each_client_once():
+    created = []
+    barrier = threading.Barrier(8)
+
+    def factory():
+        created.append(object())
+        return created[-1]
+
+    def get():
+        barrier.wait()
+        results.append(clients.get_client(("test", "once"), factory))
+
+    results = []
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(result is created[0] for result in results)
+
+def test_openai_clients_share_the_connection_pool():
+    default = clients.openai_client()
+    vision = clients.openai_client(timeout=100)
+
+    assert clients.openai_client() is default
+    assert vision is not default
+    assert vision._client is default._client is clients.http_client()
+
+def test_chat_model_follows_the_configured_model():
+    with patch.object(Config, "LLM_WRAPPER", "openai"), patch.object(Config, "LLM_MODEL", "model-a"):
+        first = clients.chat_model()
+        assert clients.chat_model() is first
+    with patch.object(Config, "LLM_WRAPPER", "openai"), patch.object(Config, "LLM_MODEL", "model-b"):
+        assert clients.chat_model() is not first
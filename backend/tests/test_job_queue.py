@@ -0,0 +1,60 @@
+import threading
+import pytest
+from api.utils.job_queue import JobQueue, JobQueueFullError, job_stage
+
+def wait_for(job, timeout=5):
+    """Busy waits until the job finishes"""
+    finished = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if job.is_finished():
+            return job
+        finished.wait(0.01)
+    raise TimeoutError(f"Job {job.id} did not finish")
+
+def test_job_reports_stages_and_result():
+    queue = JobQueue(workers=1, max_pending=2, retention=60)
+
+    def work(value, job=None):
+        with job_stage(job, 'first'):
+            pass
+        with job_stage(job, 'second'):
+            return value * 2
+
+    job = wait_for(queue.submit('test', ['first', 'second'], work, 21))
+
+    assert job.status == 'done'
+    assert job.result == 42
+    assert queue.get(job.id) is job
+    for stage in job.to_dict()['stages'].values():
+        assert stage['state'] == 'done'
+        assert stage['duration'] is not None
+
+def test_job_failure_is_recorded():
+    queue = JobQueue(workers=1, max_pending=2, retention=60)
+
+    def work(job=None):
+        with job_stage(job, 'first'):
+            raise ValueError("Stage failed")
+
+    job = wait_for(queue.submit('test', ['first', 'second'], work))
+
+    assert job.status == 'failed'
+    assert job.error == "Stage failed"
+    assert job.stages['first']['state'] == 'failed'
+    assert job.stages['second']['state'] == 'pending'
+
+def test_queue_rejects_jobs_when_full():
+    queue = JobQueue(workers=1, max_pending=1, retention=60)
+    release = threading.Event()
+
+    job = queue.submit('test', [], lambda job=None: release.wait(5))
+    with pytest.raises(JobQueueFullError):
+        queue.submit('test', [], lambda job=None: None)
+
+    release.set()
+    wait_for(job)
+    assert queue.submit('test', [], lambda job=None: None) is not None
+
+def test_job_stage_without_job():
+    with job_stage(None, 'stage'):
+        pass
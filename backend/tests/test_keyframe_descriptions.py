@@ -0,0 +1,73 @@
+import os
+from unittest.mock import patch
+import pytest
+from api.config import Config
+from api.services import keyframe_descriptions_service
+from api.services.keyframe_descriptions_service import generate_keyframe_descriptions, validate_descriptions
+
+def image(i):
+    return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{i}", "detail": "low"}}
+
+def answer(user_content):
+    """Describes each image of a request with the data of its URL"""
+    images = [content for content in user_content if content["type"] == "image_url"]
+    return {"descriptions": [
+        {"frame_number": i + 1, "description": f"Frame {content['image_url']['url'].split(',')[1]}"}
+        for i, content in reversed(list(enumerate(images)))
+    ]}
+
+@pytest.fixture
+def batches():
+    with patch.object(keyframe_descriptions_service, "encode_images", return_value=[image(i) for i in range(7)]), \
+            patch.object(Config, "VISION_BATCH_SIZE", 3), patch.object(Config, "CACHE_ENABLED", False):
+        yield
+
+def test_keyframe_descriptions_are_merged_in_frame_order(batches):
+    with patch.object(keyframe_descriptions_service, "request_descriptions", side_effect=lambda _, content: answer(content)) as request_mock:
+        result = generate_keyframe_descriptions("keyframes")
+
+    assert request_mock.call_count == 3
+    assert [item["description"] for item in result] == [f"Frame {i}" for i in range(7)]
+    assert [os.path.basename(item["image_path"]) for item in result] == [f"frame_{i:02d}.jpg" for i in range(7)]
+
+def test_incomplete_batches_are_requested_again(batches):
+    calls = []
+
+    def request(_, content):
+        calls.append(content)
+        descriptions = answer(content)
+        if len(calls) == 1:
+            descriptions["descriptions"].pop()
+        return descriptions
+
+    with patch.object(keyframe_descriptions_service, "request_descriptions", side_effect=request), \
+            patch.object(Config, "VISION_WORKERS", 1):
+        result = generate_keyframe_descriptions("keyframes")
+
+    assert len(calls) == 4
+    assert [item["description"] for item in result] == [f"Frame {i}" for i in range(7)]
+
+def test_failed_batches_are_left_out(batches):
+    def request(_, content):
+        if image(3) in content:
+            raise Exception("Test exception")
+        return answer(content)
+
+    with patch.object(keyframe_descriptions_service, "request_descriptions", side_effect=request):
+        result = generate_keyframe_descriptions("keyframes")
+
+    assert [item["description"] for item in result] == ["Frame 0", "Frame 1", "Frame 2", "Frame 6"]
+    assert os.path.basename(result[-1]["image_path"]) == "frame_06.jpg"
+
+def test_keyframe_descriptions_fail_when_every_batch_fails(batches):
+    with patch.object(keyframe_descriptions_service, "request_descriptions", side_effect=Exception("Test exception")):
+        assert generate_keyframe_descriptions("keyframes") is None
+
+def test_validate_descriptions():
+    descriptions = {"descriptions": [
+        {"frame_number": 2, "description": "b"}, {"frame_number": 1, "description": "a"}, {"frame_number": 3, "description": "c"}
+    ]}
+
+    assert [item["description"] for item in validate_descriptions(descriptions, 2)] == ["a", "b"]
+    with pytest.raises(ValueError):
+        validate_descriptions(descriptions, 4)
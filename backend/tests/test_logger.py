@@ -0,0 +1,68 @@
+import io
+import json
+import queue
+import logging
+from logging.handlers import QueueListener
+from api.utils.logger import JSONFormatter, PayloadFilter, NonBlockingQueueHandler
+from api.utils.metrics import LOG_RECORDS_DROPPED
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    test_logger = logging.getLogger(name)
+    test_logger.setLevel(logging.DEBUG)
+    test_logger.propagate = False
+    test_logger.handlers = [handler]
+    return test_logger
+
+def test_json_formatter_includes_extra_fields_and_exceptions():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JSONFormatter())
+    test_logger = make_logger("test_json_formatter", handler)
+
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        test_logger.exception("Failed %s", "stage", extra={"job_id": "abc"})
+
+    entry = json.loads(stream.getvalue())
+    assert entry["level"] == "ERROR"
+    assert entry["message"] == "Failed stage"
+    assert entry["job_id"] == "abc"
+    assert "ValueError: boom" in entry["exception"]
+
+def test_payload_filter_truncates_long_messages():
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "Transcript: %s", ("word " * 100,), None)
+
+    assert PayloadFilter(max_chars=20).filter(record) is True
+
+    assert record.getMessage() == "Transcript: word wor... [truncated]"
+    assert record.truncated_chars == len("Transcript: ") + 500 - 20
+
+def test_payload_filter_samples_long_debug_records():
+    payload_filter = PayloadFilter(max_chars=20, debug_sample_rate=0)
+    long_debug = logging.LogRecord("test", logging.DEBUG, __file__, 1, "x" * 100, None, None)
+    short_debug = logging.LogRecord("test", logging.DEBUG, __file__, 1, "short", None, None)
+    long_info = logging.LogRecord("test", logging.INFO, __file__, 1, "x" * 100, None, None)
+
+    assert payload_filter.filter(long_debug) is False
+    assert payload_filter.filter(short_debug) is True
+    assert payload_filter.filter(long_info) is True
+
+def test_queue_handler_writes_from_the_listener_and_drops_when_full():
+    stream = io.StringIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(logging.Formatter("%(message)s"))
+    handler = NonBlockingQueueHandler(queue.Queue(2))
+    test_logger = make_logger("test_queue_handler", handler)
+
+    dropped = sum(value for _, _, _, value in LOG_RECORDS_DROPPED.samples())
+    for i in range(3):
+        test_logger.info("record %d", i)
+    assert stream.getvalue() == ""
+    assert handler.dropped == 1
+    assert sum(value for _, _, _, value in LOG_RECORDS_DROPPED.samples()) == dropped + 1
+
+    listener = QueueListener(handler.queue, target)
+    listener.start()
+    listener.stop()
+    assert stream.getvalue() == "record 0\nrecord 1\n"
@@ -0,0 +1,59 @@
+from api import create_app
+from api.utils.metrics import Counter, Histogram, LLM_TOKENS, STAGE_DURATION, render
+from api.utils.stage_graph import Stage, run_stages
+from api.utils.token_usage import record_usage
+
+def test_counter_renders_prometheus_text():
+    counter = Counter("test_events_total", "Events for the test.", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind='b"c')
+
+    lines = counter.render()
+
+    assert lines == [
+        "# HELP video_analyzer_test_events_total Events for the test.",
+        "# TYPE video_analyzer_test_events_total counter",
+        'video_analyzer_test_events_total{kind="a"} 1',
+        'video_analyzer_test_events_total{kind="b\\"c"} 2',
+    ]
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_duration_seconds", "Durations for the test.", buckets=(1, 5))
+    for value in (0.5, 2, 10):
+        histogram.observe(value)
+
+    lines = histogram.render()[2:]
+
+    assert lines == [
+        'video_analyzer_test_duration_seconds_bucket{le="1"} 1',
+        'video_analyzer_test_duration_seconds_bucket{le="5"} 2',
+        'video_analyzer_test_duration_seconds_bucket{le="+Inf"} 3',
+        "video_analyzer_test_duration_seconds_sum 12.5",
+        "video_analyzer_test_duration_seconds_count 3",
+    ]
+
+def test_stages_record_durations_and_attribute_tokens():
+    stages = [
+        Stage("metrics_test_stage", lambda: record_usage("metrics-test-model", 100, 10)),
+    ]
+
+    run_stages(stages, pipeline="metrics_test")
+
+    values = dict(((suffix, key), value) for suffix, key, _, value in STAGE_DURATION.samples())
+    assert values[("_count", ("metrics_test", "metrics_test_stage", "done"))] == 1
+    tokens = dict((key, value) for _, key, _, value in LLM_TOKENS.samples())
+    assert tokens[("metrics-test-model", "metrics_test_stage", "input")] == 100
+    assert tokens[("metrics-test-model", "metrics_test_stage", "output")] == 10
+
+def test_metrics_endpoint_serves_request_metrics():
+    client = create_app().test_client()
+    client.get("/api/upload_sessions/missing")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "# TYPE video_analyzer_stage_duration_seconds histogram" in body
+    assert 'video_analyzer_http_request_duration_seconds_count{endpoint="/api/upload_sessions/<upload_id>",method="GET",status="404"} 1' in body
+    assert 'video_analyzer_http_requests_in_flight{endpoint="/api/upload_sessions/<upload_id>"} 0' in body
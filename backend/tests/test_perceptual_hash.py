@@ -0,0 +1,30 @@
+import numpy as np
+from api.utils.perceptual_hash import dct_matrix, perceptual_hashes, hamming_distances, group_near_duplicates
+
+def make_frames():
+    """Two slides, a re-encoded (slightly noisy once downscaled) copy of the first one and a third slide"""
+    rng = np.random.default_rng(0)
+    x, y = np.meshgrid(np.arange(32), np.arange(32))
+    first = 220 * np.exp(-((x - 10) ** 2 + (y - 12) ** 2) / 60)
+    second = 220 * np.exp(-((x - 24) ** 2 + (y - 20) ** 2) / 40) + x * 2
+    third = (y > 16) * 180 + x * 1.5
+    noisy_first = np.clip(first + rng.normal(0, 2, first.shape), 0, 255)
+    return np.stack([first, noisy_first, second, third]).astype(np.uint8)
+
+def test_dct_matrix_is_orthonormal():
+    dct = dct_matrix(32)
+    assert np.allclose(dct @ dct.T, np.eye(32))
+
+def test_near_identical_frames_have_close_hashes():
+    distances = hamming_distances(perceptual_hashes(make_frames()))
+
+    assert distances.shape == (4, 4)
+    assert distances[0, 1] <= 6
+    assert distances[0, 2] > 6
+    assert distances[2, 3] > 6
+
+def test_group_near_duplicates_keeps_first_frame_of_each_group():
+    groups = group_near_duplicates(perceptual_hashes(make_frames()), threshold=6)
+
+    assert groups == [(0, [0, 1]), (2, [2]), (3, [3])]
+    assert len(group_near_duplicates(perceptual_hashes(make_frames()), threshold=-1)) == 4
@@ -0,0 +1,189 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+import httpx
+import openai
+import pytest
+from api.config import Config
+from api.utils import rate_limiter as rate_limiter_module
+from api.utils.rate_limiter import RateLimiter, TokenBucket, rate_limiter, call_with_retries, retry_after, is_retryable
+from api.utils.clients import openai_client
+from benchmarks.stub_server import start_stub_server
+
+def test_rate_limiter_allows_a_burst_then_paces_requests():
+    limiter = RateLimiter("test", requests_per_minute=600) # 10 per second, bursts of 10
+
+    start = time.monotonic()
+    for _ in range(15):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+
+    assert 0.4 <= elapsed < 1.0
+
+def test_rate_limiter_non_blocking_acquire():
+    limiter = RateLimiter("test", requests_per_minute=60)
+
+    assert limiter.acquire(blocking=False) is True
+    assert limiter.acquire(blocking=False) is False
+
+def test_rate_limiter_is_shared_between_threads():
+    limiter = RateLimiter("test", requests_per_minute=1200) # 20 per second
+    acquired = []
+
+    def worker():
+        for _ in range(10):
+            limiter.acquire()
+            acquired.append(time.monotonic())
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 40 requests with a burst of 20 take about a second at 20 per second
+    assert len(acquired) == 40
+    assert max(acquired) - start >= 0.9
+
+def test_token_bucket_lets_large_requests_through_in_debt():
+    bucket = TokenBucket(per_minute=6000) # 100 tokens per second
+
+    assert bucket.reserve(300) == pytest.approx(2.0, abs=0.05)
+    assert bucket.reserve(100) == pytest.approx(3.0, abs=0.05)
+
+def test_rate_limiter_slows_down_after_a_rate_limit_and_recovers():
+    limiter = RateLimiter("test", requests_per_minute=600)
+
+    limiter.record_rate_limited(0.2)
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.15
+    assert limiter.requests.rate == 5
+
+    for _ in range(20):
+        limiter.record_success()
+    assert limiter.rate_factor == 1
+    assert limiter.requests.rate == 10
+
+def test_rate_limiter_limits_concurrency_without_a_request_rate():
+    limiter = RateLimiter("test")
+    for _ in range(8):
+        limiter.acquire()
+
+    limiter.record_rate_limited(0)
+    assert limiter.concurrency == 4
+    for _ in range(8):
+        limiter.release()
+    for _ in range(4):
+        assert limiter.acquire(blocking=False) is True
+    assert limiter.acquire(blocking=False) is False
+
+    for _ in range(4):
+        limiter.release()
+        limiter.record_success()
+    assert limiter.concurrency == pytest.approx(5, abs=0.1)
+
+def test_rate_limiter_spreads_the_resumption_after_a_pause():
+    limiter = RateLimiter("test")
+    limiter.record_rate_limited(0.2)
+    resumed = []
+
+    def worker():
+        limiter.acquire()
+        resumed.append(time.monotonic())
+        limiter.release()
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(resumed) - min(resumed) > 0.01
+
+def test_rate_limiter_per_model_settings():
+    with patch.object(Config, "VISION_RPM", 120), patch.object(Config, "VISION_TPM", 0), \
+            patch.object(Config, "MODEL_RATE_LIMITS", '{"other-model": {"rpm": 60, "tpm": 1000}}'):
+        limiter = rate_limiter("vision", "gpt-4o-mini")
+        assert limiter.requests.rate == 2
+        assert limiter.tokens is None
+        assert rate_limiter("vision", "gpt-4o-mini") is limiter
+
+        other = rate_limiter("vision", "other-model")
+        assert other.requests.rate == 1
+        assert other.tokens.rate == pytest.approx(1000 / 60)
+
+def test_retry_after_headers():
+    def error_with(headers):
+        return MagicMock(response=httpx.Response(429, headers=headers))
+
+    assert retry_after(error_with({"retry-after-ms": "250"})) == 0.25
+    assert retry_after(error_with({"retry-after": "2"})) == 2
+    assert retry_after(error_with({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) is None
+    assert retry_after(error_with({})) is None
+    assert retry_after(ValueError()) is None
+
+def test_is_retryable():
+    request = httpx.Request("POST", "http://test")
+
+    assert is_retryable(openai.RateLimitError("", response=httpx.Response(429, request=request), body=None))
+    assert is_retryable(openai.InternalServerError("", response=httpx.Response(503, request=request), body=None))
+    assert is_retryable(openai.APITimeoutError(request))
+    assert not is_retryable(openai.BadRequestError("", response=httpx.Response(400, request=request), body=None))
+    assert not is_retryable(ValueError())
+
+def test_is_retryable_does_not_import_the_sdks():
+    with patch.dict("sys.modules", {"httpx": None}):
+        assert not is_retryable(ValueError())
+        assert is_retryable(openai.APITimeoutError(httpx.Request("POST", "http://test")))
+
+def test_call_with_retries_retries_transient_errors():
+    request = httpx.Request("POST", "http://test")
+    fn = MagicMock(side_effect=[openai.APITimeoutError(request), openai.APITimeoutError(request), "result"])
+
+    with patch.object(Config, "RETRY_BASE_DELAY", 0.01), patch.object(rate_limiter_module.time, "sleep") as sleep:
+        assert call_with_retries("llm", "test-model", fn) == "result"
+
+    assert fn.call_count == 3
+    assert sleep.call_count == 2
+
+def test_call_with_retries_gives_up():
+    fn = MagicMock(side_effect=ValueError("Not retryable"))
+    with pytest.raises(ValueError):
+        call_with_retries("llm", "test-model", fn)
+    assert fn.call_count == 1
+
+    request = httpx.Request("POST", "http://test")
+    fn = MagicMock(side_effect=openai.APITimeoutError(request))
+    with patch.object(Config, "RETRY_MAX_ATTEMPTS", 3), patch.object(rate_limiter_module.time, "sleep"):
+        with pytest.raises(openai.APITimeoutError):
+            call_with_retries("llm", "test-model", fn)
+    assert fn.call_count == 3
+
+    fn = MagicMock(return_value="result")
+    with patch.object(Config, "RETRY_MAX_ATTEMPTS", 0):
+        assert call_with_retries("llm", "test-model", fn) == "result"
+    assert fn.call_count == 1
+
+def test_call_with_retries_against_a_rate_limited_server():
+    server, base_url = start_stub_server(requests_per_second=5)
+    try:
+        with patch.object(Config, "OPENAI_BASE_URL", base_url):
+            client = openai_client()
+
+            def transcribe(_):
+                return call_with_retries(
+                    "transcription", "stub-rate-limited",
+                    lambda: client.audio.transcriptions.create(model="stub-rate-limited", file=("audio.wav", b"data"))
+                )
+
+            with ThreadPoolExecutor(max_workers=10) as executor:
+                results = list(executor.map(transcribe, range(15)))
+    finally:
+        server.shutdown()
+
+    assert all(result.text == "Stub transcript." for result in results)
+    assert server.requests == 15
+    assert server.rate_limited > 0
@@ -0,0 +1,52 @@
+from unittest.mock import MagicMock
+from api.utils.result_cache import ResultCache, cache_key, cached
+
+def test_cache_stores_and_counts_hits(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"), 1024)
+
+    assert cache.get("summary", "key") is None
+    cache.set("summary", "key", {"text": "A summary"})
+
+    assert cache.get("summary", "key") == {"text": "A summary"}
+    stats = cache.stats()
+    assert stats["hits"] == {"summary": 1}
+    assert stats["misses"] == {"summary": 1}
+    assert stats["entries"] == 1
+
+def test_cache_persists_on_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResultCache(path, 1024).set("summary", "key", "A summary")
+
+    assert ResultCache(path, 1024).get("summary", "key") == "A summary"
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"), 250)
+    cache.set("summary", "first", "a" * 100)
+    cache.set("summary", "second", "b" * 100)
+    cache.get("summary", "first")
+    cache.set("summary", "third", "c" * 100)
+
+    assert cache.get("summary", "second") is None
+    assert cache.get("summary", "first") is not None
+    assert cache.get("summary", "third") is not None
+
+def test_cache_key_depends_on_every_part():
+    key = cache_key("summary", ["gpt-4o-mini", "concise", "transcript"])
+
+    assert key == cache_key("summary", ["gpt-4o-mini", "concise", "transcript"])
+    assert key != cache_key("summary", ["gpt-4o-mini", "detailed", "transcript"])
+    assert key != cache_key("topics", ["gpt-4o-mini", "concise", "transcript"])
+
+def test_cached_computes_once():
+    compute = MagicMock(return_value=["Topic 1"])
+
+    assert cached("topics", ["transcript"], compute) == ["Topic 1"]
+    assert cached("topics", ["transcript"], compute) == ["Topic 1"]
+    compute.assert_called_once()
+
+def test_cached_does_not_store_empty_results():
+    compute = MagicMock(return_value="")
+
+    cached("summary", ["transcript"], compute)
+    cached("summary", ["transcript"], compute)
+    assert compute.call_count == 2
@@ -0,0 +1,90 @@
+import time
+import pytest
+from api.utils.stage_graph import Stage, run_stages, critical_path
+from api.utils.job_queue import Job
+
+def test_run_stages_passes_dependency_results():
+    stages = [
+        Stage('a', lambda: 1),
+        Stage('b', lambda: 2),
+        Stage('c', lambda a, b: a + b, deps=('a', 'b')),
+    ]
+
+    results, timings = run_stages(stages)
+
+    assert results == {'a': 1, 'b': 2, 'c': 3}
+    assert set(timings) == {'a', 'b', 'c'}
+
+def test_run_stages_runs_independent_stages_concurrently():
+    def slow(value):
+        time.sleep(0.2)
+        return value
+
+    stages = [
+        Stage('a', lambda: slow('a')),
+        Stage('b', lambda: slow('b')),
+        Stage('c', lambda: slow('c')),
+    ]
+
+    start = time.perf_counter()
+    run_stages(stages)
+
+    assert time.perf_counter() - start < 0.5
+
+def test_run_stages_raises_stage_error():
+    def fail():
+        raise RuntimeError("Stage failed")
+    called = []
+
+    stages = [
+        Stage('a', fail),
+        Stage('b', lambda a: called.append(a), deps=('a',)),
+    ]
+
+    with pytest.raises(RuntimeError):
+        run_stages(stages)
+    assert called == []
+
+def test_run_stages_records_cancelled_stages():
+    def fail():
+        time.sleep(0.05)
+        raise RuntimeError("Stage failed")
+    job = Job('test', ['a', 'b', 'c'])
+
+    stages = [
+        Stage('a', fail),
+        Stage('b', lambda: time.sleep(0.2)),
+        Stage('c', lambda a: a, deps=('a',)),
+    ]
+
+    with pytest.raises(RuntimeError):
+        run_stages(stages, job)
+    assert {name: stage['state'] for name, stage in job.stages.items()} == {'a': 'failed', 'b': 'done', 'c': 'cancelled'}
+
+def test_run_stages_rejects_invalid_graphs():
+    with pytest.raises(ValueError):
+        run_stages([Stage('a', lambda b: b, deps=('b',))])
+    with pytest.raises(ValueError):
+        run_stages([Stage('a', lambda b: b, deps=('b',)), Stage('b', lambda a: a, deps=('a',))])
+
+def test_critical_path_follows_latest_dependency():
+    stages = {
+        'a': Stage('a', None),
+        'b': Stage('b', None),
+        'c': Stage('c', None, deps=('a', 'b')),
+    }
+
+    assert critical_path(stages, {'a': 1.0, 'b': 2.0, 'c': 3.0}) == ['b', 'c']
+
+def test_run_stages_reports_each_result_when_ready():
+    reported = []
+    stages = [
+        Stage("slow", lambda: time.sleep(0.2) or "slow"),
+        Stage("fast", lambda: "fast"),
+        Stage("after_fast", lambda fast: fast + "!", deps=("fast",)),
+    ]
+
+    run_stages(stages, on_result=lambda name, result: reported.append((name, result)))
+
+    assert reported[-1] == ("slow", "slow")
+    assert set(reported) == {("slow", "slow"), ("fast", "fast"), ("after_fast", "fast!")}
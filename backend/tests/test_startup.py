@@ -0,0 +1,29 @@
+import os
+import sys
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_BUDGET_SECONDS = 1.0 # Cumulative import time of the api package, it took over 2 seconds with eager imports
+LAZY_MODULES = ("openai", "httpx", "langchain_core", "langchain_openai", "langchain_ollama", "tiktoken")
+
+def profile_startup() -> dict:
+    """ Creates the app in a new interpreter and returns the cumulative import time in seconds of each top-level import. """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from api import create_app; create_app()"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative) / 1_000_000
+    return modules
+
+def test_app_starts_without_importing_the_model_sdks():
+    modules = profile_startup()
+
+    assert "api" in modules
+    assert [name for name in LAZY_MODULES if name in modules] == []
+    assert modules["api"] < STARTUP_BUDGET_SECONDS
@@ -0,0 +1,96 @@
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from api.config import Config
+from api.utils import text_chunker
+from api.services import summarization_service
+from api.utils.schemas import HolisticAnalysisResponse
+from api.services.summarization_service import (
+    condense_transcript, generate_transcript_summary, generate_holistic_summary_and_topics
+)
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    monkeypatch.setattr(text_chunker, "_encoding", None)
+    monkeypatch.setattr(text_chunker, "_encoding_loaded", True)
+
+@pytest.fixture
+def mock_model():
+    with patch("api.services.summarization_service.chat_model") as mock_chat_model:
+        yield mock_chat_model.return_value
+
+@pytest.fixture
+def long_transcript():
+    return " ".join(f"In part {i} the speaker explains topic {i} in detail." for i in range(200))
+
+def test_condense_transcript_keeps_short_transcripts(mock_model):
+    assert condense_transcript("A short transcript.") == "A short transcript."
+    mock_model.invoke.assert_not_called()
+
+def test_condense_transcript_summarizes_chunks_in_parallel(mock_model, long_transcript, monkeypatch):
+    monkeypatch.setattr(Config, "SUMMARY_CHUNK_TOKENS", 500)
+    monkeypatch.setattr(Config, "SUMMARY_WORKERS", 4)
+    threads = set()
+
+    def invoke(messages):
+        threads.add(threading.get_ident())
+        first_part = messages[1].content.split(" ")[2]
+        return MagicMock(content=f"Summary from part {first_part}.")
+
+    mock_model.invoke.side_effect = invoke
+
+    condensed = condense_transcript(long_transcript)
+
+    chunks = text_chunker.chunk_text(long_transcript, 500)
+    assert mock_model.invoke.call_count == len(chunks) > 1
+    assert condensed.splitlines()[0] == "Summary from part 0."
+    assert len(threads) > 1
+
+    # Chunk summaries are cached for the next stages and analyses
+    assert condense_transcript(long_transcript) == condensed
+    assert mock_model.invoke.call_count == len(chunks)
+
+def test_condense_transcript_falls_back_to_full_transcript_on_errors(mock_model, long_transcript, monkeypatch):
+    monkeypatch.setattr(Config, "SUMMARY_CHUNK_TOKENS", 500)
+    mock_model.invoke.side_effect = Exception("Test exception")
+
+    assert condense_transcript(long_transcript) == long_transcript
+
+def test_generate_transcript_summary_reduces_chunk_summaries(mock_model, long_transcript, monkeypatch):
+    monkeypatch.setattr(Config, "SUMMARY_CHUNK_TOKENS", 500)
+    mock_model.invoke.side_effect = lambda messages: MagicMock(
+        content="Final summary." if messages[0].content != summarization_service.CHUNK_SUMMARY_PROMPT else "Chunk summary."
+    )
+
+    summary = generate_transcript_summary(condense_transcript(long_transcript))
+
+    assert summary == "Final summary."
+    reduce_messages = mock_model.invoke.call_args_list[-1].args[0]
+    assert reduce_messages[1].content.startswith("Chunk summary.")
+    assert long_transcript not in reduce_messages[1].content
+
+def test_generate_holistic_summary_and_topics_uses_one_call(mock_model):
+    structured_model = mock_model.with_structured_output.return_value
+    structured_model.invoke.return_value = HolisticAnalysisResponse(summary="Summary.", topics=["Topic 1", "Topic 2"])
+
+    analysis = generate_holistic_summary_and_topics("A short transcript.", ["Frame description"], "concise", "en")
+
+    assert analysis == {"holistic_summary": "Summary.", "topics": ["Topic 1", "Topic 2"]}
+    structured_model.invoke.assert_called_once()
+    prompt = structured_model.invoke.call_args.args[0][1].content
+    assert prompt == "Transcript: A short transcript.\nKeyframe descriptions: Frame 1: Frame description"
+
+def test_generate_holistic_summary_and_topics_handles_errors(mock_model):
+    mock_model.with_structured_output.return_value.invoke.side_effect = Exception("Test exception")
+
+    assert generate_holistic_summary_and_topics("A short transcript.", []) == {"holistic_summary": "", "topics": []}
+
+def test_generate_transcript_summary_streams_tokens(mock_model):
+    mock_model.stream.return_value = iter([MagicMock(content="Short "), MagicMock(content=""), MagicMock(content="summary.")])
+    tokens = []
+
+    summary = generate_transcript_summary("A short transcript.", on_token=tokens.append)
+
+    assert summary == "Short summary."
+    assert tokens == ["Short ", "summary."]
+    mock_model.invoke.assert_not_called()
@@ -0,0 +1,38 @@
+import pytest
+from api.utils import text_chunker
+from api.utils.text_chunker import count_tokens, chunk_text
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    """Count tokens with the character estimate so the tests don't depend on downloading a tokenizer"""
+    monkeypatch.setattr(text_chunker, "_encoding", None)
+    monkeypatch.setattr(text_chunker, "_encoding_loaded", True)
+
+def test_count_tokens_estimates_without_tokenizer():
+    assert count_tokens("") == 0
+    assert count_tokens("abcd") == 1
+    assert count_tokens("abcde") == 2
+
+def test_chunk_text_keeps_sentences_together():
+    sentences = [f"Sentence number {i} is here." for i in range(40)]
+    text = " ".join(sentences)
+
+    chunks = chunk_text(text, max_tokens=30)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 30 for chunk in chunks)
+    assert " ".join(chunks) == text
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+def test_chunk_text_splits_text_without_punctuation_by_words():
+    text = " ".join(f"word{i}" for i in range(500))
+
+    chunks = chunk_text(text, max_tokens=50)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks) == text
+
+def test_chunk_text_returns_short_text_whole():
+    assert chunk_text("Short text. Two sentences.", max_tokens=100) == ["Short text. Two sentences."]
+    assert chunk_text("", max_tokens=100) == []
@@ -0,0 +1,34 @@
+from unittest.mock import MagicMock
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from api.utils.stage_graph import Stage, run_stages
+from api.utils.token_usage import TokenUsageCallbackHandler, record_usage, track_token_usage
+
+def test_track_token_usage_counts_calls_in_stage_threads():
+    stages = [
+        Stage("first", lambda: record_usage("model-a", 100, 10)),
+        Stage("second", lambda first: record_usage("model-b", 50, 5), deps=("first",)),
+    ]
+
+    with track_token_usage() as usage:
+        run_stages(stages)
+    record_usage("model-a", 1000, 1000)
+
+    assert usage.to_dict() == {
+        "input_tokens": 150,
+        "output_tokens": 15,
+        "models": {
+            "model-a": {"calls": 1, "input_tokens": 100, "output_tokens": 10},
+            "model-b": {"calls": 1, "input_tokens": 50, "output_tokens": 5},
+        }
+    }
+
+def test_callback_handler_records_usage_metadata():
+    message = AIMessage(content="Hi", usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15})
+    result = LLMResult(generations=[[ChatGeneration(message=message)]])
+
+    with track_token_usage() as usage:
+        TokenUsageCallbackHandler("model-a").on_llm_end(result)
+        TokenUsageCallbackHandler("model-a").on_llm_end(LLMResult(generations=[[ChatGeneration(message=AIMessage(content=""))]]))
+
+    assert usage.to_dict()["models"] == {"model-a": {"calls": 1, "input_tokens": 12, "output_tokens": 3}}
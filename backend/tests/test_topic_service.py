@@ -17,9 +17,9 @@ def mock_logger():
 
 @pytest.fixture
 def mock_model():
-    with patch("api.services.topics_service.ChatOpenAI") as mock_openai_model:
+    with patch("api.services.topics_service.chat_model") as mock_chat_model:
         mock_instance = MagicMock()
-        mock_openai_model.return_value = mock_instance
+        mock_chat_model.return_value = mock_instance
         yield mock_instance
 
 @pytest.fixture
@@ -1,7 +1,14 @@
 import os
+import time
 import pytest
+import numpy as np
+from unittest.mock import patch, MagicMock
+from api.config import Config
+from api.services import transcription_service
 from api.utils.video_utils import extract_audio
-from api.services.transcription_service import transcribe_audio
+from api.services.transcription_service import (
+    transcribe_audio, transcribe_audio_segments, read_wav_pcm, split_on_silence, encode_wav
+)
 
 @pytest.fixture
 def sample_audio():
@@ -28,4 +35,80 @@ def test_transcribe_audio_file_not_found():
 
     # Test if the extract_audio function raises a FileNotFoundError
     with pytest.raises(FileNotFoundError):
-        transcribe_audio(non_existent_audio_path)
\ No newline at end of file
+        transcribe_audio(non_existent_audio_path)
+
+@pytest.fixture
+def long_audio(tmp_path):
+    """A WAV file with 10 seconds of tone, a silence between 10.5s and 11s and 9 more seconds of tone"""
+    sample_rate = 16000
+    t = np.arange(20 * sample_rate) / sample_rate
+    samples = (8000 * np.sin(2 * np.pi * 440 * t)).astype("<i2")
+    samples[int(10.5 * sample_rate):11 * sample_rate] = 0
+    audio_path = tmp_path / "audio.wav"
+    with open(audio_path, "wb") as f:
+        f.write(encode_wav(samples, sample_rate))
+    return str(audio_path), samples, sample_rate
+
+def test_read_wav_pcm_memory_maps_samples(long_audio):
+    audio_path, samples, sample_rate = long_audio
+
+    pcm, rate = read_wav_pcm(audio_path)
+
+    assert rate == sample_rate
+    assert isinstance(pcm, np.memmap)
+    assert np.array_equal(pcm, samples)
+
+def test_split_on_silence_cuts_in_quiet_parts(long_audio):
+    audio_path, samples, sample_rate = long_audio
+    pcm, rate = read_wav_pcm(audio_path)
+
+    segments = split_on_silence(pcm, rate, max_seconds=12)
+
+    assert len(segments) == 2
+    assert segments[0][0] == 0 and segments[-1][1] == len(samples)
+    assert 10.5 * rate <= segments[0][1] <= 11 * rate
+    assert split_on_silence(pcm, rate, max_seconds=30) == [(0, len(samples))]
+
+def test_transcribe_audio_stitches_segments_in_order(long_audio, monkeypatch):
+    audio_path, _, _ = long_audio
+    monkeypatch.setattr(Config, "TRANSCRIPTION_CHUNK_SECONDS", 6)
+
+    def create(model, file):
+        # Answer later segments first to check the order is kept
+        name, _ = file
+        index = int(name[len("segment_"):-len(".wav")])
+        time.sleep(max(0, 0.05 * (5 - index)))
+        return MagicMock(text=f"part {index}")
+
+    with patch("api.services.transcription_service.openai_client") as openai_mock:
+        openai_mock.return_value.audio.transcriptions.create.side_effect = create
+        segments = transcribe_audio_segments(audio_path)
+        transcript = transcribe_audio(audio_path)
+
+    assert len(segments) >= 4
+    assert [segment["text"] for segment in segments] == [f"part {i}" for i in range(len(segments))]
+    assert transcript == " ".join(f"part {i}" for i in range(len(segments)))
+    assert segments[0]["start"] == 0 and segments[-1]["end"] == 20
+    assert all(segment["end"] - segment["start"] <= 6 for segment in segments)
+
+def test_local_backend_reuses_loaded_model(long_audio, monkeypatch):
+    audio_path, _, _ = long_audio
+    monkeypatch.setattr(Config, "TRANSCRIPTION_BACKEND", "local")
+    monkeypatch.setattr(transcription_service, "_local_model", None)
+    faster_whisper = MagicMock()
+    pipeline = faster_whisper.BatchedInferencePipeline.return_value
+    pipeline.transcribe.side_effect = lambda path, batch_size: (
+        iter([MagicMock(start=0.0, end=9.5, text=" Hello"), MagicMock(start=11.0, end=20.0, text=" world")]),
+        MagicMock(duration=20.0, language="en")
+    )
+
+    with patch.dict("sys.modules", {"faster_whisper": faster_whisper}), \
+            patch("api.services.transcription_service.openai_client") as openai_mock:
+        segments = transcribe_audio_segments(audio_path)
+        transcript = transcribe_audio(audio_path)
+
+    assert segments == [{"start": 0.0, "end": 9.5, "text": " Hello"}, {"start": 11.0, "end": 20.0, "text": " world"}]
+    assert transcript == "Hello world"
+    assert faster_whisper.WhisperModel.call_count == 1
+    assert pipeline.transcribe.call_count == 2
+    openai_mock.assert_not_called()
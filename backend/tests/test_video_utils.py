@@ -1,6 +1,14 @@
+import io
 import os
+import json
+import time
+import hashlib
 import pytest
 import subprocess
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+from api.utils import video_utils
+from api.utils.job_queue import Job
 from api.utils.video_utils import extract_audio, extract_keyframes, video_exits, store_video, get_audio_file
 
 @pytest.fixture
@@ -113,4 +121,176 @@ def test_get_audio_file(tmp_path):
         f.write(b"audio data")
 
     assert get_audio_file(str(video_dir)) == str(audio_path)
-    assert get_audio_file("non_existent_id") is None
\ No newline at end of file
+    assert get_audio_file("non_existent_id") is None
+
+def test_get_audio_file_prefers_configured_format(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_utils, "AUDIO_FORMAT", "opus")
+    video_dir = tmp_path / "video"
+    video_dir.mkdir()
+    (video_dir / "audio.wav").write_bytes(b"wav")
+    assert get_audio_file(str(video_dir)) == str(video_dir / "audio.wav")
+
+    (video_dir / "audio.ogg").write_bytes(b"ogg")
+    assert get_audio_file(str(video_dir)) == str(video_dir / "audio.ogg")
+
+def test_audio_output_args_match_extension():
+    assert "libopus" in video_utils.audio_output_args("audio.ogg")
+    assert "flac" in video_utils.audio_output_args("audio.flac")
+    assert "pcm_s16le" in video_utils.audio_output_args("audio.wav")
+    with pytest.raises(ValueError):
+        video_utils.audio_output_args("audio.mp3")
+
+def test_process_video_reuses_artifacts_of_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_utils, "UPLOAD_DIR", str(tmp_path))
+    original_dir = tmp_path / "original"
+    (original_dir / "keyframes").mkdir(parents=True)
+    (original_dir / "video.mp4").write_bytes(b"video data")
+    (original_dir / "audio.wav").write_bytes(b"audio data")
+    (original_dir / "keyframes" / "frame_00.jpg").write_bytes(b"frame data")
+    (original_dir / "data.json").write_text('{"transcript": "Hello"}')
+    (original_dir / "artifacts").mkdir()
+    (original_dir / "artifacts" / "topics-0123456789abcdef.json").write_text('{"value": ["Topic"]}')
+    video_utils.register_processed_video("hash", "original")
+
+    duplicate_dir = tmp_path / "duplicate"
+    duplicate_dir.mkdir()
+    video_path = duplicate_dir / "upload.mp4"
+    video_path.write_bytes(b"video data")
+
+    with patch.object(video_utils, "extract_audio") as extract_audio_mock, \
+            patch.object(video_utils, "transcribe_audio_segments") as transcribe_mock:
+        assert video_utils.process_video("duplicate", str(video_path), "hash") == "duplicate"
+
+    extract_audio_mock.assert_not_called()
+    transcribe_mock.assert_not_called()
+    assert (duplicate_dir / "data.json").read_text() == '{"transcript": "Hello"}'
+    assert (duplicate_dir / "audio.wav").exists()
+    assert (duplicate_dir / "keyframes" / "frame_00.jpg").exists()
+    assert (duplicate_dir / "artifacts" / "topics-0123456789abcdef.json").exists()
+    assert video_utils.find_processed_video("missing") is None
+
+def test_save_video_hashes_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_utils, "UPLOAD_DIR", str(tmp_path))
+    video = FileStorage(stream=io.BytesIO(b"video data"), filename="video.mp4")
+
+    video_id, video_path, video_hash = video_utils.save_video(video)
+
+    assert os.path.dirname(video_path) == str(tmp_path / video_id)
+    assert video_hash == hashlib.sha256(b"video data").hexdigest()
+
+def test_probe_keyframe_timestamps_only_decodes_keyframes():
+    output = "0.000000\n2.000000\nN/A\n4.000000,\n"
+    with patch.object(video_utils.subprocess, "run") as run_mock:
+        run_mock.return_value.stdout = output
+        assert video_utils.probe_keyframe_timestamps("video.mp4") == [0.0, 2.0, 4.0]
+
+    command = run_mock.call_args.args[0]
+    assert command[command.index("-skip_frame") + 1] == "nokey"
+
+def test_probe_format_reads_start_time_and_duration():
+    with patch.object(video_utils.subprocess, "run") as run_mock:
+        run_mock.return_value.stdout = "start_time=1.400000\nduration=10.000000\n"
+        assert video_utils.probe_format("video.mp4") == (1.4, 10.0)
+        run_mock.return_value.stdout = "start_time=N/A\nduration=N/A\n"
+        assert video_utils.probe_format("video.mp4") == (0.0, 0.0)
+
+def test_choose_keyframe_timestamps_is_evenly_spaced():
+    keyframes = [float(i) for i in range(100)]
+    with patch.object(video_utils, "probe_keyframe_timestamps", return_value=keyframes), \
+            patch.object(video_utils, "probe_format", return_value=(0.0, 100.0)):
+        assert video_utils.choose_keyframe_timestamps("video.mp4", 5) == [0.0, 25.0, 50.0, 74.0, 99.0]
+
+    with patch.object(video_utils, "probe_keyframe_timestamps", return_value=[]), \
+            patch.object(video_utils, "probe_format", return_value=(0.0, 10.0)):
+        assert video_utils.choose_keyframe_timestamps("video.mp4", 2) == [2.5, 7.5]
+
+def test_choose_keyframe_timestamps_are_relative_to_the_start_time():
+    with patch.object(video_utils, "probe_keyframe_timestamps", return_value=[1.4, 3.4, 5.4]), \
+            patch.object(video_utils, "probe_format", return_value=(1.4, 6.0)):
+        assert video_utils.choose_keyframe_timestamps("video.mp4", 3) == [0.0, 2.0, 4.0]
+
+def test_extract_keyframes_records_their_timestamps(tmp_path):
+    video_path = str(tmp_path / "video.mp4")
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=duration=6:size=160x120:rate=10",
+        "-g", "20", "-output_ts_offset", "1.5", video_path
+    ], check=True)
+
+    video_utils.extract_keyframes(video_path, str(tmp_path / "keyframes"), max_frames=2)
+
+    timestamps = video_utils.read_keyframes_index(str(tmp_path / "keyframes"))
+    assert [[round(timestamp, 1) for timestamp in frame] for frame in timestamps] == [[0.0], [4.0]]
+
+def test_downsample_keyframes_keeps_the_timestamps_of_the_kept_frames(tmp_path):
+    for i in range(5):
+        (tmp_path / f"frame_{i:02d}.jpg").write_bytes(b"jpeg")
+
+    assert video_utils.downsample_keyframes(str(tmp_path), 3, [0.0, 2.0, 4.0, 6.0, 8.0]) == 3
+
+    assert video_utils.read_keyframes_index(str(tmp_path)) == [[0.0], [4.0], [8.0]]
+
+def test_write_vision_frames_downscales_keyframes(tmp_path):
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=1",
+        "-frames:v", "2", "-q:v", "2", "-start_number", "0", str(tmp_path / "frame_%02d.jpg")
+    ], check=True)
+
+    assert video_utils.write_vision_frames(str(tmp_path)) == 2
+
+    for i in range(2):
+        frame_path = str(tmp_path / f"frame_{i:02d}.jpg")
+        vision_path = video_utils.vision_frame_path(frame_path)
+        pixels = subprocess.run(
+            ["ffmpeg", "-v", "error", "-i", vision_path, "-f", "rawvideo", "-pix_fmt", "gray", "pipe:"],
+            check=True, capture_output=True
+        ).stdout
+        assert len(pixels) == 512 * 288
+        assert os.path.getsize(vision_path) * 5 < os.path.getsize(frame_path)
+
+def test_process_video_transcribes_while_extracting_keyframes(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_utils, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(video_utils, "KEYFRAME_MODE", "seek")
+    (tmp_path / "video").mkdir()
+    segments = [{"start": 0.0, "end": 1.0, "text": "Hello"}]
+
+    with patch.object(video_utils, "extract_audio"), \
+            patch.object(video_utils, "prepare_keyframes", side_effect=lambda *args: time.sleep(0.3)), \
+            patch.object(video_utils, "transcribe_audio_segments", side_effect=lambda path: time.sleep(0.3) or segments):
+        start = time.perf_counter()
+        video_utils.process_video("video", str(tmp_path / "video" / "video.mp4"))
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert json.loads((tmp_path / "video" / "data.json").read_text()) == {"transcript": "Hello", "segments": segments}
+
+def test_process_video_transcribes_while_scanning_keyframes(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_utils, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(video_utils, "KEYFRAME_MODE", "scan")
+    (tmp_path / "video").mkdir()
+    segments = [{"start": 0.0, "end": 1.0, "text": "Hello"}]
+
+    with patch.object(video_utils, "extract_audio"), \
+            patch.object(video_utils, "scan_keyframes", side_effect=lambda *args: time.sleep(0.3)), \
+            patch.object(video_utils, "transcribe_audio_segments", side_effect=lambda path: time.sleep(0.3) or segments):
+        start = time.perf_counter()
+        video_utils.process_video("video", str(tmp_path / "video" / "video.mp4"))
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+
+def test_process_video_records_failed_transcription(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_utils, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(video_utils, "KEYFRAME_MODE", "seek")
+    (tmp_path / "video").mkdir()
+    job = Job('upload', ['audio', 'keyframes', 'transcript'])
+
+    with patch.object(video_utils, "extract_audio"), \
+            patch.object(video_utils, "prepare_keyframes", side_effect=lambda *args: time.sleep(0.1)), \
+            patch.object(video_utils, "transcribe_audio_segments", side_effect=Exception("Test exception")):
+        with pytest.raises(Exception):
+            video_utils.process_video("video", str(tmp_path / "video" / "video.mp4"), job=job)
+
+    assert {name: stage['state'] for name, stage in job.stages.items()} == {'audio': 'done', 'keyframes': 'done', 'transcript': 'failed'}
+    assert not (tmp_path / "video" / "data.json").exists()
+    assert video_utils.upload_error("video") == "Test exception"
+    assert isinstance(video_utils.not_ready_error("video"), video_utils.VideoProcessingError)
@@ -1,4 +1,4 @@
-from utils.api import upload_video, analyze_video
+from utils.api import upload_video, analyze_video_stream
 import streamlit as st
 import time
 from dotenv import load_dotenv
@@ -68,34 +68,103 @@ if st.session_state.error_message:
     st.error(st.session_state.error_message)
 
 
+# Results section
+def render_results(result, live=False):
+    """ Renders the analysis results, while streaming (live) the missing ones are shown as in progress """
+    pending = "Generating..."
+    st.markdown("---")
+    st.markdown("## Video Analysis Results")
+
+    if result.get('topics'):
+        st.markdown("#### Topics")
+        if live:
+            # Widgets can't be created again in the same run, use text while the results are updated
+            st.markdown(" · ".join(f"`{topic}`" for topic in result["topics"]))
+        else:
+            st.pills("Topics", result["topics"], label_visibility="collapsed")
+
+    left_col, right_col = st.columns(2)
+
+    with left_col:
+        st.markdown("#### Holistic Summary")
+        with st.expander("Holistic Summary", expanded=True):
+            st.write(result.get("holistic_summary", pending))
+
+        st.markdown("#### Transcript Summary")
+        with st.expander("Transcript Summary", expanded=True):
+            st.write(result.get("transcript_summary", pending))
+
+        st.markdown("#### Transcript")
+        with st.expander("Transcript", expanded=True):
+            st.write(result.get("transcript", pending))
+
+    with right_col:
+        st.markdown("#### Keyframes and Descriptions")
+        if "keyframes" not in result:
+            st.write(pending)
+        for i, frame in enumerate(result.get("keyframes", [])):
+            img_path = os.path.abspath(os.path.join(os.getcwd(), UPLOAD_DIR, frame['image_path']))
+            if os.path.exists(img_path):
+                st.image(f"{img_path}", caption=f"Frame {i + 1}")
+            st.write(frame["description"])
+
+
 # --- LOADING SECTION ---
 # After rerun, if waiting is True, start the processing
 if st.session_state.waiting and not st.session_state.analysis_result:
     try:
         with st.status("Uploading video...", state="running", expanded=True) as s:
+            def show_progress(job):
+                running = [name for name, stage in job["stages"].items() if stage["state"] == "running"]
+                if running:
+                    s.update(label=f"{job['kind'].capitalize()}: {', '.join(running).replace('_', ' ')}...", state="running")
+
             # Only upload video if its a new file
             if st.session_state.last_uploaded_video_name != video_file.name:
                 st.toast('Uploading video...')
                 s.update(label="Uploading video...", state="running")
-                st.session_state.video_id = upload_video(video_file)
+                st.session_state.video_id = upload_video(video_file, show_progress)
             if st.session_state.video_id == None:
                 raise Exception("Error while uploading video, try again later...")
             
             st.toast('Your video was uploaded successfully!', icon='✅')
             st.toast('Analyzing video...')
             s.update(label="Analyzing video...", state="running")
-            results = analyze_video(st.session_state.video_id, language, summary_type)
-            st.session_state.analysis_result = {
-                "topics": results.get('topics', []),
-                "transcript_summary": results.get('transcript_summary', 'No summary was generated.'),
-                "holistic_summary": results.get('holistic_summary', 'No summary was generated.'),
-                "transcript": results.get('transcript', 'No transcript was generated'),
-                "keyframes": results.get('keyframes', [])
-            }
-
-            s.update(label="Analysis completed!", state="complete")
-            st.toast('Analysis completed!', icon='✅')
-            time.sleep(1.5)
+
+        # Render each result as soon as the backend streams it
+        live = st.empty()
+        results = {}
+        last_render = 0
+        for event, data in analyze_video_stream(st.session_state.video_id, language, summary_type):
+            if event == "error":
+                raise Exception(data["error"])
+            if event == "done":
+                break
+            if event == "transcript_summary_token":
+                results["transcript_summary"] = results.get("transcript_summary", "") + data["token"]
+                # Limit the redraws while the summary is being generated
+                if time.time() - last_render < 0.2:
+                    continue
+            elif event != "job":
+                results.update(data)
+                s.update(label=f"Analyzing video: {event.replace('_', ' ')} ready", state="running")
+            with live.container():
+                render_results(results, live=True)
+            last_render = time.time()
+        else:
+            raise Exception("The analysis stream ended before the analysis finished")
+
+        st.session_state.analysis_result = {
+            "topics": results.get('topics', []),
+            "transcript_summary": results.get('transcript_summary', 'No summary was generated.'),
+            "holistic_summary": results.get('holistic_summary', 'No summary was generated.'),
+            "transcript": results.get('transcript', 'No transcript was generated'),
+            "keyframes": results.get('keyframes', [])
+        }
+
+        s.update(label="Analysis completed!", state="complete")
+        st.toast('Analysis completed!', icon='✅')
+        time.sleep(1.5)
             
     except Exception as e:
         st.session_state.error_message = f"Error during processing: {e}"
@@ -106,36 +175,5 @@ if st.session_state.waiting and not st.session_state.analysis_result:
         st.session_state.waiting = False
         st.rerun()  # Final rerun to re-enable the button and display results
 
-# Results section
 if st.session_state.analysis_result:
-    result = st.session_state.analysis_result
-    st.markdown("---")
-    st.markdown("## Video Analysis Results")
-
-    if len(result['topics']) != 0:
-        st.markdown("#### Topics")
-        st.pills("Topics", result["topics"],label_visibility="collapsed")
-
-    left_col, right_col = st.columns(2)
-
-    with left_col:
-        st.markdown("#### Holistic Summary")
-        with st.expander("Holistic Summary", expanded=True):
-            st.write(result["holistic_summary"])
-
-        st.markdown("#### Transcript Summary")
-        with st.expander("Transcript Summary", expanded=True):
-            st.write(result["transcript_summary"])
-
-        st.markdown("#### Transcript")
-        with st.expander("Transcript", expanded=True):
-            st.write(result["transcript"])
-
-    with right_col:
-        st.markdown("#### Keyframes and Descriptions")
-        for i, frame in enumerate(result["keyframes"]):
-            img_path = os.path.abspath(os.path.join(os.getcwd(), UPLOAD_DIR, frame['image_path']))
-            if os.path.exists(img_path):
-                st.image(f"{img_path}", caption=f"Frame {i + 1}")
-            st.write(frame["description"])
-        
\ No newline at end of file
+    render_results(st.session_state.analysis_result)
@@ -1,29 +1,102 @@
 import requests
 from dotenv import load_dotenv
 import os
+import time
+import hashlib
+import json
 
 load_dotenv()
 
 BACKEND_URI = os.environ.get("BACKEND_URI", "http://localhost:5000")
+JOB_TIMEOUT = int(os.environ.get("JOB_TIMEOUT", 1800))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 1.0))
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", 3))
 
-def upload_video(video) -> str:
+def wait_for_job(job_id: str, on_update=None) -> dict:
+    """ Polls a backend job until it finishes and returns its result. """
+    deadline = time.time() + JOB_TIMEOUT
+    while time.time() < deadline:
+        response = requests.get(f"{BACKEND_URI}/api/jobs/{job_id}", timeout=10)
+        if response.status_code != 200:
+            raise Exception("Job polling failed with status code: " + str(response.status_code))
+        job = response.json()["data"]
+        if on_update:
+            on_update(job)
+        if job["status"] == "done":
+            return job.get("result", {})
+        if job["status"] == "failed":
+            raise Exception("Job failed: " + str(job.get("error")))
+        time.sleep(JOB_POLL_INTERVAL)
+    raise Exception(f"Job {job_id} did not finish after {JOB_TIMEOUT} seconds")
+
+def upload_video(video, on_update=None) -> str:
+    """ Uploads a video in chunks, resuming from the server offset after failures, and waits for its processing. """
     try:
-        files = {"video": (video.name, video.getvalue())}
         response = requests.post(
-            f"{BACKEND_URI}/api/upload_video",
-            files=files,
+            f"{BACKEND_URI}/api/upload_sessions",
+            json={"filename": video.name, "size": video.size},
+            timeout=30
+        )
+        if response.status_code != 201:
+            raise Exception("Upload failed with status code: " + str(response.status_code))
+        session = response.json()["data"]
+        upload_id, chunk_size = session["upload_id"], session["chunk_size"]
+
+        sha256 = hashlib.sha256()
+        offset, retries = 0, 0
+        video.seek(0)
+        while offset < video.size:
+            chunk = video.read(chunk_size)
+            try:
+                response = requests.put(
+                    f"{BACKEND_URI}/api/upload_sessions/{upload_id}",
+                    params={"offset": offset},
+                    data=chunk,
+                    headers={"Content-Type": "application/octet-stream"},
+                    timeout=100
+                )
+            except requests.exceptions.RequestException:
+                response = None
+            if response is None or response.status_code != 200:
+                # Resume from the bytes the server actually received
+                retries += 1
+                if retries > UPLOAD_RETRIES:
+                    raise Exception(f"Upload failed after {UPLOAD_RETRIES} retries")
+                status = requests.get(f"{BACKEND_URI}/api/upload_sessions/{upload_id}", timeout=30)
+                status.raise_for_status()
+                offset, sha256 = _rewind(video, status.json()["data"]["offset"])
+                continue
+            sha256.update(chunk)
+            offset = response.json()["data"]["offset"]
+            retries = 0
+
+        response = requests.post(
+            f"{BACKEND_URI}/api/upload_sessions/{upload_id}/complete",
+            json={"sha256": sha256.hexdigest()},
             timeout=100
         )
-        if response.status_code == 200:
-            data = response.json()["data"]["id"]
-            return data
+        if response.status_code == 202:
+            data = response.json()["data"]
+            wait_for_job(data["job_id"], on_update)
+            return data["id"]
         else:
             raise Exception("Upload failed with status code: " + str(response.status_code))
     except requests.exceptions.RequestException as e:
         print(f"Upload failed: {str(e)}")
         return None
+
+def _rewind(video, offset: int) -> tuple:
+    """ Moves the file back to the given offset and returns it with the hash of the preceding bytes. """
+    sha256 = hashlib.sha256()
+    video.seek(0)
+    remaining = offset
+    while remaining > 0:
+        data = video.read(min(remaining, 1024 * 1024))
+        sha256.update(data)
+        remaining -= len(data)
+    return offset, sha256
     
-def analyze_video(video_id: str, language: str, summary_type: str) -> dict:
+def analyze_video(video_id: str, language: str, summary_type: str, on_update=None) -> dict:
     try:
         response = requests.post(
             f"{BACKEND_URI}/api/analyze_video",
@@ -34,11 +107,58 @@ def analyze_video(video_id: str, language: str, summary_type: str) -> dict:
             },
             timeout=100
         )
-        if response.status_code == 200:
-            data = response.json()["data"]
-            return data
+        if response.status_code == 202:
+            job_id = response.json()["data"]["job_id"]
+            return wait_for_job(job_id, on_update)
         else:
             raise Exception("Analysis failed with status code: " + str(response.status_code))
     except requests.exceptions.RequestException as e:
         print(f"Anlysis failed: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+def analyze_video_stream(video_id: str, language: str, summary_type: str):
+    """
+    Requests a streamed analysis and yields its server-sent events as (event, data) tuples as they arrive.
+
+    If the stream ends before the done or error event (server restart, proxy timeout), the job is polled
+    instead and its result is yielded as a single result event followed by the done event.
+    """
+    response = requests.post(
+        f"{BACKEND_URI}/api/analyze_video/stream",
+        json={
+            "video_id": video_id,
+            "language": language.lower(),
+            "summary_type": summary_type.lower()
+        },
+        stream=True,
+        timeout=(10, JOB_TIMEOUT)
+    )
+    if response.status_code != 200:
+        raise Exception("Analysis failed with status code: " + str(response.status_code))
+
+    job_id = None
+    with response:
+        event, data = None, []
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith(":"):
+                    continue # Keep-alive comment
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+                elif not line and event:
+                    event_data = json.loads("\n".join(data))
+                    if event == "job":
+                        job_id = event_data["job_id"]
+                    yield event, event_data
+                    if event in ("done", "error"):
+                        return
+                    event, data = None, []
+        except requests.exceptions.RequestException as e:
+            print(f"Analysis stream interrupted: {str(e)}")
+
+    if job_id is None:
+        raise Exception("Analysis stream ended before the analysis started")
+    result = wait_for_job(job_id)
+    yield "result", result
+    yield "done", {"timings": result.get("timings"), "token_usage": result.get("token_usage")}